@@ -31,5 +31,26 @@ def create_app():
     csrf.exempt(api_bp)
     csrf.exempt(main_bp)
 
+    # Rendre la connexion MySQL au pool à la fin de chaque requête
+    from database.database import db
+
+    @app.teardown_appcontext
+    def release_database(error):
+        db.disconnect()
+
+    # Cache HTTP des fichiers statiques (URL versionnées) et compression gzip/brotli
+    from app.http_cache import init_static_cache
+    from app.compression import init_compression
+    init_static_cache(app)
+    init_compression(app)
+
+    # Nettoyage des clés d'idempotence expirées (formulaires d'écriture)
+    from app.idempotency import init_idempotency
+    init_idempotency(app)
+
+    # Instrumentation des requêtes SQL (Server-Timing, N+1, /api/_metrics)
+    from app.metrics import init_metrics
+    init_metrics(app)
+
     # Les routes de pages sont gérées par le blueprint main dans app.routes
     return app
@@ -0,0 +1,150 @@
+import logging
+import re
+import threading
+import time
+from datetime import date
+
+from database.database import db
+from app.http_cache import data_version
+
+# Historique ancien déplacé dans des tables d'archive de même structure
+# (CREATE TABLE ... LIKE, migration 6). Toute migration modifiant l'une des
+# tables sources doit modifier son archive de la même façon: les lignes sont
+# copiées par INSERT ... SELECT *.
+ARCHIVE_TABLES = [
+    ('operations', 'operations_archive', 'id'),
+    ('incidents', 'incidents_archive', 'operation_id'),
+    ('signatures', 'signatures_archive', 'operation_id'),
+    ('operation_search', 'operation_search_archive', 'operation_id'),
+    ('operation_search_trigrams', 'operation_search_trigrams_archive', 'operation_id'),
+]
+
+_TABLE_RE = re.compile(
+    r'\b(FROM|JOIN)\s+(' + '|'.join(sorted((source for source, _, _ in ARCHIVE_TABLES), key=len, reverse=True)) + r')\b'
+)
+
+
+def archive_query(query):
+    """Même requête, lue dans les tables d'archive (FROM/JOIN des tables archivées)."""
+    return _TABLE_RE.sub(lambda m: f"{m.group(1)} {m.group(2)}_archive", query)
+
+
+def source_query(query, archived):
+    """`query` sur les archives si `archived`, sinon inchangée."""
+    return archive_query(query) if archived else query
+
+
+def fetch_with_archive(query, params=None):
+    """Exécuter une requête ciblée (ex: par identifiant) et, si elle ne trouve
+    rien, la rejouer sur les archives. Retourne (lignes, archivée)."""
+    rows = db.execute_query(query, params)
+    if rows is None or rows:
+        return rows, False
+    return db.execute_query(archive_query(query), params), True
+
+
+# Bornes des tables (plus récente date archivée, plus ancienne date conservée),
+# recalculées quand la version des données change
+_bounds_lock = threading.Lock()
+_bounds = {'version': None, 'value': (None, None)}
+
+
+def archive_bounds():
+    """(plus récente date_operation archivée, plus ancienne date_operation en
+    table courante); None si la table correspondante est vide. Deux lectures
+    d'index, mises en cache jusqu'à la prochaine écriture validée."""
+    version = data_version.current()
+    with _bounds_lock:
+        if _bounds['version'] == version:
+            return _bounds['value']
+    archived = db.execute_query("SELECT MAX(date_operation) AS d FROM operations_archive")
+    current = db.execute_query("SELECT MIN(date_operation) AS d FROM operations")
+    if archived is None or current is None:
+        raise Exception("Échec de lecture des bornes de l'archive")
+    value = (archived[0]['d'], current[0]['d'])
+    with _bounds_lock:
+        _bounds.update(version=version, value=value)
+    return value
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def historique_sources(date_debut=None, date_fin=None, archives=False):
+    """Tables à interroger pour une période: liste de booléens (False = tables
+    courantes, True = archives). Les archives ne sont lues que si elles sont
+    demandées et peuvent contenir la période; les tables courantes sont
+    écartées si la période se termine avant leur première opération."""
+    if not archives:
+        return [False]
+    archived_max, current_min = archive_bounds()
+    sources = []
+    if not (date_fin and current_min is not None and date_fin < _iso(current_min)):
+        sources.append(False)
+    if archived_max is not None and not (date_debut and date_debut > _iso(archived_max)):
+        sources.append(True)
+    return sources or [False]
+
+
+def archive_cutoff(months, today=None):
+    """Premier jour du mois, `months` mois avant le mois courant: les opérations
+    antérieures sont archivées (périodes mensuelles entières)."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_operations(cutoff, batch_size=1000, pause=0.0):
+    """Déplacer les opérations antérieures à `cutoff` (et leurs incidents,
+    signatures et entrées de l'index de recherche) vers les archives.
+
+    Une transaction par lot de `batch_size` opérations, les plus anciennes
+    d'abord: les lignes copiées et supprimées sont verrouillées quelques
+    instants seulement. Les lignes d'une fiche ont la même date: elles
+    rejoignent toutes l'archive (au plus tard au lot suivant).
+    Les agrégats de statistiques et l'index des détenteurs ne changent pas.
+    Retourne le nombre d'opérations archivées.
+    """
+    total = 0
+    while True:
+        with db.transaction() as tx:
+            rows = tx.fetchall(
+                "SELECT id FROM operations WHERE date_operation < %s "
+                "ORDER BY date_operation, id LIMIT %s FOR UPDATE",
+                (cutoff, batch_size)
+            )
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join(['%s'] * len(ids))
+            for source, target, key in ARCHIVE_TABLES:
+                tx.execute(f"INSERT INTO {target} SELECT * FROM {source} WHERE {key} IN ({placeholders})", ids)
+            # Enfants d'abord (clés étrangères), puis les opérations
+            for source, _, key in reversed(ARCHIVE_TABLES):
+                tx.execute(f"DELETE FROM {source} WHERE {key} IN ({placeholders})", ids)
+        total += len(ids)
+        data_version.bump()
+        logging.info(f"Archivage: {total} opérations antérieures au {cutoff} déplacées")
+        if pause:
+            time.sleep(pause)
+    return total
+
+
+def delete_archived(tx, column, ids):
+    """Supprimer des archives les opérations dont `column` (employe_id,
+    materiel_id) est dans `ids`, avec leurs lignes liées."""
+    if not ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(ids))
+    deleted = 0
+    for source, target, key in reversed(ARCHIVE_TABLES):
+        if source == 'operations':
+            deleted = tx.execute(f"DELETE FROM {target} WHERE {column} IN ({placeholders})", list(ids))
+        else:
+            tx.execute(
+                f"DELETE t FROM {target} t JOIN operations_archive o ON o.id = t.{key} "
+                f"WHERE o.{column} IN ({placeholders})",
+                list(ids)
+            )
+    return deleted
@@ -0,0 +1,102 @@
+import logging
+
+from database.database import db
+from app.archive import archive_query
+from app.stats import recompute_statut_stats
+
+# Détenteur actuel de chaque matériel attribué (un matériel disponible n'a pas de ligne)
+CURRENT_ASSIGNMENT_SELECT = """
+    SELECT
+        mca.materiel_id,
+        m.numero_serie,
+        m.modele,
+        tm.nom as type_materiel,
+        mca.employe_id,
+        e.nom as employe_nom,
+        mca.service_id,
+        s.nom as service_nom,
+        mca.depuis,
+        mca.numero_fiche,
+        mca.operation_id
+    FROM materiel_current_assignment mca
+    JOIN materiels m ON m.id = mca.materiel_id
+    LEFT JOIN types_materiel tm ON m.type_id = tm.id
+    LEFT JOIN employes e ON e.id = mca.employe_id
+    LEFT JOIN services s ON s.id = mca.service_id
+"""
+
+ASSIGNMENT_UPSERT_QUERY = """
+    INSERT INTO materiel_current_assignment (materiel_id, employe_id, service_id, depuis, numero_fiche, operation_id)
+    VALUES"""
+ASSIGNMENT_UPSERT_SUFFIX = """
+    ON DUPLICATE KEY UPDATE
+        employe_id = VALUES(employe_id),
+        service_id = VALUES(service_id),
+        depuis = VALUES(depuis),
+        numero_fiche = VALUES(numero_fiche),
+        operation_id = VALUES(operation_id)
+"""
+
+# Attributions et restitutions rejouées par la reconstruction
+REPLAY_SELECT = """
+    SELECT o.id, o.type_operation, o.materiel_id, o.employe_id, e.service_id, o.date_operation, o.numero_fiche
+    FROM operations o
+    LEFT JOIN employes e ON e.id = o.employe_id
+    WHERE o.type_operation IN ('attribution', 'restitution') AND o.materiel_id IS NOT NULL
+"""
+
+
+def apply_attributions(tx, rows):
+    """Enregistrer les nouveaux détenteurs dans la transaction d'écriture.
+
+    `rows`: (materiel_id, employe_id, service_id, depuis, numero_fiche, operation_id)
+    """
+    return tx.insert_rows(ASSIGNMENT_UPSERT_QUERY, rows, suffix=ASSIGNMENT_UPSERT_SUFFIX)
+
+
+def apply_restitutions(tx, materiel_ids):
+    """Retirer les matériels restitués de l'index dans la transaction d'écriture."""
+    if not materiel_ids:
+        return 0
+    return tx.execute(
+        f"DELETE FROM materiel_current_assignment WHERE materiel_id IN ({', '.join(['%s'] * len(materiel_ids))})",
+        list(materiel_ids)
+    )
+
+
+def rebuild_current_assignments(batch_size=1000):
+    """Reconstruire l'index en rejouant les attributions/restitutions dans l'ordre.
+
+    L'historique (archives comprises) est lu en flux; l'index et `materiels.statut` sont remplacés
+    dans une seule transaction (les lecteurs voient l'ancien état jusqu'au commit).
+    Retourne le nombre de matériels attribués.
+    """
+    holders = {}
+    replayed = 0
+    # Historique complet: le détenteur actuel peut venir d'une attribution archivée
+    for op in db.iter_query(
+        f"({REPLAY_SELECT}) UNION ALL ({archive_query(REPLAY_SELECT)}) ORDER BY date_operation, id",
+        batch_size=batch_size
+    ):
+        replayed += 1
+        if op['type_operation'] == 'attribution':
+            holders[op['materiel_id']] = (
+                op['materiel_id'], op['employe_id'], op['service_id'], op['date_operation'], op['numero_fiche'], op['id']
+            )
+        else:
+            holders.pop(op['materiel_id'], None)
+
+    rows = list(holders.values())
+    with db.transaction() as tx:
+        tx.execute("DELETE FROM materiel_current_assignment")
+        for start in range(0, len(rows), batch_size):
+            apply_attributions(tx, rows[start:start + batch_size])
+        # Aligner le statut des matériels sur l'index (hors maintenance / retrait)
+        tx.execute(
+            "UPDATE materiels m LEFT JOIN materiel_current_assignment mca ON mca.materiel_id = m.id "
+            "SET m.statut = IF(mca.materiel_id IS NULL, 'disponible', 'attribue') "
+            "WHERE m.statut IN ('disponible', 'attribue')"
+        )
+        recompute_statut_stats(tx)
+    logging.info(f"Index des détenteurs reconstruit: {replayed} opérations rejouées, {len(rows)} matériels attribués")
+    return len(rows)
@@ -0,0 +1,140 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from database.database import db
+from app.fiches import FicheValidationError, prepare_fiche, store_fiche_signatures, write_fiches
+from app.http_cache import data_version
+from app.jobs import jobs
+from app.numero_fiche import allocate_numero_fiche_block
+
+# Les lots sont écrits l'un après l'autre: un gros import ne monopolise pas
+# les connexions MySQL des requêtes interactives
+_batch_executor = ThreadPoolExecutor(max_workers=Config.BATCH_WORKERS, thread_name_prefix='batch')
+
+
+def parse_batch(body, content_type):
+    """Lire les fiches d'un lot: NDJSON (une fiche par ligne), tableau JSON, ou
+    objet {"defaults": {...}, "fiches": [...]} dont les valeurs par défaut
+    (signataires, signatures...) complètent chaque fiche.
+
+    Retourne (fiches, erreurs) où erreurs = [{'index', 'error'}] pour les lignes illisibles.
+    """
+    text = body.decode('utf-8-sig')
+    errors = []
+    defaults = {}
+    if 'ndjson' in (content_type or ''):
+        items = []
+        for index, line in enumerate(l for l in text.splitlines() if l.strip()):
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(None)
+                errors.append({'index': index, 'error': f'JSON invalide: {e}'})
+    else:
+        try:
+            payload = json.loads(text)
+        except ValueError as e:
+            raise FicheValidationError(f'JSON invalide: {e}')
+        if isinstance(payload, dict):
+            defaults = payload.get('defaults') or {}
+            payload = payload.get('fiches')
+        if not isinstance(payload, list):
+            raise FicheValidationError('Tableau de fiches attendu')
+        items = payload
+    if isinstance(defaults, dict) and defaults:
+        items = [{**defaults, **item} if isinstance(item, dict) else item for item in items]
+    return items, errors
+
+
+def validate_batch(type_operation, items, errors):
+    """Préparer toutes les fiches; les erreurs sont ajoutées à `errors` par index.
+
+    Les signatures sont seulement contrôlées: leur normalisation se fait dans
+    la tâche du lot, pas pendant la requête.
+    """
+    failed = {error['index'] for error in errors}
+    prepared = []
+    for index, item in enumerate(items):
+        if index in failed:
+            continue
+        try:
+            prepared.append(prepare_fiche(type_operation, item, defer_signatures=True))
+        except FicheValidationError as e:
+            errors.append({'index': index, 'error': str(e), 'fields': e.fields})
+    errors.sort(key=lambda error: error['index'])
+    return prepared
+
+
+def _write_chunk(job_id, type_operation, fiches, numeros, indexes, errors):
+    """Écrire un paquet en une transaction; en cas d'échec, fiche par fiche pour
+    isoler les fiches fautives. `indexes`: index des fiches dans le lot.
+    Retourne le nombre de fiches écrites."""
+    try:
+        with db.transaction() as tx:
+            write_fiches(tx, type_operation, fiches, numeros)
+        return len(fiches)
+    except Exception as e:
+        logging.error(f"Lot {job_id}: échec du paquet {indexes[0]}-{indexes[-1]}, reprise unitaire: {e}")
+    written = 0
+    for index, fiche, numero in zip(indexes, fiches, numeros):
+        try:
+            with db.transaction() as tx:
+                write_fiches(tx, type_operation, [fiche], [numero])
+            written += 1
+        except Exception as e:
+            errors.append({'index': index, 'numero_fiche': numero, 'error': str(e)})
+    return written
+
+
+def _store_signatures(fiches, errors):
+    """Normaliser et déposer les signatures du lot dans le thread de la tâche
+    (les signatures communes ne sont converties qu'une fois). Retourne les
+    index des fiches prêtes à écrire."""
+    ready = []
+    for index, fiche in enumerate(fiches):
+        try:
+            store_fiche_signatures(fiche)
+            ready.append(index)
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e), 'fields': {'signatures': str(e)}})
+    return ready
+
+
+def _run_batch(job_id, type_operation, fiches, chunk_size):
+    errors = []
+    try:
+        jobs.update(job_id, status='running')
+        ready = _store_signatures(fiches, errors)
+        skipped = len(fiches) - len(ready)
+        jobs.update(job_id, done=skipped, errors=errors)
+        written = 0
+        if ready:
+            # Un seul aller-retour pour tous les numéros de fiche du lot
+            numeros = allocate_numero_fiche_block(type_operation, len(ready))
+            jobs.update(job_id, numero_premier=numeros[0], numero_dernier=numeros[-1])
+        for offset in range(0, len(ready), chunk_size):
+            indexes = ready[offset:offset + chunk_size]
+            written += _write_chunk(
+                job_id, type_operation, [fiches[index] for index in indexes],
+                numeros[offset:offset + chunk_size], indexes, errors
+            )
+            data_version.bump()
+            jobs.update(job_id, done=skipped + offset + len(indexes), written=written, errors=errors)
+        errors.sort(key=lambda error: error['index'])
+        jobs.update(job_id, status='done' if not errors else 'done_with_errors', errors=errors)
+    except Exception as e:
+        logging.error(f"Lot {job_id} échoué: {e}")
+        jobs.update(job_id, status='failed', error=str(e), errors=errors)
+    finally:
+        db.disconnect()
+
+
+def start_batch(type_operation, fiches, chunk_size=None):
+    """Mettre en file l'écriture de fiches déjà validées et retourner la tâche créée
+    (les tâches terminées plus anciennes que EXPORT_RETENTION sont supprimées)."""
+    jobs.purge_finished(Config.EXPORT_RETENTION)
+    job = jobs.create(f"{type_operation}s_batch", total=len(fiches), written=0)
+    _batch_executor.submit(_run_batch, job['id'], type_operation, fiches, chunk_size or Config.BATCH_CHUNK_SIZE)
+    return job
@@ -0,0 +1,119 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli  # optionnel (pip install brotli): préféré à gzip si le client l'accepte
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/x-ndjson', 'application/javascript',
+    'application/xml', 'image/svg+xml',
+)
+
+# Fichiers (send_file) compressés à la volée au-delà de cette taille: non
+MAX_PASSTHROUGH_SIZE = 1024 * 1024
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return any(mimetype.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+def choose_encoding():
+    """Encodage accepté par le client: 'br', 'gzip' ou None."""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted.quality('br') > 0:
+        return 'br'
+    if accepted.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding, level, quality):
+    """(compresser, vider, terminer) d'un compresseur incrémental."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=quality)
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: en-tête gzip
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def compress_bytes(data, encoding, level, quality):
+    if encoding == 'br':
+        return brotli.compress(data, quality=quality)
+    compress, _, finish = _compressor(encoding, level, quality)
+    return compress(data) + finish()
+
+
+def compress_stream(chunks, encoding, level, quality, flush_size, charset='utf-8'):
+    """Compresser un flux morceau par morceau. Les données sont vidées vers le
+    client tous les `flush_size` octets lus: le flux reste progressif sans
+    sacrifier le taux de compression des petites lignes (NDJSON, CSV)."""
+    compress, flush, finish = _compressor(encoding, level, quality)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            out = compress(chunk)
+            pending += len(chunk)
+            if pending >= flush_size:
+                out += flush()
+                pending = 0
+            if out:
+                yield out
+        yield finish()
+    finally:
+        # Fermer le générateur d'origine (stream_with_context libère le contexte)
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def init_compression(app):
+    """Compresser les réponses texte (JSON, NDJSON, HTML, CSS...) en gzip, ou
+    en brotli si le module est installé, au-delà de COMPRESS_MIN_SIZE octets.
+    Les réponses diffusées en flux sont compressées au fil de l'eau.
+
+    L'ETag d'une réponse compressée reçoit un suffixe (-gzip, -br): chaque
+    représentation garde une ETag forte distincte (voir http_cache.base_etag).
+    """
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+    flush_size = app.config.get('COMPRESS_STREAM_FLUSH', 16384)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers
+                or 'Content-Range' in response.headers or not _compressible(response)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.direct_passthrough:
+            # Fichier servi par send_file (CSS...): compressé s'il est raisonnable
+            if response.content_length is None or response.content_length > MAX_PASSTHROUGH_SIZE:
+                return response
+            response.direct_passthrough = False
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level, quality, flush_size)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            compressed = compress_bytes(data, encoding, level, quality)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
@@ -0,0 +1,357 @@
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+
+from config import Config
+from database.database import db
+from app.archive import fetch_with_archive, historique_sources, source_query
+from app.http_cache import data_version
+from app.jobs import jobs
+from app.signature_store import signature_bytes
+
+# Rendu des fiches en arrière-plan (exports ZIP)
+_export_executor = ThreadPoolExecutor(max_workers=Config.PDF_EXPORT_WORKERS, thread_name_prefix='pdf')
+
+FICHE_OPERATION_SELECT = """
+    SELECT
+        o.id, o.numero_fiche, o.type_operation, o.date_operation, o.date_remise, o.date_restitution, o.motif,
+        i.declarant_nom, i.telephone, i.email, i.poste, i.numero_serie_actif,
+        i.actifs_json, i.natures_json, i.autres_infos, i.signature_png,
+        e.nom as employe_nom,
+        s.nom as service_nom,
+        m.modele,
+        m.numero_serie,
+        tm.nom as type_materiel
+    FROM operations o
+    LEFT JOIN employes e ON o.employe_id = e.id
+    LEFT JOIN services s ON e.service_id = s.id
+    LEFT JOIN materiels m ON o.materiel_id = m.id
+    LEFT JOIN types_materiel tm ON m.type_id = tm.id
+    LEFT JOIN incidents i ON i.operation_id = o.id
+"""
+
+TITRES = {
+    'attribution': "Fiche d'attribution de matériel",
+    'restitution': "Fiche de restitution de matériel",
+    'incident': "Fiche de signalisation d'incident",
+}
+
+ROLES = [('redaction', 'Rédaction'), ('validation', 'Validation'), ('destinataire', 'Destinataire')]
+
+# Couleurs de l'interface (primary-color, primary-lighter)
+PRIMARY = colors.HexColor('#0ea5e9')
+PRIMARY_LIGHTER = colors.HexColor('#f0f9ff')
+
+
+def load_fiche(operation_id):
+    """Charger la fiche contenant l'opération: toutes les lignes du même
+    numéro de fiche (un matériel par ligne) et ses signatures. None si absente."""
+    rows, archived = fetch_with_archive(FICHE_OPERATION_SELECT + " WHERE o.id = %s", (operation_id,))
+    if not rows:
+        return None
+    # Fiche archivée: toutes ses lignes sont dans les archives (archivage par date)
+    head = rows[0]
+    if head['numero_fiche'] and head['type_operation'] != 'incident':
+        rows = db.execute_query(
+            source_query(FICHE_OPERATION_SELECT + " WHERE o.numero_fiche = %s ORDER BY o.id", archived),
+            (head['numero_fiche'],)
+        ) or rows
+        head = rows[0]
+
+    ids = [row['id'] for row in rows]
+    signatures = db.execute_query(
+        source_query(
+            "SELECT type_signature, nom, fonction, date_signature, fichier_signature FROM signatures "
+            f"WHERE operation_id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id",
+            archived
+        ),
+        ids
+    ) or []
+    return {'head': head, 'items': rows, 'signatures': signatures}
+
+
+def fiche_version(fiche):
+    """Empreinte du contenu de la fiche: change dès qu'une donnée rendue change."""
+    payload = json.dumps(fiche, default=str, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:20]
+
+
+def _fmt(value):
+    if value is None or value == '':
+        return '-'
+    if hasattr(value, 'strftime'):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
+
+
+def _signature_image(value, max_width=45 * mm, max_height=16 * mm):
+    data = signature_bytes(value)
+    if not data:
+        return '-'
+    width, height = ImageReader(io.BytesIO(data)).getSize()
+    scale = min(max_width / width, max_height / height)
+    return Image(io.BytesIO(data), width=width * scale, height=height * scale)
+
+
+def _table(rows, col_widths, header=False):
+    table = Table(rows, colWidths=col_widths, repeatRows=1 if header else 0)
+    style = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ]
+    if header:
+        style += [
+            ('BACKGROUND', (0, 0), (-1, 0), PRIMARY),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ]
+    else:
+        style += [
+            ('BACKGROUND', (0, 0), (0, -1), PRIMARY_LIGHTER),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ]
+    table.setStyle(TableStyle(style))
+    return table
+
+
+def render_fiche_pdf(fiche, output):
+    """Rendre la fiche en PDF vectoriel (texte et tableaux) dans `output`."""
+    styles = getSampleStyleSheet()
+    head = fiche['head']
+    type_operation = head['type_operation']
+    story = [
+        Paragraph(TITRES.get(type_operation, 'Fiche'), styles['Title']),
+        Paragraph(escape(f"N° {_fmt(head['numero_fiche'])} - {_fmt(head['date_operation'])}"), styles['Heading3']),
+        Spacer(1, 4 * mm),
+    ]
+
+    if type_operation == 'incident':
+        try:
+            actifs = json.loads(head['actifs_json']) if head.get('actifs_json') else []
+            natures = json.loads(head['natures_json']) if head.get('natures_json') else []
+        except json.JSONDecodeError:
+            actifs, natures = [], []
+        rows = [
+            ["Date de l'incident", _fmt(head['date_operation'])],
+            ['Déclarant', _fmt(head['declarant_nom'])],
+            ['Téléphone', _fmt(head['telephone'])],
+            ['Email', _fmt(head['email'])],
+            ['Poste', _fmt(head['poste'])],
+            ['Service', _fmt(head['service_nom'])],
+            ['Numéro de série du matériel', _fmt(head['numero_serie_actif'])],
+            ['Matériels touchés', ', '.join(a for a in actifs if a) or '-'],
+            ["Natures de l'incident", ', '.join(n for n in natures if n) or '-'],
+            ['Autres informations', Paragraph(escape(_fmt(head['autres_infos'])), styles['BodyText'])],
+            ['Signature', _signature_image(head.get('signature_png'))],
+        ]
+        story.append(_table(rows, [60 * mm, 110 * mm]))
+    else:
+        story.append(_table([
+            ["Nom de l'employé", _fmt(head['employe_nom'])],
+            ['Service', _fmt(head['service_nom'])],
+            ['Motif', Paragraph(escape(_fmt(head['motif'])), styles['BodyText'])],
+        ], [60 * mm, 110 * mm]))
+        story += [Spacer(1, 6 * mm), Paragraph('Matériels', styles['Heading3'])]
+
+        date_label, date_key = (
+            ('Date remise', 'date_remise') if type_operation == 'attribution'
+            else ('Date restitution', 'date_restitution')
+        )
+        items = [['Type matériel', 'Modèle', 'N° Série', date_label]]
+        items += [
+            [_fmt(item['type_materiel']), _fmt(item['modele']), _fmt(item['numero_serie']), _fmt(item[date_key])]
+            for item in fiche['items']
+        ]
+        story.append(_table(items, [40 * mm, 50 * mm, 45 * mm, 35 * mm], header=True))
+
+        story += [Spacer(1, 6 * mm), Paragraph('Signatures', styles['Heading3'])]
+        by_type = {sig['type_signature']: sig for sig in fiche['signatures']}
+        signatures = [['Rôle', 'Nom', 'Fonction', 'Date', 'Signature']]
+        for key, label in ROLES:
+            sig = by_type.get(key)
+            signatures.append([
+                label,
+                _fmt(sig and sig['nom']),
+                _fmt(sig and sig['fonction']),
+                _fmt(sig and sig['date_signature']),
+                _signature_image(sig and sig['fichier_signature']),
+            ])
+        story.append(_table(signatures, [25 * mm, 35 * mm, 35 * mm, 25 * mm, 50 * mm], header=True))
+
+    doc = SimpleDocTemplate(
+        output, pagesize=A4, leftMargin=20 * mm, rightMargin=20 * mm, topMargin=18 * mm, bottomMargin=18 * mm,
+        title=TITRES.get(type_operation, 'Fiche'), author='Gestion Matériel IT'
+    )
+    doc.build(story)
+
+
+def fiche_pdf_path(operation_id):
+    """(chemin, nom de téléchargement) du PDF en cache pour l'opération, rendu
+    au besoin. None si l'opération n'existe pas.
+
+    Le nom du fichier contient l'empreinte du contenu: une fiche modifiée (ex.
+    signature migrée) produit un nouveau fichier et les versions précédentes
+    de la fiche sont supprimées. Un fichier repère (<id>.ref) associe le PDF
+    à la version des données (app.http_cache): tant qu'elle ne change pas, le
+    PDF est servi sans aucune requête SQL; sinon la fiche est relue pour
+    calculer son empreinte (2 à 3 SELECT) et le PDF n'est rendu que si elle a
+    changé.
+    """
+    version = data_version.current()
+    cached = _read_ref(operation_id, version)
+    if cached:
+        return cached
+    fiche = load_fiche(operation_id)
+    if fiche is None:
+        return None
+    name = f"{operation_id}-{fiche_version(fiche)}.pdf"
+    path = os.path.join(Config.PDF_CACHE_DIR, name)
+    filename = fiche_filename(fiche['head'])
+    if not os.path.isfile(path):
+        os.makedirs(Config.PDF_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=Config.PDF_CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                render_fiche_pdf(fiche, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _remove_old_versions(operation_id, path)
+    _write_ref(operation_id, version, name, filename)
+    return path, filename
+
+
+def _ref_path(operation_id):
+    return os.path.join(Config.PDF_CACHE_DIR, f"{operation_id}.ref")
+
+
+def _read_ref(operation_id, version):
+    """(chemin, nom de téléchargement) si le repère est à la version courante."""
+    try:
+        with open(_ref_path(operation_id), 'r', encoding='utf-8') as f:
+            ref_version, name, filename = f.read().split('\n', 2)
+    except (OSError, ValueError):
+        return None
+    path = os.path.join(Config.PDF_CACHE_DIR, name)
+    if ref_version != version or not os.path.isfile(path):
+        return None
+    return path, filename
+
+
+def _write_ref(operation_id, version, name, filename):
+    fd, tmp_path = tempfile.mkstemp(dir=Config.PDF_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(f"{version}\n{name}\n{filename}")
+    os.replace(tmp_path, _ref_path(operation_id))
+
+
+def _remove_old_versions(operation_id, current):
+    """Supprimer les PDF des versions précédentes de la fiche (un
+    téléchargement en cours garde son fichier ouvert)."""
+    for path in glob.glob(os.path.join(Config.PDF_CACHE_DIR, f"{operation_id}-*.pdf")):
+        if path != current:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def fiche_filename(fiche_head):
+    return f"{fiche_head.get('numero_fiche') or 'fiche-' + str(fiche_head['id'])}.pdf"
+
+
+def _render_in_worker(operation_id):
+    """Rendu depuis un thread du pool: la connexion du thread est rendue ensuite."""
+    try:
+        return fiche_pdf_path(operation_id)
+    finally:
+        db.disconnect()
+
+
+def _run_export(job_id, date_debut, date_fin):
+    try:
+        # Une ligne par fiche: la première opération de chaque numéro de fiche,
+        # archives comprises si la période en contient
+        query = (
+            "SELECT MIN(id) AS id, numero_fiche FROM operations "
+            "WHERE date_operation >= %s AND date_operation <= %s "
+            "GROUP BY COALESCE(numero_fiche, CONCAT('#', id)), numero_fiche ORDER BY id"
+        )
+        fiches = []
+        for archived in historique_sources(date_debut, date_fin, archives=True):
+            rows = db.execute_query(source_query(query, archived), (date_debut, date_fin))
+            if rows is None:
+                raise Exception("Échec de lecture des fiches à exporter")
+            fiches.extend(rows)
+        fiches.sort(key=lambda row: row['id'])
+        jobs.update(job_id, status='running', total=len(fiches))
+
+        os.makedirs(Config.EXPORTS_DIR, exist_ok=True)
+        zip_path = os.path.join(Config.EXPORTS_DIR, f"{job_id}.zip")
+        tmp_path = zip_path + '.tmp'
+        errors = []
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            futures = [(row, _export_executor.submit(_render_in_worker, row['id'])) for row in fiches]
+            for done, (row, future) in enumerate(futures, start=1):
+                try:
+                    result = future.result()
+                    if result:
+                        archive.write(result[0], arcname=result[1])
+                except Exception as e:
+                    logging.error(f"Export PDF: échec de la fiche {row['id']}: {e}")
+                    errors.append({'operation_id': row['id'], 'error': str(e)})
+                if done % 20 == 0 or done == len(futures):
+                    jobs.update(job_id, done=done, errors=errors)
+        os.replace(tmp_path, zip_path)
+        jobs.update(job_id, status='done', file=zip_path)
+    except Exception as e:
+        logging.error(f"Export PDF {job_id} échoué: {e}")
+        jobs.update(job_id, status='failed', error=str(e))
+    finally:
+        db.disconnect()
+
+
+def purge_exports(max_age=None):
+    """Supprimer les ZIP d'export (et les fichiers temporaires abandonnés)
+    plus anciens que EXPORT_RETENTION. Retourne le nombre de fichiers supprimés."""
+    limit = time.time() - (Config.EXPORT_RETENTION if max_age is None else max_age)
+    removed = 0
+    for path in glob.glob(os.path.join(Config.EXPORTS_DIR, '*.zip*')):
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def start_export(date_debut, date_fin):
+    """Lancer l'export ZIP des fiches d'une période et retourner la tâche créée.
+    Les exports et les tâches terminées plus anciens que la rétention sont
+    supprimés au passage."""
+    purge_exports()
+    jobs.purge_finished(Config.EXPORT_RETENTION)
+    job = jobs.create('export_fiches', date_debut=date_debut, date_fin=date_fin)
+    # Le coordinateur a son propre thread pour ne pas occuper un slot du pool de rendu
+    threading.Thread(target=_run_export, args=(job['id'], date_debut, date_fin), daemon=True).start()
+    return job
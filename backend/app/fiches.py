@@ -0,0 +1,282 @@
+import unicodedata
+from datetime import datetime
+
+from app.assignments import apply_attributions, apply_restitutions
+from app.reference_cache import services_cache, types_materiel_cache
+from app.schemas import SIGNATURE_ROLES, SchemaError, validate_attribution, validate_restitution
+from app.search_index import index_operations
+from app.signature_image import SignatureBusyError
+from app.signature_store import check_signature, store_signatures
+from app.stats import record_operations, record_statut_changes
+
+# Paramètres propres à chaque type de fiche matériel
+FICHE_TYPES = {
+    'attribution': {
+        'statut': 'attribue',
+        'date_column': 'date_remise',
+        'date_field': 'dateRemise',
+        'validate': validate_attribution,
+        'label': "l'attribution",
+        'message': 'Attribution créée avec succès',
+    },
+    'restitution': {
+        'statut': 'disponible',
+        'date_column': 'date_restitution',
+        'date_field': 'dateRestitution',
+        'validate': validate_restitution,
+        'label': 'la restitution',
+        'message': 'Restitution créée avec succès',
+    },
+}
+
+
+# Création des nouveaux matériels avant l'upsert (voir write_fiches): statut
+# NULL explicite, la colonne a 'disponible' pour valeur par défaut
+MATERIEL_CREATE_QUERY = "INSERT IGNORE INTO materiels (type_id, modele, numero_serie, service_achat, date_achat, statut) VALUES"
+MATERIEL_CREATE_TEMPLATE = "(%s, %s, %s, %s, %s, NULL)"
+# Upsert multi-lignes des matériels
+MATERIEL_UPSERT_QUERY = "INSERT INTO materiels (type_id, modele, numero_serie, service_achat, date_achat, statut) VALUES"
+MATERIEL_UPSERT_SUFFIX = """
+    ON DUPLICATE KEY UPDATE
+        statut = VALUES(statut),
+        modele = VALUES(modele),
+        service_achat = VALUES(service_achat),
+        date_achat = VALUES(date_achat),
+        type_id = VALUES(type_id)
+"""
+
+
+class FicheValidationError(ValueError):
+    """Fiche refusée avant toute écriture (message destiné à l'utilisateur,
+    `fields` = erreurs par champ quand elles sont connues)."""
+
+    def __init__(self, message, status=400, fields=None):
+        super().__init__(message)
+        self.status = status
+        self.fields = fields
+
+
+def serie_key(numero_serie):
+    """Clé de correspondance d'un numéro de série (la collation MySQL ignore la casse)."""
+    return (numero_serie or '').strip().casefold()
+
+
+def collation_key(text):
+    """Clé de comparaison d'un texte selon la collation utf8mb4_unicode_ci (casse,
+    accents et espaces finaux ignorés)."""
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text or '') if not unicodedata.combining(c))
+    return text.rstrip().casefold()
+
+
+def employe_key(nom, service_id):
+    """Clé de correspondance d'un employé (voir collation_key)."""
+    return collation_key(nom), service_id
+
+
+def prepare_fiche(type_operation, data, defer_signatures=False):
+    """Valider une fiche d'attribution / de restitution et résoudre ses références.
+
+    Aucune écriture en base: la fiche est d'abord contrôlée par son schéma
+    compilé (app.schemas), les identifiants de service et de type viennent du
+    cache de référence et les signatures sont déposées dans le magasin (adressé
+    par contenu, sans effet si la fiche n'est finalement pas écrite).
+    Avec `defer_signatures`, elles sont seulement contrôlées: store_fiche_signatures
+    les dépose plus tard (imports par lot, en arrière-plan).
+    Lève FicheValidationError.
+    """
+    fiche = FICHE_TYPES[type_operation]
+    try:
+        data = fiche['validate'](data)
+    except SchemaError as e:
+        raise FicheValidationError(str(e), fields=e.fields)
+
+    service_id = services_cache.get_id(data['service'])
+    if not service_id:
+        raise FicheValidationError('Service introuvable', status=404, fields={'service': 'Service introuvable'})
+
+    signataires = {
+        role: (data[role]['nom'], data[role]['fonction'], data[role]['date']) for role in SIGNATURE_ROLES
+    }
+
+    materiels, unknown_types = [], {}
+    for index, materiel_data in enumerate(data['materiels']):
+        type_id = types_materiel_cache.get_id(materiel_data['type'])
+        if not type_id:
+            unknown_types[f'materiels[{index}].type'] = f"Type de matériel introuvable: {materiel_data['type']}"
+            continue
+        if type_operation == 'attribution':
+            service_achat = materiel_data['serviceAchat'] or ''
+            date_achat = materiel_data['dateRemise']
+        else:
+            service_achat = 'Service non spécifié'  # Valeur par défaut
+            date_achat = None  # Date d'achat non spécifiée
+        materiels.append({
+            'type_id': type_id,
+            'modele': materiel_data['modele'],
+            'serie': materiel_data['serie'],
+            'service_achat': service_achat,
+            'date_achat': date_achat,
+            'date': materiel_data[fiche['date_field']],
+        })
+    if unknown_types:
+        raise FicheValidationError(next(iter(unknown_types.values())), fields=unknown_types)
+
+    signatures = [data['signatures'][role] for role in SIGNATURE_ROLES]
+    try:
+        if defer_signatures:
+            for value in signatures:
+                check_signature(value)
+            signature_refs = None
+        else:
+            signature_refs = dict(zip(SIGNATURE_ROLES, store_signatures(signatures)))
+    except ValueError as e:
+        raise FicheValidationError(str(e), fields={'signatures': str(e)})
+    except SignatureBusyError as e:
+        raise FicheValidationError(str(e), status=503)
+
+    return {
+        'nom': data['nom'],
+        'service_id': service_id,
+        'motif': data['motif'],
+        'signataires': signataires,
+        'signatures': signatures if defer_signatures else None,
+        'signature_refs': signature_refs,
+        'materiels': materiels,
+    }
+
+
+def store_fiche_signatures(fiche):
+    """Déposer les signatures d'une fiche préparée avec `defer_signatures`, dans
+    le thread appelant. Lève ValueError si une signature est invalide."""
+    if fiche['signature_refs'] is None:
+        fiche['signature_refs'] = dict(zip(SIGNATURE_ROLES, store_signatures(fiche['signatures'], offload=False)))
+        fiche['signatures'] = None
+
+
+def _resolve_employes(tx, fiches):
+    """Identifiants des employés (nom, service) des fiches, créés au besoin.
+    Deux allers-retours au plus, quel que soit le nombre de fiches."""
+    wanted = {}
+    for fiche in fiches:
+        wanted.setdefault(employe_key(fiche['nom'], fiche['service_id']), (fiche['nom'], fiche['service_id']))
+    pairs = list(wanted.values())
+
+    def lookup():
+        rows = tx.fetchall(
+            "SELECT id, nom, service_id FROM employes WHERE (nom, service_id) IN "
+            f"({', '.join(['(%s, %s)'] * len(pairs))}) ORDER BY id",
+            [value for pair in pairs for value in pair]
+        )
+        found = {}
+        for row in rows:
+            found.setdefault(employe_key(row['nom'], row['service_id']), row['id'])
+        return found
+
+    ids = lookup()
+    missing = [pair for key, pair in wanted.items() if key not in ids]
+    if missing:
+        tx.insert_rows("INSERT INTO employes (nom, service_id) VALUES", missing)
+        ids = lookup()
+    if len(ids) != len(wanted):
+        raise Exception("Impossible de récupérer l'identifiant de l'employé")
+    return ids
+
+
+def write_fiches(tx, type_operation, fiches, numeros):
+    """Écrire des fiches préparées (prepare_fiche) dans la transaction `tx`.
+
+    `numeros`: un numéro de fiche par fiche. Chaque étape (employés, matériels,
+    opérations, statistiques, index, signatures) est un INSERT multi-lignes commun à toutes
+    les fiches: le nombre d'allers-retours ne dépend pas du nombre de fiches.
+    Retourne, pour chaque fiche, la liste des identifiants d'opérations créées.
+    """
+    fiche_type = FICHE_TYPES[type_operation]
+    today = datetime.now().date()
+    employe_ids = _resolve_employes(tx, fiches)
+
+    # Matériels existants et leur statut, verrouillés jusqu'au commit pour les
+    # statistiques. Les numéros inconnus sont d'abord créés sans statut: si une
+    # écriture concurrente crée le même numéro, l'INSERT IGNORE attend son
+    # commit et la relecture verrouillée retourne son statut (NULL = matériel
+    # créé ici). Puis upsert de tous les matériels.
+    materiel_rows = [
+        (m['type_id'], m['modele'], m['serie'], m['service_achat'], m['date_achat'], fiche_type['statut'])
+        for fiche in fiches for m in fiche['materiels']
+    ]
+    unique_rows = {serie_key(row[2]): row for row in materiel_rows}
+
+    def select_materiels(values):
+        return tx.fetchall(
+            f"SELECT id, numero_serie, statut FROM materiels WHERE numero_serie IN ({', '.join(['%s'] * len(values))}) FOR UPDATE",
+            values
+        )
+
+    previous = {serie_key(row['numero_serie']): row for row in select_materiels([row[2] for row in unique_rows.values()])}
+    missing = [row[:5] for key, row in sorted(unique_rows.items()) if key not in previous]
+    if missing:
+        tx.insert_rows(MATERIEL_CREATE_QUERY, missing, template=MATERIEL_CREATE_TEMPLATE)
+        previous.update({serie_key(row['numero_serie']): row for row in select_materiels([row[2] for row in missing])})
+    tx.insert_rows(MATERIEL_UPSERT_QUERY, materiel_rows, suffix=MATERIEL_UPSERT_SUFFIX)
+    materiel_ids = {key: row['id'] for key, row in previous.items()}
+    record_statut_changes(tx, [(row['statut'], fiche_type['statut']) for row in previous.values()])
+
+    # Créer les opérations (une par matériel)
+    operation_rows = []
+    for fiche, numero_fiche in zip(fiches, numeros):
+        employe_id = employe_ids[employe_key(fiche['nom'], fiche['service_id'])]
+        for m in fiche['materiels']:
+            materiel_id = materiel_ids.get(serie_key(m['serie']))
+            if not materiel_id:
+                raise Exception("Impossible de récupérer l'identifiant du matériel")
+            operation_rows.append(
+                (numero_fiche, type_operation, employe_id, materiel_id, today, m['date'], fiche['motif'])
+            )
+    tx.insert_rows(
+        f"INSERT INTO operations (numero_fiche, type_operation, employe_id, materiel_id, date_operation, {fiche_type['date_column']}, motif) VALUES",
+        operation_rows
+    )
+    created = tx.fetchall(
+        "SELECT id, materiel_id, numero_fiche, employe_id FROM operations "
+        f"WHERE numero_fiche IN ({', '.join(['%s'] * len(numeros))}) ORDER BY id",
+        list(numeros)
+    )
+    if len(created) != len(operation_rows):
+        raise Exception(f"Échec de création des opérations de {fiche_type['label']}")
+    record_operations(tx, [
+        (today, type_operation, fiche['service_id'], m['type_id']) for fiche in fiches for m in fiche['materiels']
+    ])
+    by_numero = {}
+    for row in created:
+        by_numero.setdefault(row['numero_fiche'], []).append(row)
+
+    # Mettre à jour l'index des détenteurs actuels (la dernière opération l'emporte)
+    if type_operation == 'attribution':
+        service_by_employe = {employe_ids[employe_key(f['nom'], f['service_id'])]: f['service_id'] for f in fiches}
+        apply_attributions(tx, list({
+            row['materiel_id']: (
+                row['materiel_id'], row['employe_id'], service_by_employe[row['employe_id']],
+                today, row['numero_fiche'], row['id']
+            )
+            for row in created
+        }.values()))
+    else:
+        apply_restitutions(tx, {row['materiel_id'] for row in created})
+
+    # Indexer les opérations pour la recherche de l'historique
+    series_by_id = {materiel_id: serie for serie, materiel_id in materiel_ids.items()}
+    search_entries, signature_rows, operation_ids = [], [], []
+    for fiche, numero_fiche in zip(fiches, numeros):
+        rows = by_numero[numero_fiche]
+        operation_ids.append([row['id'] for row in rows])
+        search_entries += [(row['id'], [fiche['nom']], [series_by_id.get(row['materiel_id'])]) for row in rows]
+        # Signatures rattachées à la première opération de la fiche
+        signature_rows += [
+            (rows[0]['id'], role, *fiche['signataires'][role], fiche['signature_refs'][role])
+            for role in SIGNATURE_ROLES
+        ]
+    index_operations(tx, search_entries)
+    tx.insert_rows(
+        "INSERT INTO signatures (operation_id, type_signature, nom, fonction, date_signature, fichier_signature) VALUES",
+        signature_rows
+    )
+    return operation_ids
@@ -0,0 +1,234 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+# Colonnes exportées (clé de la ligne d'historique formatée, en-tête)
+EXPORT_COLUMNS = (
+    ('numero_fiche', 'N° fiche'),
+    ('type_operation', 'Type'),
+    ('date_operation', 'Date'),
+    ('date_remise', 'Date de remise'),
+    ('date_restitution', 'Date de restitution'),
+    ('employe_nom', 'Employé / déclarant'),
+    ('service_nom', 'Service'),
+    ('type_materiel', 'Type de matériel'),
+    ('modele', 'Matériel / modèle'),
+    ('numero_serie', 'Numéro de série'),
+    ('motif', 'Motif'),
+)
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# Lignes accumulées avant d'envoyer un morceau au client
+ROWS_PER_CHUNK = 500
+# Limite d'une feuille Excel (en-tête compris): au-delà, feuille suivante
+XLSX_MAX_ROWS = 1048576
+
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_EXCEL_EPOCH = date(1899, 12, 30)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+def export_csv(rows):
+    """Diffuser des lignes d'historique en CSV (UTF-8 avec BOM, séparateur « ; »
+    pour Excel en français). L'en-tête part avant la première requête SQL."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', lineterminator='\r\n')
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    yield '\ufeff' + buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    count = 0
+    for row in rows:
+        values = []
+        for key, _ in EXPORT_COLUMNS:
+            value = _text(row.get(key))
+            # Neutraliser les formules (injection CSV à l'ouverture dans un tableur)
+            if len(value) > 1 and value.startswith(_FORMULA_PREFIXES):
+                value = "'" + value
+            values.append(value)
+        writer.writerow(values)
+        count += 1
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Sortie non positionnable de zipfile: les octets écrits sont vidés vers le
+    client au fur et à mesure (descripteurs de données ZIP après chaque entrée)."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        # Date Excel: nombre de jours depuis 1899-12-30, style 1 (format date)
+        return f'<c s="1"><v>{(value - _EXCEL_EPOCH).days}</v></c>'
+    text = escape(_XML_INVALID_RE.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(map(_xlsx_cell, values)) + '</row>'
+
+
+XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/></sheetView></sheetViews>'
+    '<sheetData>'
+)
+XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _xlsx_package_parts(sheet_count):
+    """Parties fixes du classeur, écrites à la fin (nombre de feuilles connu)."""
+    sheets = range(1, sheet_count + 1)
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        + ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in sheets
+        )
+        + '</Types>'
+    )
+    root_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>'
+    )
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name="Historique {i}" sheetId="{i}" r:id="rId{i}"/>' for i in sheets)
+        + '</sheets></workbook>'
+    )
+    workbook_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(
+            f'<Relationship Id="rId{i}" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{i}.xml"/>'
+            for i in sheets
+        )
+        + f'<Relationship Id="rId{sheet_count + 1}" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>'
+    )
+    return [
+        ('[Content_Types].xml', content_types),
+        ('_rels/.rels', root_rels),
+        ('xl/workbook.xml', workbook),
+        ('xl/_rels/workbook.xml.rels', workbook_rels),
+        ('xl/styles.xml', XLSX_STYLES),
+    ]
+
+
+def export_xlsx(rows):
+    """Diffuser des lignes d'historique en classeur XLSX construit à la main.
+
+    Les feuilles sont écrites en XML au fil des lignes dans une archive ZIP en
+    flux (zipfile sur une sortie non positionnable): la mémoire utilisée ne
+    dépend pas du nombre de lignes. Une nouvelle feuille commence tous les
+    XLSX_MAX_ROWS lignes (limite d'Excel).
+    """
+    output = _StreamBuffer()
+    # En-tête en gras (style 2)
+    header = '<row>' + ''.join(
+        f'<c t="inlineStr" s="2"><is><t>{escape(title)}</t></is></c>' for _, title in EXPORT_COLUMNS
+    ) + '</row>'
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=4) as archive:
+        sheet_count, sheet, sheet_rows, pending = 0, None, 0, []
+
+        def open_sheet():
+            nonlocal sheet_count, sheet, sheet_rows
+            sheet_count += 1
+            sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+            sheet.write((XLSX_SHEET_HEAD + header).encode('utf-8'))
+            sheet_rows = 1
+
+        open_sheet()
+        yield output.drain()
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet.write(''.join(pending).encode('utf-8'))
+                pending = []
+                sheet.write(XLSX_SHEET_TAIL.encode('utf-8'))
+                sheet.close()
+                open_sheet()
+            pending.append(_xlsx_row([row.get(key) for key, _ in EXPORT_COLUMNS]))
+            sheet_rows += 1
+            if len(pending) >= ROWS_PER_CHUNK:
+                sheet.write(''.join(pending).encode('utf-8'))
+                pending = []
+                data = output.drain()
+                if data:
+                    yield data
+        sheet.write((''.join(pending) + XLSX_SHEET_TAIL).encode('utf-8'))
+        sheet.close()
+        for name, content in _xlsx_package_parts(sheet_count):
+            archive.writestr(name, content)
+    yield output.drain()
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from flask import current_app, request
+
+from config import Config
+
+# À incrémenter quand le format JSON d'une réponse change: les ETag déjà
+# distribuées ne doivent plus valider l'ancien contenu
+PAYLOAD_VERSION = '2'
+
+# Suffixes ajoutés à l'ETag par la compression (une ETag forte par représentation)
+ENCODING_SUFFIXES = ('-gzip', '-br')
+
+
+class DataVersion:
+    """Version des données métier (opérations, signatures, incidents).
+
+    Stockée dans un petit fichier pour être partagée par tous les workers:
+    lire la version ne coûte aucune requête SQL. Toute écriture validée doit
+    appeler `bump()` après le COMMIT; une modification faite directement en
+    base (hors application et scripts) ne change pas la version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def current(self):
+        try:
+            with open(self.path, 'r', encoding='ascii') as f:
+                return f.read().strip() or '0'
+        except OSError:
+            return '0'
+
+    def bump(self):
+        """Changer la version (à appeler après chaque écriture validée)."""
+        token = f"{time.time_ns():x}.{os.getpid()}"
+        directory = os.path.dirname(self.path) or '.'
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(token)
+            os.replace(tmp_path, self.path)
+        return token
+
+
+data_version = DataVersion(Config.DATA_VERSION_FILE)
+
+
+def make_etag(*parts):
+    """ETag forte dérivée des éléments donnés et de la version du format."""
+    text = '|'.join((PAYLOAD_VERSION,) + tuple(str(part) for part in parts))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def data_etag(*parts):
+    """ETag d'une vue des données métier: change à chaque écriture validée."""
+    return make_etag(data_version.current(), *parts)
+
+
+def base_etag(tag):
+    """ETag sans le suffixe de compression."""
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)]
+    return tag
+
+
+def not_modified(etag):
+    """Réponse 304 si le client possède déjà cette version (If-None-Match),
+    sinon None. À appeler avant toute requête SQL."""
+    tags = request.if_none_match
+    if not tags:
+        return None
+    if tags.star_tag:
+        matched = etag
+    else:
+        matched = next((tag for tag in tags.as_set(include_weak=True) if base_etag(tag) == etag), None)
+        if matched is None:
+            return None
+    response = current_app.response_class(status=304)
+    response.set_etag(matched)
+    response.cache_control.no_cache = True
+    return response
+
+
+def with_etag(response, etag):
+    """Ajouter l'ETag à une réponse 200; le client la revalide à chaque usage."""
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+class StaticFingerprints:
+    """Empreinte du contenu des fichiers statiques, ajoutée à leurs URL (?v=...)
+    pour pouvoir les mettre en cache longtemps côté navigateur."""
+
+    def __init__(self, root):
+        self.root = root
+        self._cache = {}  # filename -> (mtime_ns, empreinte)
+
+    def get(self, filename):
+        path = os.path.join(self.root, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._cache.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+        self._cache[filename] = (mtime, fingerprint)
+        return fingerprint
+
+
+def init_static_cache(app):
+    """URL des fichiers statiques versionnées par leur contenu et servies avec
+    un Cache-Control longue durée (immutable) quand la version est présente."""
+    fingerprints = StaticFingerprints(app.static_folder)
+    max_age = app.config.get('STATIC_MAX_AGE', 365 * 24 * 3600)
+
+    @app.url_defaults
+    def add_static_fingerprint(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = fingerprints.get(values['filename'])
+            if fingerprint:
+                values['v'] = fingerprint
+
+    @app.after_request
+    def cache_static(response):
+        if request.endpoint == 'static' and request.args.get('v') and response.status_code in (200, 304):
+            response.cache_control.no_cache = None  # posé par send_file sans max-age
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.cache_control.immutable = True
+        return response
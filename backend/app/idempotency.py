@@ -0,0 +1,197 @@
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from flask import Response, current_app, jsonify, request
+
+from config import Config
+from database.database import db
+
+# Clés d'idempotence des formulaires (en-tête Idempotency-Key, table
+# idempotency_keys, migration 7). La première requête d'une clé réserve la
+# ligne, exécute l'écriture et y stocke sa réponse; un renvoi (double clic,
+# nouvelle tentative du navigateur) reçoit cette réponse sans rien réécrire.
+# Seules les réponses 2xx sont conservées: après un refus ou une erreur, la
+# clé est libérée et la même saisie peut être renvoyée.
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 100
+
+RESERVE_QUERY = """
+    INSERT IGNORE INTO idempotency_keys (cle, endpoint, empreinte, statut, traite_depuis, expires_at)
+    VALUES (%s, %s, %s, 'en_cours', NOW(), NOW() + INTERVAL %s SECOND)
+"""
+
+
+def _fingerprint():
+    return hashlib.sha256(request.get_data()).hexdigest()
+
+
+def _lock_name(key, endpoint):
+    # Nom de verrou MySQL: 64 caractères au plus
+    return 'idempotency:' + hashlib.sha1(f"{endpoint}:{key}".encode('utf-8')).hexdigest()
+
+
+def _replay(row):
+    response = Response(row['reponse'], status=row['status_code'], mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _conflict(message, status):
+    return jsonify({'success': False, 'error': message}), status
+
+
+def _acquire(key, endpoint, fingerprint, lock_name):
+    """Réserver la clé ou retourner la réponse de la requête qui l'a traitée.
+
+    La requête qui traite une clé détient le verrou nommé GET_LOCK sur sa
+    connexion jusqu'à la fin de l'écriture: un doublon attend ce verrou
+    (IDEMPOTENCY_WAIT_TIMEOUT au plus) puis lit le résultat. Le verrou
+    disparaît avec la connexion d'un worker arrêté en cours de traitement:
+    une ligne 'en_cours' trouvée en détenant le verrou est donc abandonnée
+    et reprise, quelle que soit la durée de l'écriture.
+
+    Retourne None si la requête courante doit s'exécuter (verrou détenu),
+    sinon la réponse à renvoyer (rejeu, conflit ou délai d'attente dépassé).
+    """
+    locked = db.execute_query("SELECT GET_LOCK(%s, %s) AS verrou", (lock_name, Config.IDEMPOTENCY_WAIT_TIMEOUT))
+    if not locked or locked[0]['verrou'] is None:
+        raise Exception("Échec du verrou de la clé d'idempotence")
+    if not locked[0]['verrou']:
+        return _conflict("Une requête identique est en cours de traitement, réessayez", 409)
+    try:
+        reserved = db.execute_query(RESERVE_QUERY, (key, endpoint, fingerprint, Config.IDEMPOTENCY_TTL))
+        if reserved is None:
+            raise Exception("Échec de réservation de la clé d'idempotence")
+        if reserved:
+            return None
+        rows = db.execute_query(
+            "SELECT empreinte, statut, status_code, reponse FROM idempotency_keys WHERE cle = %s AND endpoint = %s",
+            (key, endpoint)
+        )
+        if rows is None:
+            raise Exception("Échec de lecture de la clé d'idempotence")
+        if not rows:
+            # Clé expirée et supprimée entre-temps: nouvelle réservation
+            if not db.execute_query(RESERVE_QUERY, (key, endpoint, fingerprint, Config.IDEMPOTENCY_TTL)):
+                raise Exception("Échec de réservation de la clé d'idempotence")
+            return None
+        row = rows[0]
+        if row['empreinte'] != fingerprint:
+            response = _conflict("Clé d'idempotence déjà utilisée pour une autre requête", 422)
+        elif row['statut'] == 'termine':
+            response = _replay(row)
+        else:
+            logging.warning(f"Clé d'idempotence {key} reprise (traitement précédent interrompu)")
+            db.execute_query(
+                "UPDATE idempotency_keys SET traite_depuis = NOW() WHERE cle = %s AND endpoint = %s",
+                (key, endpoint)
+            )
+            return None
+    except Exception:
+        _unlock(lock_name)
+        raise
+    _unlock(lock_name)
+    return response
+
+
+def _unlock(lock_name):
+    released = db.execute_query("SELECT RELEASE_LOCK(%s) AS libere", (lock_name,))
+    if not released or not released[0]['libere']:
+        # Ne pas rendre au pool une connexion qui détiendrait encore le verrou
+        logging.error(f"Verrou {lock_name} non libéré, connexion abandonnée")
+        db.disconnect(discard=True)
+
+
+def _release(key, endpoint):
+    if db.execute_query("DELETE FROM idempotency_keys WHERE cle = %s AND endpoint = %s", (key, endpoint)) is None:
+        logging.error(f"Clé d'idempotence {key} non libérée (expirera dans {Config.IDEMPOTENCY_TTL}s)")
+
+
+def idempotent(view):
+    """Rendre une route d'écriture idempotente pour l'en-tête Idempotency-Key
+    (sans en-tête, la route s'exécute normalement)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER, '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _conflict(f"En-tête {HEADER} trop long ({MAX_KEY_LENGTH} caractères maximum)", 400)
+        endpoint = request.endpoint
+        lock_name = _lock_name(key, endpoint)
+
+        waited = _acquire(key, endpoint, _fingerprint(), lock_name)
+        if waited is not None:
+            return waited
+        try:
+            try:
+                response = current_app.make_response(view(*args, **kwargs))
+            except Exception:
+                _release(key, endpoint)
+                raise
+            if 200 <= response.status_code < 300:
+                stored = db.execute_query(
+                    "UPDATE idempotency_keys SET statut = 'termine', status_code = %s, reponse = %s "
+                    "WHERE cle = %s AND endpoint = %s",
+                    (response.status_code, response.get_data(as_text=True), key, endpoint)
+                )
+                if not stored:
+                    logging.error(f"Réponse de la clé d'idempotence {key} non enregistrée")
+            else:
+                _release(key, endpoint)
+        finally:
+            _unlock(lock_name)
+        return response
+    return wrapper
+
+
+def sweep_expired(batch_size=1000):
+    """Supprimer les clés expirées par lots (verrous courts). Retourne le nombre supprimé."""
+    total = 0
+    while True:
+        deleted = db.execute_query("DELETE FROM idempotency_keys WHERE expires_at < NOW() LIMIT %s", (batch_size,))
+        if not deleted:
+            return total
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+_sweeper = {'pid': None}
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            deleted = sweep_expired()
+            if deleted:
+                logging.info(f"Clés d'idempotence expirées supprimées: {deleted}")
+        except Exception as e:
+            logging.warning(f"Échec du nettoyage des clés d'idempotence: {e}")
+        finally:
+            db.disconnect()
+
+
+def init_idempotency(app):
+    """Démarrer le nettoyage périodique des clés expirées, une fois par processus
+    worker, à sa première requête (l'application est chargée avant le fork)."""
+    interval = app.config['IDEMPOTENCY_SWEEP_INTERVAL']
+    if interval <= 0:
+        return
+
+    @app.before_request
+    def start_sweeper():
+        if _sweeper['pid'] == os.getpid():
+            return
+        with _sweeper_lock:
+            if _sweeper['pid'] == os.getpid():
+                return
+            _sweeper['pid'] = os.getpid()
+            threading.Thread(target=_sweep_loop, args=(interval,), daemon=True, name='idempotency-sweeper').start()
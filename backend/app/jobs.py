@@ -0,0 +1,90 @@
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from config import Config
+
+FINISHED_STATUSES = ('done', 'done_with_errors', 'failed')
+
+
+class JobRegistry:
+    """État des tâches d'arrière-plan (exports, imports), stocké en JSON sur disque.
+
+    Chaque tâche est un fichier <JOBS_DIR>/<id>.json: n'importe quel processus
+    worker peut donc répondre à une demande de statut, quel que soit celui qui
+    exécute la tâche.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def _write(self, job):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self._path(job['id']))
+
+    def create(self, kind, **fields):
+        """Créer une tâche en attente et retourner son état."""
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'pending',
+            'total': 0,
+            'done': 0,
+            'errors': [],
+            'created_at': time.time(),
+            'updated_at': time.time(),
+            **fields,
+        }
+        with self._lock:
+            self._write(job)
+        return job
+
+    def get(self, job_id):
+        """État d'une tâche, ou None si l'identifiant est inconnu."""
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, job_id, **fields):
+        """Mettre à jour des champs d'une tâche (lecture-modification-écriture)."""
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            self._write(job)
+        return job
+
+    def purge_finished(self, max_age):
+        """Supprimer les tâches terminées (ou échouées) depuis plus de `max_age`
+        secondes. Retourne le nombre de tâches supprimées."""
+        limit = time.time() - max_age
+        removed = 0
+        for path in glob.glob(os.path.join(self.root, '*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    job = json.load(f)
+                if job.get('status') in FINISHED_STATUSES and job.get('updated_at', 0) < limit:
+                    os.remove(path)
+                    removed += 1
+            except (OSError, ValueError):
+                pass
+        return removed
+
+
+jobs = JobRegistry(Config.JOBS_DIR)
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import threading
+import time
+
+from flask import request, g
+
+from database.database import db
+
+# Bornes des histogrammes de durée (secondes, convention Prometheus)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SIGNATURE_SIZE_BUCKETS = (1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Histogramme cumulatif par jeu d'étiquettes (format d'exposition Prometheus)."""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # étiquettes -> [compteurs par borne..., somme, total]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-2] + [series[-1]]):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+def query_id(query_fingerprint):
+    """Identifiant court d'une empreinte de requête (étiquette Prometheus)."""
+    return hashlib.sha1(query_fingerprint.encode('utf-8')).hexdigest()[:12]
+
+
+class Metrics:
+    """Métriques HTTP et SQL du processus courant.
+
+    Avec plusieurs workers gunicorn, chaque processus expose ses propres
+    compteurs: le collecteur agrège les séries de chaque worker.
+    """
+
+    def __init__(self):
+        self.http_duration = Histogram(
+            'http_request_duration_seconds', "Durée des requêtes HTTP par endpoint",
+            ('endpoint', 'method', 'status'), DURATION_BUCKETS
+        )
+        self.http_queries = Histogram(
+            'http_request_db_queries', "Requêtes SQL exécutées par requête HTTP",
+            ('endpoint',), QUERY_COUNT_BUCKETS
+        )
+        self.query_duration = Histogram(
+            'db_query_duration_seconds', "Durée des requêtes SQL par empreinte et endpoint",
+            ('query_id', 'endpoint'), DURATION_BUCKETS
+        )
+        self.query_rows = Histogram(
+            'db_query_rows', "Lignes lues ou écrites par requête SQL",
+            ('query_id',), (0, 1, 10, 100, 1000, 10000, 100000)
+        )
+        self.signature_bytes = Histogram(
+            'signature_bytes', "Taille des signatures PNG reçues et stockées (octets)",
+            ('etape',), SIGNATURE_SIZE_BUCKETS
+        )
+        self._fingerprints = {}
+
+    def observe_query(self, query_fingerprint, duration_ms, rows, endpoint):
+        qid = query_id(query_fingerprint)
+        self._fingerprints.setdefault(qid, query_fingerprint)
+        self.query_duration.observe((qid, endpoint or 'hors_requete'), duration_ms / 1000)
+        if rows is not None and rows >= 0:
+            self.query_rows.observe((qid,), rows)
+
+    def render(self):
+        lines = []
+        for histogram in (self.http_duration, self.http_queries, self.query_duration, self.query_rows,
+                          self.signature_bytes):
+            lines += histogram.render()
+        lines += ["# HELP db_query_info Texte normalisé de chaque empreinte de requête", "# TYPE db_query_info gauge"]
+        for qid, text in sorted(self._fingerprints.items()):
+            lines.append(f'db_query_info{{query_id="{qid}",fingerprint="{_escape(text[:500])}"}} 1')
+        pool = db.pool_stats()
+        for key, value in pool.items():
+            kind = 'counter' if key not in ('size', 'open', 'idle', 'in_use') else 'gauge'
+            lines += [f"# TYPE db_pool_{key} {kind}", f"db_pool_{key} {value}"]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def init_metrics(app):
+    """Instrumenter chaque requête HTTP: journal des requêtes SQL, en-tête
+    Server-Timing, détection des N+1 et histogrammes par endpoint."""
+    db.query_listeners.append(metrics.observe_query)
+    n_plus_one = app.config.get('DB_N_PLUS_ONE_THRESHOLD', 10)
+
+    @app.before_request
+    def start_query_log():
+        g.request_started = time.perf_counter()
+        db.begin_query_log(request.endpoint or 'inconnu')
+
+    @app.after_request
+    def report_query_log(response):
+        log = db.query_log
+        started = g.get('request_started')
+        if log is None or started is None:
+            return response
+        total_ms = (time.perf_counter() - started) * 1000
+        # Les requêtes d'une réponse diffusée en flux ne sont pas encore faites
+        response.headers.add(
+            'Server-Timing', f'db;dur={log.duration_ms:.2f};desc="{log.count} requetes SQL", app;dur={total_ms:.2f}'
+        )
+        for query_fingerprint, count in log.by_fingerprint.items():
+            if count >= n_plus_one and query_fingerprint.upper().startswith('SELECT'):
+                logging.warning(f"N+1 probable sur {log.endpoint}: {count} × {query_fingerprint}")
+        metrics.http_duration.observe((log.endpoint, request.method, str(response.status_code)), total_ms / 1000)
+        metrics.http_queries.observe((log.endpoint,), log.count)
+        return response
+
+    @app.teardown_request
+    def end_query_log(error):
+        db.end_query_log()
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from database.database import db
+
+# Mapping des types d'opération vers les préfixes
+PREFIX_MAP = {
+    'attribution': 'ATB',
+    'restitution': 'RST',
+    'incident': 'ICD'
+}
+
+# Un seul aller-retour: le compteur (prefixe, jour) est incrémenté sous le
+# verrou de ligne de la clé primaire et sa nouvelle valeur est renvoyée au
+# client via LAST_INSERT_ID(expr), sans SELECT supplémentaire.
+ALLOCATE_QUERY = """
+    INSERT INTO numero_fiche_sequences (prefixe, jour, dernier_numero)
+    VALUES (%s, %s, LAST_INSERT_ID(%s))
+    ON DUPLICATE KEY UPDATE dernier_numero = LAST_INSERT_ID(dernier_numero + %s)
+"""
+
+
+def format_numero_fiche(prefix, day, number):
+    """Formater un numéro de fiche: PREFIXE-AAAAMMJJ-001"""
+    return f"{prefix}-{day.strftime('%Y%m%d')}-{number:03d}"
+
+
+def allocate_numero_fiche_block(type_operation, count):
+    """Réserver `count` numéros de fiche consécutifs pour aujourd'hui.
+
+    Sûr en concurrence: deux appels simultanés obtiennent des plages disjointes.
+    Les numéros d'une transaction annulée ne sont pas réutilisés (trous possibles).
+    """
+    if count < 1:
+        raise ValueError("Le nombre de numéros à réserver doit être positif")
+    prefix = PREFIX_MAP.get(type_operation, 'OPR')
+    today = datetime.now().date()
+
+    rc = db.execute_query(ALLOCATE_QUERY, (prefix, today, count, count))
+    if rc is None:
+        raise Exception(f"Échec d'allocation du numéro de fiche {prefix}-{today:%Y%m%d}")
+    last = db.get_last_insert_id()
+    if not last:
+        raise Exception("Impossible de récupérer le compteur de numéros de fiche")
+    return [format_numero_fiche(prefix, today, n) for n in range(last - count + 1, last + 1)]
+
+
+def allocate_numero_fiche(type_operation):
+    """Réserver un numéro de fiche unique au format: type-date-001"""
+    return allocate_numero_fiche_block(type_operation, 1)[0]
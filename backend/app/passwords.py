@@ -0,0 +1,79 @@
+import hmac
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from config import Config
+from database.database import db
+
+# Préfixes des formats produits par werkzeug ("méthode$sel$empreinte")
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+# Pool borné pour le KDF: il plafonne le nombre de calculs simultanés par
+# processus (CPU et mémoire scrypt, 16 Mo chacun au coût par défaut), quel
+# que soit le nombre de connexions en cours. Il ne libère pas le thread de
+# requête, qui attend le résultat: une rafale de connexions fait la queue au
+# lieu de saturer la mémoire.
+_kdf_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_KDF_WORKERS, thread_name_prefix='kdf')
+
+
+def hash_password(password, method=None):
+    """Hacher un mot de passe avec la méthode configurée (PASSWORD_HASH_METHOD)."""
+    return generate_password_hash(password, method=method or Config.PASSWORD_HASH_METHOD)
+
+
+def is_hashed(stored):
+    return isinstance(stored, str) and stored.startswith(HASH_PREFIXES) and stored.count('$') == 2
+
+
+def needs_rehash(stored):
+    """Vrai si la valeur stockée est en clair ou hachée avec un autre coût que celui configuré."""
+    if not is_hashed(stored):
+        return True
+    return stored.split('$', 1)[0] != Config.PASSWORD_HASH_METHOD
+
+
+def verify_password(password, stored):
+    """Vérifier un mot de passe contre la valeur stockée (hachée ou ancienne valeur en clair)."""
+    if not stored:
+        return False
+    if is_hashed(stored):
+        return check_password_hash(stored, password)
+    # Anciens comptes: mot de passe en clair, comparaison à temps constant
+    return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+
+def verify_password_bounded(password, stored):
+    """verify_password exécuté dans le pool KDF, pour plafonner les calculs
+    simultanés (le thread appelant attend, au plus PASSWORD_KDF_TIMEOUT)."""
+    return _kdf_executor.submit(verify_password, password, stored).result(timeout=Config.PASSWORD_KDF_TIMEOUT)
+
+
+def _rehash(user_id, password, old_value):
+    try:
+        new_value = hash_password(password)
+        # Ne remplacer que si la valeur n'a pas changé entre-temps
+        rc = db.execute_query(
+            "UPDATE utilisateurs SET mot_de_passe_hash = %s WHERE id = %s AND mot_de_passe_hash = %s",
+            (new_value, user_id, old_value)
+        )
+        if rc:
+            logging.info(f"Mot de passe de l'utilisateur {user_id} re-haché ({Config.PASSWORD_HASH_METHOD})")
+    except Exception as e:
+        logging.warning(f"Échec du re-hachage du mot de passe de l'utilisateur {user_id}: {e}")
+    finally:
+        db.disconnect()
+
+
+def schedule_rehash(user_id, password, old_value):
+    """Re-hacher en arrière-plan après une connexion réussie (sans retarder la réponse)."""
+    _kdf_executor.submit(_rehash, user_id, password, old_value)
+
+
+def hash_passwords_parallel(passwords, executor=None, chunksize=16):
+    """Hacher une liste de mots de passe, en parallèle dans `executor`
+    (un ProcessPoolExecutor pour les imports en masse) s'il est fourni."""
+    if executor is None:
+        return [hash_password(p) for p in passwords]
+    return list(executor.map(hash_password, passwords, chunksize=chunksize))
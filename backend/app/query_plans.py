@@ -0,0 +1,67 @@
+from datetime import date
+
+from app.archive import archive_query
+from app.assignments import CURRENT_ASSIGNMENT_SELECT
+from app.fiche_pdf import FICHE_OPERATION_SELECT
+from app.routes import HISTORIQUE_LIST_SELECT, HISTORIQUE_OPERATIONS_SELECT
+from app.search_index import search_join
+
+# Requêtes fréquentes dont le plan d'exécution est vérifié par `migrate.py --check-plans`.
+# (nom, requête, paramètres d'exemple)
+HISTORIQUE_ORDER = " ORDER BY o.date_operation DESC, o.id DESC LIMIT %s"
+
+HOT_QUERIES = [
+    ("historique: première page",
+     HISTORIQUE_LIST_SELECT + " WHERE 1=1" + HISTORIQUE_ORDER, [101]),
+    ("historique: page suivante (curseur)",
+     HISTORIQUE_LIST_SELECT
+     + " WHERE 1=1 AND (o.date_operation < %s OR (o.date_operation = %s AND o.id < %s))" + HISTORIQUE_ORDER,
+     [date.today(), date.today(), 1000000, 101]),
+    ("historique: période",
+     HISTORIQUE_LIST_SELECT + " WHERE 1=1 AND o.date_operation >= %s AND o.date_operation <= %s" + HISTORIQUE_ORDER,
+     [date(date.today().year, 1, 1), date.today(), 101]),
+    ("historique: attributions seules (sans la table des incidents)",
+     HISTORIQUE_OPERATIONS_SELECT + " WHERE 1=1 AND o.type_operation = %s" + HISTORIQUE_ORDER, ['attribution', 101]),
+    ("historique: recherche par nom",
+     HISTORIQUE_LIST_SELECT + search_join('nom', 'durand', 'rn')[0] + " WHERE 1=1" + HISTORIQUE_ORDER,
+     search_join('nom', 'durand', 'rn')[1] + [101]),
+    ("historique: période archivée",
+     archive_query(HISTORIQUE_LIST_SELECT)
+     + " WHERE 1=1 AND o.date_operation >= %s AND o.date_operation <= %s" + HISTORIQUE_ORDER,
+     [date(date.today().year - 3, 1, 1), date(date.today().year - 3, 12, 31), 101]),
+    ("fiche: lignes d'un numéro de fiche",
+     FICHE_OPERATION_SELECT + " WHERE o.numero_fiche = %s ORDER BY o.id", ['ATT-20250101-001']),
+    ("fiche: signatures des opérations",
+     "SELECT type_signature, nom, fonction, date_signature, fichier_signature FROM signatures "
+     "WHERE operation_id IN (%s, %s) ORDER BY id", [1, 2]),
+    ("matériel: historique des opérations",
+     "SELECT id, type_operation, date_operation FROM operations WHERE materiel_id = %s "
+     "ORDER BY date_operation DESC", [1]),
+    ("employé: recherche par nom et service",
+     "SELECT id FROM employes WHERE nom = %s AND service_id = %s", ['Durand', 1]),
+    ("détenteurs: matériels d'un employé",
+     CURRENT_ASSIGNMENT_SELECT + " WHERE mca.employe_id = %s", [1]),
+]
+
+# Petites tables de référence (EXPLAIN affiche l'alias): un parcours complet y est sans conséquence
+SMALL_TABLES = {'services', 's', 'types_materiel', 'tm'}
+
+
+def check_query_plans(cursor):
+    """EXPLAIN de chaque requête fréquente.
+
+    Retourne la liste des (requête, table) lus par parcours complet
+    (type ALL) hors petites tables de référence et tables dérivées. À lancer sur
+    une base de volume représentatif: sur une table presque vide, l'optimiseur
+    préfère légitimement un parcours complet.
+    """
+    full_scans = []
+    for name, query, params in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + query, params)
+        columns = [col[0] for col in cursor.description]
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            table = plan.get('table') or ''
+            if plan.get('type') == 'ALL' and table not in SMALL_TABLES and not table.startswith('<'):
+                full_scans.append((name, table))
+    return full_scans
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from config import Config
+from database.database import db
+
+
+class ReferenceCache:
+    """Cache en mémoire d'une petite table de référence (services, types de matériel).
+
+    Garde la liste complète (triée par nom), l'index nom -> id et une empreinte
+    (ETag) du contenu. Rechargé après `ttl` secondes ou sur `invalidate()`.
+    Un nom inconnu déclenche au plus un rechargement toutes les
+    `miss_reload_interval` secondes, pour voir les lignes ajoutées par un autre
+    processus sans attendre la fin du TTL.
+    """
+
+    def __init__(self, table, ttl, miss_reload_interval=5.0):
+        self.table = table
+        self.ttl = ttl
+        self.miss_reload_interval = miss_reload_interval
+        self._lock = threading.Lock()
+        self._rows = None
+        self._ids = {}
+        self._etag = None
+        self._loaded_at = 0.0
+
+    @staticmethod
+    def _key(name):
+        # La collation utf8mb4_unicode_ci compare les noms sans tenir compte de la casse
+        return (name or '').strip().casefold()
+
+    def _load(self):
+        rows = db.execute_query(f"SELECT * FROM {self.table} ORDER BY nom")
+        if rows is None:
+            raise Exception(f"Échec de chargement de la table {self.table}")
+        payload = json.dumps(rows, default=str, sort_keys=True).encode('utf-8')
+        self._rows = rows
+        self._ids = {self._key(row['nom']): row['id'] for row in rows}
+        self._etag = hashlib.sha1(payload).hexdigest()
+        self._loaded_at = time.monotonic()
+        logging.info(f"Cache de référence {self.table} chargé ({len(rows)} lignes)")
+
+    def _ensure_fresh(self):
+        if self._rows is None or time.monotonic() - self._loaded_at > self.ttl:
+            with self._lock:
+                if self._rows is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self._load()
+
+    def get_all(self):
+        """Liste complète des lignes (ne pas modifier)."""
+        self._ensure_fresh()
+        return self._rows
+
+    @property
+    def etag(self):
+        self._ensure_fresh()
+        return self._etag
+
+    def get_id(self, name):
+        """Identifiant correspondant au nom, ou None s'il n'existe pas."""
+        self._ensure_fresh()
+        key = self._key(name)
+        row_id = self._ids.get(key)
+        if row_id is None and time.monotonic() - self._loaded_at > self.miss_reload_interval:
+            with self._lock:
+                if key not in self._ids and time.monotonic() - self._loaded_at > self.miss_reload_interval:
+                    self._load()
+            row_id = self._ids.get(key)
+        return row_id
+
+    def invalidate(self):
+        """Forcer le rechargement au prochain accès (à appeler après une écriture)."""
+        with self._lock:
+            self._loaded_at = float('-inf')
+
+
+services_cache = ReferenceCache('services', Config.REFERENCE_CACHE_TTL)
+types_materiel_cache = ReferenceCache('types_materiel', Config.REFERENCE_CACHE_TTL)
+
+
+def invalidate_reference_caches():
+    """Invalider tous les caches de référence du processus courant."""
+    services_cache.invalidate()
+    types_materiel_cache.invalidate()
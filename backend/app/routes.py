@@ -1,7 +1,33 @@
-from flask import Blueprint, request, jsonify, render_template, send_from_directory, current_app, url_for, redirect, session
+from flask import Blueprint, request, jsonify, render_template, send_from_directory, current_app, url_for, redirect, session, Response, stream_with_context, send_file
 from database.database import db
+from app.numero_fiche import allocate_numero_fiche
+from app.archive import fetch_with_archive, historique_sources, source_query
+from app.assignments import CURRENT_ASSIGNMENT_SELECT
+from app.fiche_pdf import fiche_pdf_path, start_export
+from app.batch_ingest import parse_batch, validate_batch, start_batch
+from app.fiches import FICHE_TYPES, FicheValidationError, prepare_fiche, write_fiches
+from app.historique_export import EXPORT_FORMATS, export_csv, export_xlsx
+from app.http_cache import data_etag, data_version, not_modified, with_etag
+from app.idempotency import idempotent
+from app.jobs import jobs
+from app.metrics import metrics
+from app.passwords import verify_password_bounded, needs_rehash, schedule_rehash
+from app.reference_cache import services_cache, types_materiel_cache
+from app.schemas import SchemaError, validate_incident
+from app.search_index import index_operations, search_join
+from app.signature_image import SignatureBusyError
+from app.signature_store import (
+    REFERENCE_LENGTH, is_valid_digest, reference_digest, signature_bytes, signature_data_url,
+    signature_store, store_signature
+)
+from app.stats import get_stats, month_start, record_operations
+import base64
+import hashlib
+import hmac
+import io
 import json
 import logging
+import os
 from datetime import datetime
 
 # Blueprint pour les pages principales
@@ -21,51 +47,7 @@ def _nz(value):
 
 def generate_numero_fiche(type_operation):
     """Génère un numéro de fiche unique au format: type-date-001"""
-    try:
-        # Mapping des types d'opération vers les préfixes
-        prefix_map = {
-            'attribution': 'ATB',
-            'restitution': 'RST',
-            'incident': 'ICD'
-        }
-        prefix = prefix_map.get(type_operation, 'OPR')
-        
-        # Date actuelle au format YYYYMMDD
-        today = datetime.now().strftime('%Y%m%d')
-        
-        # Chercher le dernier numéro pour aujourd'hui et ce type
-        query = """
-            SELECT numero_fiche FROM operations 
-            WHERE numero_fiche LIKE %s 
-            ORDER BY numero_fiche DESC 
-            LIMIT 1
-        """
-        pattern = f"{prefix}-{today}-%"
-        last_num = db.execute_query(query, (pattern,))
-        
-        if last_num and len(last_num) > 0:
-            # Extraire le numéro et incrémenter
-            last_num_str = last_num[0]['numero_fiche']
-            parts = last_num_str.split('-')
-            if len(parts) == 3:
-                try:
-                    current_num = int(parts[2])
-                    new_num = current_num + 1
-                except ValueError:
-                    new_num = 1
-            else:
-                new_num = 1
-        else:
-            new_num = 1
-        
-        # Formater avec des zéros (001, 002, etc.)
-        return f"{prefix}-{today}-{new_num:03d}"
-        
-    except Exception as e:
-        logging.error(f"Erreur lors de la génération du numéro de fiche: {e}")
-        # Fallback: timestamp
-        timestamp = int(datetime.now().timestamp())
-        return f"{prefix}-{today}-{timestamp}"
+    return allocate_numero_fiche(type_operation)
 
 @main_bp.route('/')
 def index():
@@ -119,7 +101,7 @@ def login():
             return jsonify({'success': False, 'error': 'Identifiants requis'}), 400
 
         user_rows = db.execute_query(
-            "SELECT id, nom_utilisateur, mot_de_passe_hash, actif FROM utilisateurs WHERE nom_utilisateur = %s",
+            "SELECT id, nom_utilisateur, mot_de_passe_hash, role, actif FROM utilisateurs WHERE nom_utilisateur = %s",
             (username,)
         )
         if not user_rows:
@@ -128,12 +110,16 @@ def login():
         if not user.get('actif'):
             return jsonify({'success': False, 'error': 'Compte désactivé'}), 403
 
-        # Comparaison simple (le champ peut contenir un mot de passe en clair ou hash selon votre configuration)
-        if password != (user.get('mot_de_passe_hash') or ''):
+        # Vérification du hash (ou d'un ancien mot de passe en clair), calculs simultanés plafonnés
+        stored = user.get('mot_de_passe_hash') or ''
+        if not verify_password_bounded(password, stored):
             return jsonify({'success': False, 'error': 'Mot de passe incorrect'}), 401
+        if needs_rehash(stored):
+            schedule_rehash(user['id'], password, stored)
 
         session['user_id'] = user['id']
         session['username'] = user['nom_utilisateur']
+        session['role'] = user.get('role')
         return jsonify({'success': True, 'redirect': url_for('main.attribution')})
     except Exception as e:
         logging.error(f"Erreur de connexion: {e}")
@@ -144,14 +130,17 @@ def logout():
     session.clear()
     return redirect(url_for('main.login'))
 
+def _reference_list_response(cache):
+    """Réponse JSON d'une table de référence, validée par ETag (304 si inchangée)."""
+    etag = cache.etag
+    return not_modified(etag) or with_etag(jsonify({'success': True, 'data': cache.get_all()}), etag)
+
 # Routes API
 @api_bp.route('/services', methods=['GET'])
 def get_services():
     """Récupérer tous les services"""
     try:
-        query = "SELECT * FROM services ORDER BY nom"
-        services = db.execute_query(query)
-        return jsonify({'success': True, 'data': services})
+        return _reference_list_response(services_cache)
     except Exception as e:
         logging.error(f"Erreur lors de la récupération des services: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -160,131 +149,45 @@ def get_services():
 def get_types_materiel():
     """Récupérer tous les types de matériel"""
     try:
-        query = "SELECT * FROM types_materiel ORDER BY nom"
-        types = db.execute_query(query)
-        return jsonify({'success': True, 'data': types})
+        return _reference_list_response(types_materiel_cache)
     except Exception as e:
         logging.error(f"Erreur lors de la récupération des types: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _create_fiche_materiel(type_operation):
+    """Créer une fiche d'attribution ou de restitution.
+
+    Toute la fiche (employé, matériels, opérations, signatures) est écrite dans
+    une seule transaction avec des INSERT multi-lignes: le nombre d'allers-retours
+    ne dépend pas du nombre de matériels et un échec n'écrit rien.
+    """
+    try:
+        fiche = prepare_fiche(type_operation, request.get_json(silent=True))
+    except FicheValidationError as e:
+        logging.error(f"Fiche refusée: {e}")
+        return jsonify({'success': False, 'error': str(e), 'errors': e.fields}), e.status
+
+    # Générer le numéro de fiche (une seule fois pour toutes les opérations).
+    # Alloué hors transaction pour ne pas garder le compteur verrouillé.
+    numero_fiche = generate_numero_fiche(type_operation)
+
+    with db.transaction() as tx:
+        operations = write_fiches(tx, type_operation, [fiche], [numero_fiche])[0]
+    data_version.bump()
+
+    return jsonify({
+        'success': True,
+        'message': FICHE_TYPES[type_operation]['message'],
+        'operation_ids': operations,
+        'numero_fiche': numero_fiche
+    })
+
 @api_bp.route('/attribution', methods=['POST'])
+@idempotent
 def create_attribution():
     """Créer une nouvelle attribution"""
     try:
-        data = request.get_json()
-        
-        # Vérifier les données requises
-        required_fields = ['nom', 'service', 'materiels', 'redaction', 'validation', 'destinataire', 'signatures']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'success': False, 'error': f'Champ manquant: {field}'}), 400
-        
-        # Récupérer le service
-        service_rows = db.execute_query("SELECT id FROM services WHERE nom = %s", (data['service'],))
-        if not service_rows:
-            return jsonify({'success': False, 'error': "Service introuvable"}), 404
-        service_id = service_rows[0]['id']
-
-        # Récupérer ou créer l'employé (nom + service)
-        employe_rows = db.execute_query(
-            "SELECT id FROM employes WHERE nom = %s AND service_id = %s",
-            (data['nom'], service_id)
-        )
-        if employe_rows:
-            employe_id = employe_rows[0]['id']
-        else:
-            insert_emp_rc = db.execute_query(
-                "INSERT INTO employes (nom, service_id) VALUES (%s, %s)",
-                (data['nom'], service_id)
-            )
-            if insert_emp_rc is None:
-                raise Exception("Échec d'insertion de l'employé")
-            employe_id = db.get_last_insert_id()
-            if not employe_id:
-                raise Exception("Impossible de récupérer l'identifiant de l'employé")
-        
-        # Traiter chaque matériel
-        operations = []
-        
-        # Générer le numéro de fiche automatiquement (une seule fois pour toutes les opérations)
-        numero_fiche = generate_numero_fiche('attribution')
-        
-        for materiel_data in data['materiels']:
-            # Upsert matériel et récupérer son id de façon fiable même en cas de doublon
-            materiel_query = """
-                INSERT INTO materiels (type_id, modele, numero_serie, service_achat, date_achat, statut)
-                VALUES (
-                    (SELECT id FROM types_materiel WHERE nom = %s),
-                    %s, %s, %s, %s, 'attribue'
-                )
-                ON DUPLICATE KEY UPDATE
-                    id = LAST_INSERT_ID(id),
-                    statut = 'attribue',
-                    modele = VALUES(modele),
-                    service_achat = VALUES(service_achat),
-                    date_achat = VALUES(date_achat),
-                    type_id = VALUES(type_id)
-            """
-            upsert_rc = db.execute_query(materiel_query, (
-                materiel_data['type'],
-                materiel_data['modele'],
-                materiel_data['serie'],
-                materiel_data.get('serviceAchat', ''),
-                _nz(materiel_data.get('dateRemise'))
-            ))
-            if upsert_rc is None:
-                raise Exception("Échec d'insertion/mise à jour du matériel")
-            materiel_id = db.get_last_insert_id()
-            if not materiel_id:
-                raise Exception("Impossible de récupérer l'identifiant du matériel")
-            
-            # Créer l'opération d'attribution
-            operation_query = """
-                INSERT INTO operations (numero_fiche, type_operation, employe_id, materiel_id, date_operation, date_remise, motif)
-                VALUES (%s, 'attribution', %s, %s, %s, %s, %s)
-            """
-            op_rc = db.execute_query(operation_query, (
-                numero_fiche,
-                employe_id,
-                materiel_id,
-                datetime.now().date(),
-                _nz(materiel_data.get('dateRemise')),
-                _nz(data.get('motif'))
-            ))
-            if op_rc is None:
-                raise Exception("Échec de création de l'opération d'attribution")
-            operation_id = db.get_last_insert_id()
-            if not operation_id:
-                raise Exception("Impossible de récupérer l'identifiant de l'opération")
-            operations.append(operation_id)
-        
-        # Insérer les signatures
-        if not operations:
-            raise Exception("Aucune opération créée")
-        signatures_data = [
-            (operations[0], 'redaction', data['redaction']['nom'], data['redaction']['fonction'], 
-             data['redaction']['date'], data['signatures']['redaction']),
-            (operations[0], 'validation', data['validation']['nom'], data['validation']['fonction'], 
-             data['validation']['date'], data['signatures']['validation']),
-            (operations[0], 'destinataire', data['destinataire']['nom'], data['destinataire']['fonction'], 
-             data['destinataire']['date'], data['signatures']['destinataire'])
-        ]
-        
-        signature_query = """
-            INSERT INTO signatures (operation_id, type_signature, nom, fonction, date_signature, fichier_signature)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        sig_rc = db.execute_many(signature_query, signatures_data)
-        if sig_rc is None:
-            raise Exception("Échec d'enregistrement des signatures")
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Attribution créée avec succès',
-            'operation_ids': operations,
-            'numero_fiche': numero_fiche
-        })
-        
+        return _create_fiche_materiel('attribution')
     except Exception as e:
         logging.error(f"Erreur lors de la création de l'attribution: {e}")
         if current_app.config.get('DEBUG'):
@@ -292,284 +195,390 @@ def create_attribution():
         return jsonify({'success': False, 'error': "Une erreur interne est survenue. Merci de contacter l'administrateur."}), 500
 
 @api_bp.route('/restitution', methods=['POST'])
+@idempotent
 def create_restitution():
     """Créer une nouvelle restitution"""
     try:
-        data = request.get_json()
-        logging.info(f"Données reçues pour restitution: {data}")
-        
-        # Vérifier les données requises
-        required_fields = ['nom', 'service', 'materiels', 'redaction', 'validation', 'destinataire', 'signatures']
-        for field in required_fields:
-            if field not in data:
-                logging.error(f"Champ manquant: {field}")
-                return jsonify({'success': False, 'error': f'Champ manquant: {field}'}), 400
-        
-        # Récupérer le service
-        service_rows = db.execute_query("SELECT id FROM services WHERE nom = %s", (data['service'],))
-        if not service_rows:
-            return jsonify({'success': False, 'error': "Service introuvable"}), 404
-        service_id = service_rows[0]['id']
-
-        # Récupérer ou créer l'employé (nom + service)
-        employe_rows = db.execute_query(
-            "SELECT id FROM employes WHERE nom = %s AND service_id = %s",
-            (data['nom'], service_id)
-        )
-        if employe_rows:
-            employe_id = employe_rows[0]['id']
-        else:
-            insert_emp_rc = db.execute_query(
-                "INSERT INTO employes (nom, service_id) VALUES (%s, %s)",
-                (data['nom'], service_id)
-            )
-            if insert_emp_rc is None:
-                raise Exception("Échec d'insertion de l'employé")
-            employe_id = db.get_last_insert_id()
-            if not employe_id:
-                raise Exception("Impossible de récupérer l'identifiant de l'employé")
-        
-        # Traiter chaque matériel
-        operations = []
-        
-        # Générer le numéro de fiche automatiquement (une seule fois pour toutes les opérations)
-        numero_fiche = generate_numero_fiche('restitution')
-        
-        for materiel_data in data['materiels']:
-            # Upsert matériel et récupérer son id de façon fiable même en cas de doublon
-            materiel_query = """
-                INSERT INTO materiels (type_id, modele, numero_serie, service_achat, date_achat, statut)
-                VALUES (
-                    (SELECT id FROM types_materiel WHERE nom = %s),
-                    %s, %s, %s, %s, 'disponible'
-                )
-                ON DUPLICATE KEY UPDATE
-                    id = LAST_INSERT_ID(id),
-                    statut = 'disponible',
-                    modele = VALUES(modele),
-                    service_achat = VALUES(service_achat),
-                    date_achat = VALUES(date_achat),
-                    type_id = VALUES(type_id)
-            """
-            upsert_rc = db.execute_query(materiel_query, (
-                materiel_data['type'],
-                materiel_data['modele'],
-                materiel_data['serie'],
-                'Service non spécifié',  # Valeur par défaut
-                None  # Date d'achat non spécifiée
-            ))
-            if upsert_rc is None:
-                raise Exception("Échec d'insertion/mise à jour du matériel")
-            materiel_id = db.get_last_insert_id()
-            if not materiel_id:
-                raise Exception("Impossible de récupérer l'identifiant du matériel")
-            
-            # Créer l'opération de restitution
-            operation_query = """
-                INSERT INTO operations (numero_fiche, type_operation, employe_id, materiel_id, date_operation, date_restitution, motif)
-                VALUES (%s, 'restitution', %s, %s, %s, %s, %s)
-            """
-            op_rc = db.execute_query(operation_query, (
-                numero_fiche,
-                employe_id,
-                materiel_id,
-                datetime.now().date(),
-                _nz(materiel_data.get('dateRestitution')),
-                _nz(data.get('motif'))
-            ))
-            if op_rc is None:
-                raise Exception("Échec de création de l'opération de restitution")
-            operation_id = db.get_last_insert_id()
-            if not operation_id:
-                raise Exception("Impossible de récupérer l'identifiant de l'opération")
-            operations.append(operation_id)
-            
-            # Mettre à jour le statut du matériel
-            update_materiel_query = "UPDATE materiels SET statut = 'disponible' WHERE id = %s"
-            upd_rc = db.execute_query(update_materiel_query, (materiel_id,))
-            if upd_rc is None:
-                raise Exception("Échec de mise à jour du statut du matériel")
-        
-        # Insérer les signatures
-        if not operations:
-            raise Exception("Aucune opération créée")
-        signatures_data = [
-            (operations[0], 'redaction', data['redaction']['nom'], data['redaction']['fonction'], 
-             data['redaction']['date'], data['signatures']['redaction']),
-            (operations[0], 'validation', data['validation']['nom'], data['validation']['fonction'], 
-             data['validation']['date'], data['signatures']['validation']),
-            (operations[0], 'destinataire', data['destinataire']['nom'], data['destinataire']['fonction'], 
-             data['destinataire']['date'], data['signatures']['destinataire'])
-        ]
-        
-        signature_query = """
-            INSERT INTO signatures (operation_id, type_signature, nom, fonction, date_signature, fichier_signature)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        sig_rc = db.execute_many(signature_query, signatures_data)
-        if sig_rc is None:
-            raise Exception("Échec d'enregistrement des signatures")
-        
-        return jsonify({
-            'success': True, 
-            'message': 'Restitution créée avec succès',
-            'operation_ids': operations,
-            'numero_fiche': numero_fiche
-        })
-        
+        return _create_fiche_materiel('restitution')
     except Exception as e:
         logging.error(f"Erreur lors de la création de la restitution: {e}")
         if current_app.config.get('DEBUG'):
             return jsonify({'success': False, 'error': str(e)}), 500
         return jsonify({'success': False, 'error': "Une erreur interne est survenue. Merci de contacter l'administrateur."}), 500
 
+@api_bp.route('/attributions/batch', methods=['POST'])
+def create_attributions_batch():
+    """Importer un lot d'attributions (NDJSON ou tableau JSON).
+
+    Toutes les fiches sont validées avant d'accepter le lot: au moindre refus,
+    rien n'est écrit et les erreurs sont listées par index. Sinon le lot est
+    écrit en arrière-plan et la réponse 202 donne l'URL de suivi.
+    """
+    try:
+        try:
+            items, errors = parse_batch(request.get_data(), request.content_type)
+        except FicheValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status
+        if not items:
+            return jsonify({'success': False, 'error': 'Aucune fiche dans le lot'}), 400
+        if len(items) > current_app.config['BATCH_MAX_ITEMS']:
+            return jsonify({
+                'success': False,
+                'error': f"Lot trop volumineux ({len(items)} fiches, maximum {current_app.config['BATCH_MAX_ITEMS']})"
+            }), 413
+
+        fiches = validate_batch('attribution', items, errors)
+        if errors:
+            return jsonify({'success': False, 'error': f'{len(errors)} fiche(s) invalide(s)', 'errors': errors}), 400
+
+        job = start_batch('attribution', fiches)
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'total': job['total'],
+            'status_url': url_for('api.get_attributions_batch', job_id=job['id'])
+        }), 202
+    except Exception as e:
+        logging.error(f"Erreur lors de l'import du lot d'attributions: {e}")
+        if current_app.config.get('DEBUG'):
+            return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify({'success': False, 'error': "Une erreur interne est survenue. Merci de contacter l'administrateur."}), 500
+
+@api_bp.route('/attributions/batch/<job_id>', methods=['GET'])
+def get_attributions_batch(job_id):
+    """Avancement d'un import par lot et erreurs par fiche"""
+    job = jobs.get(job_id)
+    if job is None or job.get('kind') != 'attributions_batch':
+        return jsonify({'success': False, 'error': 'Lot introuvable'}), 404
+    return jsonify({'success': True, 'data': job})
+
+# Projection "liste" de l'historique: aucune colonne LONGTEXT (signatures, JSON)
+HISTORIQUE_SELECT_TEMPLATE = """
+    SELECT 
+        o.id,
+        o.numero_fiche,
+        o.type_operation,
+        o.date_operation,
+        o.date_remise,
+        o.date_restitution,
+        o.motif,
+        -- Champs pour les opérations (attributions/restitutions)
+        e.nom as employe_nom,
+        s.nom as service_nom,
+        m.modele,
+        m.numero_serie,
+        tm.nom as type_materiel,
+        -- Champs pour les incidents (premier matériel touché uniquement)
+        {incident_columns},
+        -- Type de source pour différencier
+        CASE 
+            WHEN o.type_operation = 'incident' THEN 'incident'
+            ELSE 'operation'
+        END as source_type
+    FROM operations o
+    LEFT JOIN employes e ON o.employe_id = e.id
+    LEFT JOIN services s ON e.service_id = s.id
+    LEFT JOIN materiels m ON o.materiel_id = m.id
+    LEFT JOIN types_materiel tm ON m.type_id = tm.id{incident_join}
+"""
+HISTORIQUE_INCIDENT_COLUMNS = """i.declarant_nom,
+        i.numero_serie_actif,
+        CASE WHEN o.type_operation = 'incident' AND JSON_VALID(i.actifs_json)
+            THEN JSON_UNQUOTE(JSON_EXTRACT(i.actifs_json, '$[0]'))
+        END as materiel_touche"""
+# Les colonnes des incidents sont dans leur table 1:1, jointe seulement quand
+# la liste peut contenir des incidents
+HISTORIQUE_OPERATIONS_SELECT = HISTORIQUE_SELECT_TEMPLATE.format(
+    incident_columns="NULL as declarant_nom, NULL as numero_serie_actif, NULL as materiel_touche",
+    incident_join=""
+)
+HISTORIQUE_LIST_SELECT = HISTORIQUE_SELECT_TEMPLATE.format(
+    incident_columns=HISTORIQUE_INCIDENT_COLUMNS,
+    incident_join="\n    LEFT JOIN incidents i ON i.operation_id = o.id"
+)
+
+def _historique_select(args):
+    """Projection de l'historique: sans la table des incidents si le filtre les exclut."""
+    if args.get('type_operation') in ('attribution', 'restitution'):
+        return HISTORIQUE_OPERATIONS_SELECT
+    return HISTORIQUE_LIST_SELECT
+
+def _include_archives(args):
+    """Option `archives=1`: inclure l'historique archivé (voir archive_operations.py)."""
+    return args.get('archives', '').lower() in ('1', 'true', 'oui')
+
+def _historique_query(args, where, params, limit=None):
+    """Requête de l'historique triée par (date_operation, id) décroissants.
+
+    Sans `archives=1`, seules les tables courantes sont lues: le coût ne dépend
+    pas du volume archivé. Avec, chaque table concernée par la période est
+    lue par sa propre branche (mêmes filtres, mêmes index) et les branches
+    sont fusionnées par UNION ALL dans une table dérivée (la requête reste un
+    SELECT pour db.execute_query).
+    """
+    branch = _historique_select(args) + where + " ORDER BY o.date_operation DESC, o.id DESC"
+    suffix, suffix_params = ("", []) if limit is None else (" LIMIT %s", [limit])
+    sources = historique_sources(args.get('date_debut'), args.get('date_fin'), _include_archives(args))
+    if len(sources) == 1:
+        return source_query(branch, sources[0]) + suffix, params + suffix_params
+    union = " UNION ALL ".join(
+        f"({source_query(branch, archived)}{suffix})" for archived in sources
+    )
+    query = f"SELECT * FROM ({union}) h ORDER BY date_operation DESC, id DESC" + suffix
+    return query, (params + suffix_params) * len(sources) + suffix_params
+
+def _historique_filters(args):
+    """Construit les jointures de recherche et la clause WHERE (et leurs paramètres)
+    à partir des filtres de l'historique.
+
+    Les filtres nom et numéro de série passent par l'index de recherche
+    (app.search_index): seules les opérations qu'il retient sont jointes.
+    """
+    employe = args.get('employe', '')
+    service = args.get('service', '')
+    type_materiel = args.get('type_materiel', '')
+    serie = args.get('serie', '')
+    date_debut = args.get('date_debut', '')
+    date_fin = args.get('date_fin', '')
+    type_operation_filter = args.get('type_operation', '')
+
+    joins = ""
+    join_params = []
+    where = " WHERE 1=1"
+    params = []
+
+    # Filtres communs
+    if date_debut:
+        where += " AND o.date_operation >= %s"
+        params.append(date_debut)
+
+    if date_fin:
+        where += " AND o.date_operation <= %s"
+        params.append(date_fin)
+
+    # Filtres spécifiques
+    for champ, term, alias in (('nom', employe, 'rn'), ('serie', serie, 'rs')):
+        if term:
+            clause = search_join(champ, term, alias)
+            if clause is None:
+                where += " AND 1=0"  # Terme sans caractère alphanumérique
+            else:
+                joins += clause[0]
+                join_params.extend(clause[1])
+
+    if service:
+        where += " AND s.nom = %s"
+        params.append(service)
+
+    if type_materiel:
+        # Valeur issue de la liste des types: égalité sur l'identifiant en cache
+        where += " AND m.type_id = %s"
+        params.append(types_materiel_cache.get_id(type_materiel) or 0)
+
+    if type_operation_filter:
+        where += " AND o.type_operation = %s"
+        params.append(type_operation_filter)
+
+    return joins + where, join_params + params
+
+def _encode_cursor(op):
+    """Curseur opaque de pagination: position (date_operation, id) de la dernière ligne."""
+    date_op = op['date_operation']
+    date_str = date_op.isoformat() if hasattr(date_op, 'isoformat') else str(date_op)
+    return base64.urlsafe_b64encode(f"{date_str}|{op['id']}".encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    """Décode un curseur produit par _encode_cursor. Lève ValueError s'il est invalide."""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    date_str, op_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.strptime(date_str, '%Y-%m-%d').date(), int(op_id)
+
+def _format_historique_row(op):
+    """Uniformise une ligne d'historique pour l'affichage (opérations et incidents)."""
+    if op['type_operation'] == 'incident':
+        # Utiliser les champs spécifiques et tenter de remplir service/matériel
+        op['employe_nom'] = op.get('declarant_nom') or op.get('employe_nom')
+        # Service: si employe/service non liés, mettre 'Non spécifié'
+        op['service_nom'] = op.get('service_nom') or 'Non spécifié'
+        op['type_materiel'] = 'Incident'
+        # Colonne 'Matériel (Type - Modèle)' doit contenir Materiel(Num Série) pour incidents
+        mat_label = op.get('materiel_touche') or 'Matériel'
+        serie_label = op.get('numero_serie_actif') or '-'
+        op['modele'] = f"{mat_label} ({serie_label})"
+        op['numero_serie'] = op.get('numero_serie_actif') or '-'
+    else:
+        # Pour les opérations, s'assurer que les champs sont présents
+        op['declarant_nom'] = op.get('employe_nom')
+        op['numero_serie_actif'] = op.get('numero_serie')
+    op.pop('materiel_touche', None)
+    return op
+
 @api_bp.route('/historique', methods=['GET'])
 def get_historique():
-    """Récupérer l'historique des opérations et incidents avec filtres"""
+    """Récupérer l'historique des opérations et incidents avec filtres.
+
+    Pagination par curseur sur (date_operation, id): `limit` lignes par page et
+    `cursor` = valeur `next_cursor` de la page précédente. Avec `format=ndjson`,
+    tout l'historique filtré est diffusé en flux, une ligne JSON par opération.
+    L'historique archivé n'est inclus qu'avec `archives=1`.
+    L'ETag dépend de la version des données et des paramètres: une vue
+    inchangée est revalidée (304) sans requête SQL.
+    """
+    etag = data_etag('historique', request.query_string.decode('utf-8', 'replace'))
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
     try:
-        # Paramètres de filtrage
-        employe = request.args.get('employe', '')
-        service = request.args.get('service', '')
-        type_materiel = request.args.get('type_materiel', '')
-        serie = request.args.get('serie', '')
-        date_debut = request.args.get('date_debut', '')
-        date_fin = request.args.get('date_fin', '')
-        type_operation_filter = request.args.get('type_operation', '')
-        
-        # Construction de la requête unifiée pour toutes les opérations
-        query = """
-            SELECT 
-                o.id,
-                o.numero_fiche,
-                o.type_operation,
-                o.date_operation,
-                o.date_remise,
-                o.date_restitution,
-                o.motif,
-                -- Champs pour les opérations (attributions/restitutions)
-                e.nom as employe_nom,
-                s.nom as service_nom,
-                m.modele,
-                m.numero_serie,
-                tm.nom as type_materiel,
-                -- Champs pour les incidents
-                o.declarant_nom,
-                o.telephone,
-                o.email,
-                o.poste,
-                o.numero_serie_actif,
-                o.actifs_json,
-                o.natures_json,
-                o.autres_infos,
-                o.signature_png,
-                -- Type de source pour différencier
-                CASE 
-                    WHEN o.type_operation = 'incident' THEN 'incident'
-                    ELSE 'operation'
-                END as source_type
-            FROM operations o
-            LEFT JOIN employes e ON o.employe_id = e.id
-            LEFT JOIN services s ON e.service_id = s.id
-            LEFT JOIN materiels m ON o.materiel_id = m.id
-            LEFT JOIN types_materiel tm ON m.type_id = tm.id
-            WHERE 1=1
-        """
-        
-        params = []
-        
-        # Filtres communs
-        if date_debut:
-            query += " AND o.date_operation >= %s"
-            params.append(date_debut)
-        
-        if date_fin:
-            query += " AND o.date_operation <= %s"
-            params.append(date_fin)
-        
-        # Filtres spécifiques
-        if employe and (not service or not type_materiel or not serie):
-            query += " AND (e.nom LIKE %s OR o.declarant_nom LIKE %s)"
-            params.extend([f'%{employe}%', f'%{employe}%'])
-        elif employe:
-            query += " AND (e.nom LIKE %s OR o.declarant_nom LIKE %s)"
-            params.extend([f'%{employe}%', f'%{employe}%'])
-        
-        if service:
-            query += " AND s.nom = %s"
-            params.append(service)
-        
-        if type_materiel:
-            query += " AND tm.nom LIKE %s"
-            params.append(f'%{type_materiel}%')
-        
-        if serie:
-            query += " AND (m.numero_serie LIKE %s OR o.numero_serie_actif LIKE %s)"
-            params.extend([f'%{serie}%', f'%{serie}%'])
+        where, params = _historique_filters(request.args)
+
+        if request.args.get('format') == 'ndjson':
+            query, query_params = _historique_query(request.args, where, params)
+            rows = db.iter_query(query, query_params, batch_size=current_app.config['HISTORIQUE_STREAM_BATCH'])
+            json_provider = current_app.json
+
+            def generate():
+                for op in rows:
+                    yield json_provider.dumps(_format_historique_row(op)) + '\n'
+
+            return with_etag(Response(stream_with_context(generate()), mimetype='application/x-ndjson'), etag)
+
+        try:
+            limit = int(request.args.get('limit', current_app.config['HISTORIQUE_PAGE_SIZE']))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Paramètre limit invalide'}), 400
+        limit = max(1, min(limit, current_app.config['HISTORIQUE_MAX_PAGE_SIZE']))
+
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                last_date, last_id = _decode_cursor(cursor)
+            except (ValueError, UnicodeDecodeError):
+                return jsonify({'success': False, 'error': 'Curseur de pagination invalide'}), 400
+            where += " AND (o.date_operation < %s OR (o.date_operation = %s AND o.id < %s))"
+            params.extend([last_date, last_date, last_id])
+
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        operations = db.execute_query(*_historique_query(request.args, where, params, limit + 1))
+        if operations is None:
+            raise Exception("Échec de lecture de l'historique")
+
+        next_cursor = None
+        if len(operations) > limit:
+            operations = operations[:limit]
+            next_cursor = _encode_cursor(operations[-1])
 
-        if type_operation_filter:
-            query += " AND o.type_operation = %s"
-            params.append(type_operation_filter)
-        
-        query += " ORDER BY o.date_operation DESC, o.id DESC"
-        
-        operations = db.execute_query(query, params)
-        
-        # Traiter les données pour uniformiser l'affichage
         for op in operations:
-            if op['type_operation'] == 'incident':
-                # Utiliser les champs spécifiques et tenter de remplir service/matériel
-                op['employe_nom'] = op.get('declarant_nom') or op.get('employe_nom')
-                # Service: si employe/service non liés, mettre 'Non spécifié'
-                op['service_nom'] = op.get('service_nom') or 'Non spécifié'
-                # Type matériel et modèle: afficher "Materiel (N° Série)"
-                try:
-                    type_mat = None
-                    if op.get('actifs_json'):
-                        actifs = json.loads(op['actifs_json'])
-                        if isinstance(actifs, list) and len(actifs) > 0 and actifs[0]:
-                            type_mat = actifs[0]
-                    op['type_materiel'] = 'Incident'
-                    # Colonne 'Matériel (Type - Modèle)' doit contenir Materiel(Num Série) pour incidents
-                    mat_label = type_mat or 'Matériel'
-                    serie_label = op.get('numero_serie_actif') or '-'
-                    op['modele'] = f"{mat_label} ({serie_label})"
-                except Exception:
-                    op['type_materiel'] = 'Incident'
-                    serie_label = op.get('numero_serie_actif') or '-'
-                    op['modele'] = f"Matériel ({serie_label})"
-                op['numero_serie'] = op.get('numero_serie_actif') or '-'
-            else:
-                # Pour les opérations, s'assurer que les champs sont présents
-                op['declarant_nom'] = op.get('employe_nom')
-                op['numero_serie_actif'] = op.get('numero_serie')
-        
-        return jsonify({'success': True, 'data': operations})
+            _format_historique_row(op)
+
+        return with_etag(jsonify({'success': True, 'data': operations, 'next_cursor': next_cursor}), etag)
         
     except Exception as e:
         logging.error(f"Erreur lors de la récupération de l'historique: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Colonnes des fenêtres de détails: pas de o.* (colonnes d'incident et signatures
+# lues seulement quand elles servent)
+DETAILS_JOINS = """
+            e.nom as employe_nom,
+            s.nom as service_nom,
+            m.modele,
+            m.numero_serie,
+            tm.nom as type_materiel
+        FROM operations o
+        LEFT JOIN employes e ON o.employe_id = e.id
+        LEFT JOIN services s ON e.service_id = s.id
+        LEFT JOIN materiels m ON o.materiel_id = m.id
+        LEFT JOIN types_materiel tm ON m.type_id = tm.id
+"""
+
+def _include_signatures():
+    """Option `include=signatures`: signatures intégrées en data URL (ancien format)."""
+    return 'signatures' in request.args.get('include', '').split(',')
+
+def _signature_column(column, include):
+    """Colonne de signature à lire: complète si elle est intégrée à la réponse,
+    sinon seulement le début (assez pour une référence du magasin)."""
+    if include:
+        return column
+    return f"LEFT({column}, {REFERENCE_LENGTH}) AS {column.split('.')[-1]}"
+
+def _lazy_signature_url(value, endpoint, **values):
+    """URL d'une signature chargée à part par le navigateur: celle du magasin
+    (immuable) pour une référence, sinon celle qui extrait l'ancienne data URL
+    non encore migrée de sa ligne."""
+    if not value:
+        return None
+    digest = reference_digest(value)
+    if digest is not None:
+        return url_for('api.get_signature', digest=digest)
+    return url_for(endpoint, **values)
+
+def _legacy_signature_response(value):
+    """Image PNG d'une signature lue en base (référence ou ancienne data URL)."""
+    data = signature_bytes(value)
+    if data is None:
+        return jsonify({'success': False, 'error': 'Signature introuvable'}), 404
+    response = send_file(
+        io.BytesIO(data),
+        mimetype='image/png',
+        etag=hashlib.sha256(data).hexdigest(),
+        max_age=86400,
+        conditional=True
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+@api_bp.route('/historique/export', methods=['GET'])
+def export_historique():
+    """Exporter l'historique filtré (mêmes filtres que /historique) en CSV ou XLSX.
+
+    Les lignes sont lues par lots avec un curseur non bufferisé et écrites au
+    fil de l'eau: la mémoire ne dépend pas du nombre de lignes exportées.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': 'Format attendu: csv ou xlsx'}), 400
+    try:
+        where, params = _historique_filters(request.args)
+        query, query_params = _historique_query(request.args, where, params)
+        rows = db.iter_query(query, query_params, batch_size=current_app.config['HISTORIQUE_STREAM_BATCH'])
+        records = (_format_historique_row(op) for op in rows)
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        body = export_csv(records) if export_format == 'csv' else export_xlsx(records)
+        filename = f"historique_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        logging.error(f"Erreur lors de l'export de l'historique: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/operation/<int:operation_id>', methods=['GET'])
 def get_operation_details(operation_id):
-    """Récupérer les détails d'une opération (attribution/restitution)"""
+    """Récupérer les détails d'une opération (attribution/restitution).
+
+    Les signatures sont des URL que le navigateur charge (et met en cache) à
+    part; `include=signatures` les intègre en data URL dans la réponse.
+    """
+    include = _include_signatures()
+    etag = data_etag('operation', operation_id, include)
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
     try:
         # Récupérer les détails de l'opération
-        operation_query = """
-            SELECT 
-                o.*,
-                e.nom as employe_nom,
-                s.nom as service_nom,
-                m.modele,
-                m.numero_serie,
-                tm.nom as type_materiel
-            FROM operations o
-            LEFT JOIN employes e ON o.employe_id = e.id
-            LEFT JOIN services s ON e.service_id = s.id
-            LEFT JOIN materiels m ON o.materiel_id = m.id
-            LEFT JOIN types_materiel tm ON m.type_id = tm.id
+        operation_query = f"""
+            SELECT
+                o.id, o.numero_fiche, o.type_operation, o.employe_id, o.materiel_id,
+                o.date_operation, o.date_remise, o.date_restitution, o.motif, o.created_at,
+            {DETAILS_JOINS}
             WHERE o.id = %s
         """
-        operation = db.execute_query(operation_query, (operation_id,))
+        # Opération archivée: lue (avec ses signatures) dans les archives
+        operation, archived = fetch_with_archive(operation_query, (operation_id,))
         
         if not operation:
             return jsonify({'success': False, 'error': 'Opération non trouvée'}), 404
@@ -577,53 +586,75 @@ def get_operation_details(operation_id):
         operation_data = operation[0]
         
         # Pour les opérations (attributions/restitutions), récupérer les signatures
-        signatures_query = """
-            SELECT type_signature, nom, fonction, date_signature, fichier_signature
+        signatures_query = f"""
+            SELECT type_signature, nom, fonction, date_signature, {_signature_column('fichier_signature', include)}
             FROM signatures
             WHERE operation_id = %s
         """
-        signatures = db.execute_query(signatures_query, (operation_id,))
+        signatures = db.execute_query(source_query(signatures_query, archived), (operation_id,))
+        for sig in signatures or []:
+            if include:
+                sig['fichier_signature'] = signature_data_url(sig.get('fichier_signature'))
+            else:
+                sig['fichier_signature'] = _lazy_signature_url(
+                    sig.get('fichier_signature'), 'api.get_operation_signature',
+                    operation_id=operation_id, type_signature=sig['type_signature']
+                )
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'data': {
                 'operation': operation_data,
                 'signatures': signatures
             }
-        })
+        }), etag)
         
     except Exception as e:
         logging.error(f"Erreur lors de la récupération des détails: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/operation/<int:operation_id>/signatures/<type_signature>', methods=['GET'])
+def get_operation_signature(operation_id, type_signature):
+    """Image d'une signature d'opération non encore déplacée dans le magasin"""
+    try:
+        rows, _ = fetch_with_archive(
+            "SELECT fichier_signature FROM signatures WHERE operation_id = %s AND type_signature = %s",
+            (operation_id, type_signature)
+        )
+        return _legacy_signature_response(rows[0]['fichier_signature'] if rows else None)
+    except Exception as e:
+        logging.error(f"Erreur lors de la lecture de la signature: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/incident/<int:operation_id>', methods=['GET'])
 def get_incident_details(operation_id):
-    """Récupérer les détails d'un incident"""
+    """Récupérer les détails d'un incident (signature chargée à part, voir
+    get_operation_details pour `include=signatures`)"""
+    include = _include_signatures()
+    etag = data_etag('incident', operation_id, include)
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
     try:
         # Récupérer les détails de l'incident
-        operation_query = """
-            SELECT 
-                o.*,
-                e.nom as employe_nom,
-                s.nom as service_nom,
-                m.modele,
-                m.numero_serie,
-                tm.nom as type_materiel
-            FROM operations o
-            LEFT JOIN employes e ON o.employe_id = e.id
-            LEFT JOIN services s ON e.service_id = s.id
-            LEFT JOIN materiels m ON o.materiel_id = m.id
-            LEFT JOIN types_materiel tm ON m.type_id = tm.id
+        operation_query = f"""
+            SELECT
+                o.id, o.numero_fiche, o.type_operation, o.employe_id, o.materiel_id, o.date_operation,
+                i.declarant_nom, i.telephone, i.email, i.poste, i.numero_serie_actif,
+                i.actifs_json, i.natures_json, i.autres_infos, o.created_at,
+                {_signature_column('i.signature_png', include)},
+            {DETAILS_JOINS}
+            LEFT JOIN incidents i ON i.operation_id = o.id
             WHERE o.id = %s AND o.type_operation = 'incident'
         """
-        operation = db.execute_query(operation_query, (operation_id,))
+        operation, _ = fetch_with_archive(operation_query, (operation_id,))
         
         if not operation:
             return jsonify({'success': False, 'error': 'Incident non trouvé'}), 404
         
         operation_data = operation[0]
         
-        # Pour les incidents, parser les données JSON et renommer signature_png
+        # Pour les incidents, parser les données JSON
         try:
             if operation_data.get('actifs_json'):
                 operation_data['actifs'] = json.loads(operation_data['actifs_json'])
@@ -634,47 +665,66 @@ def get_incident_details(operation_id):
             operation_data['natures'] = []
         
         # Renommer signature_png en signature pour la cohérence
-        if 'signature_png' in operation_data:
-            operation_data['signature'] = operation_data.pop('signature_png')
-        
-        # S'assurer que la signature est incluse même si elle est null
-        if 'signature' not in operation_data:
-            operation_data['signature'] = None
+        signature = operation_data.pop('signature_png', None)
+        if include:
+            operation_data['signature'] = signature_data_url(signature)
+        else:
+            operation_data['signature'] = _lazy_signature_url(
+                signature, 'api.get_incident_signature', operation_id=operation_id
+            )
         
-        return jsonify({
+        return with_etag(jsonify({
             'success': True,
             'data': {
                 'incident': operation_data
             }
-        })
+        }), etag)
         
     except Exception as e:
         logging.error(f"Erreur lors de la récupération des détails de l'incident: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@api_bp.route('/incident/<int:operation_id>/signature', methods=['GET'])
+def get_incident_signature(operation_id):
+    """Image de la signature d'un incident non encore déplacée dans le magasin"""
+    try:
+        rows, _ = fetch_with_archive(
+            "SELECT signature_png FROM incidents WHERE operation_id = %s",
+            (operation_id,)
+        )
+        return _legacy_signature_response(rows[0]['signature_png'] if rows else None)
+    except Exception as e:
+        logging.error(f"Erreur lors de la lecture de la signature: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @api_bp.route('/incidents', methods=['POST'])
+@idempotent
 def create_incident():
     """Créer une fiche de signalisation d'incident"""
     try:
-        data = request.get_json()
-
-        # Champs minimaux
-        required = ['declarant_nom', 'telephone']
-        for field in required:
-            if field not in data or not data[field]:
-                return jsonify({'success': False, 'error': f'Champ manquant: {field}'}), 400
+        # Requête contrôlée (et normalisée) par son schéma avant toute requête SQL
+        try:
+            data = validate_incident(request.get_json(silent=True))
+        except SchemaError as e:
+            return jsonify({'success': False, 'error': str(e), 'errors': e.fields}), 400
+        try:
+            signature_ref = store_signature(data['signature_png'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e), 'errors': {'signature_png': str(e)}}), 400
+        except SignatureBusyError as e:
+            return jsonify({'success': False, 'error': str(e)}), 503
 
         # Générer le numéro de fiche pour l'incident
         numero_fiche = generate_numero_fiche('incident')
 
         # Lier éventuellement l'incident à un employé (pour afficher le service dans l'historique)
         employe_id = None
+        service_id = None
         try:
             service_nom = data.get('service')
             if service_nom and data.get('declarant_nom'):
-                service_rows = db.execute_query("SELECT id FROM services WHERE nom = %s", (service_nom,))
-                if service_rows:
-                    service_id = service_rows[0]['id']
+                service_id = services_cache.get_id(service_nom)
+                if service_id:
                     emp_rows = db.execute_query(
                         "SELECT id FROM employes WHERE nom = %s AND service_id = %s",
                         (data.get('declarant_nom'), service_id)
@@ -691,16 +741,14 @@ def create_incident():
         except Exception as _e:
             logging.warning(f"Impossible de lier l'incident à un employé: {_e}")
 
-        query = """
-            INSERT INTO operations (
-                numero_fiche, type_operation, date_operation, employe_id, declarant_nom, telephone, email, poste,
+        # Ligne commune dans operations, détails de l'incident dans sa table 1:1
+        incident_query = """
+            INSERT INTO incidents (
+                operation_id, declarant_nom, telephone, email, poste,
                 numero_serie_actif, actifs_json, natures_json, autres_infos, signature_png
-            ) VALUES (%s, 'incident', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        params = (
-            numero_fiche,
-            data.get('date_incident'),
-            employe_id,
+        incident_params = (
             data.get('declarant_nom'),
             data.get('telephone'),
             data.get('email'),
@@ -709,14 +757,24 @@ def create_incident():
             json.dumps([data.get('materiel_touche')] if data.get('materiel_touche') else [], ensure_ascii=False),
             json.dumps(data.get('natures', []), ensure_ascii=False),
             data.get('autres_infos'),
-            data.get('signature_png')
+            signature_ref
         )
 
-        rc = db.execute_query(query, params)
-        if rc is None:
-            raise Exception("Échec d'enregistrement de l'incident")
-        incident_id = db.get_last_insert_id()
-        
+        with db.transaction() as tx:
+            tx.execute(
+                "INSERT INTO operations (numero_fiche, type_operation, date_operation, employe_id) "
+                "VALUES (%s, 'incident', %s, %s)",
+                (numero_fiche, data.get('date_incident'), employe_id)
+            )
+            incident_id = tx.lastrowid
+            if not incident_id:
+                raise Exception("Échec d'enregistrement de l'incident")
+            tx.execute(incident_query, (incident_id,) + incident_params)
+            index_operations(tx, [(incident_id, [data.get('declarant_nom')], [data.get('numero_serie_actif')])])
+            # Le service n'est compté que si l'incident est lié à un employé (comme le recalcul)
+            record_operations(tx, [(data.get('date_incident'), 'incident', service_id if employe_id else None, None)])
+        data_version.bump()
+
         return jsonify({'success': True, 'message': 'Incident enregistré', 'id': incident_id, 'numero_fiche': numero_fiche})
 
     except Exception as e:
@@ -724,3 +782,170 @@ def create_incident():
         if current_app.config.get('DEBUG'):
             return jsonify({'success': False, 'error': str(e)}), 500
         return jsonify({'success': False, 'error': "Une erreur interne est survenue. Merci de contacter l'administrateur."}), 500
+
+@api_bp.route('/signatures/<digest>', methods=['GET'])
+def get_signature(digest):
+    """Servir une image de signature depuis le magasin (contenu immuable)"""
+    if not is_valid_digest(digest) or not signature_store.exists(digest):
+        return jsonify({'success': False, 'error': 'Signature introuvable'}), 404
+    response = send_file(
+        signature_store.path_for(digest),
+        mimetype='image/png',
+        etag=digest,
+        max_age=31536000,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@api_bp.route('/operation/<int:operation_id>/pdf', methods=['GET'])
+def get_operation_pdf(operation_id):
+    """Télécharger la fiche (attribution, restitution ou incident) en PDF"""
+    try:
+        result = fiche_pdf_path(operation_id)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Opération non trouvée'}), 404
+        path, filename = result
+        return send_file(path, mimetype='application/pdf', as_attachment=True,
+                         download_name=filename, conditional=True)
+    except Exception as e:
+        logging.error(f"Erreur lors de la génération du PDF: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/fiches/export', methods=['POST'])
+def create_fiches_export():
+    """Lancer l'export ZIP des fiches PDF d'une période (tâche d'arrière-plan)"""
+    payload = request.get_json(silent=True) or request.form
+    date_debut = _nz(payload.get('date_debut'))
+    date_fin = _nz(payload.get('date_fin'))
+    if not date_debut or not date_fin:
+        return jsonify({'success': False, 'error': 'date_debut et date_fin sont requis'}), 400
+    try:
+        datetime.strptime(date_debut, '%Y-%m-%d')
+        datetime.strptime(date_fin, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates attendues au format AAAA-MM-JJ'}), 400
+    job = start_export(date_debut, date_fin)
+    return jsonify({
+        'success': True,
+        'job_id': job['id'],
+        'status_url': url_for('api.get_fiches_export', job_id=job['id'])
+    }), 202
+
+@api_bp.route('/fiches/export/<job_id>', methods=['GET'])
+def get_fiches_export(job_id):
+    """Suivre l'avancement d'un export ZIP"""
+    job = jobs.get(job_id)
+    if job is None or job.get('kind') != 'export_fiches':
+        return jsonify({'success': False, 'error': 'Export introuvable'}), 404
+    data = {key: job.get(key) for key in ('id', 'status', 'total', 'done', 'errors', 'error')}
+    if job['status'] == 'done':
+        data['download_url'] = url_for('api.download_fiches_export', job_id=job_id)
+    return jsonify({'success': True, 'data': data})
+
+@api_bp.route('/fiches/export/<job_id>/download', methods=['GET'])
+def download_fiches_export(job_id):
+    """Télécharger le ZIP d'un export terminé"""
+    job = jobs.get(job_id)
+    if job is None or job.get('kind') != 'export_fiches' or job['status'] != 'done':
+        return jsonify({'success': False, 'error': 'Export introuvable ou non terminé'}), 404
+    if not os.path.isfile(job['file']):
+        return jsonify({'success': False, 'error': 'Export expiré, relancez-le'}), 410
+    return send_file(job['file'], mimetype='application/zip', as_attachment=True,
+                     download_name=f"fiches_{job['date_debut']}_{job['date_fin']}.zip")
+
+@api_bp.route('/materiels/<path:numero_serie>/detenteur', methods=['GET'])
+def get_materiel_detenteur(numero_serie):
+    """Détenteur actuel d'un matériel (null s'il n'est pas attribué)"""
+    try:
+        rows = db.execute_query(CURRENT_ASSIGNMENT_SELECT + " WHERE m.numero_serie = %s", (numero_serie,))
+        if rows is None:
+            raise Exception("Échec de lecture de l'index des détenteurs")
+        return jsonify({'success': True, 'data': rows[0] if rows else None})
+    except Exception as e:
+        logging.error(f"Erreur lors de la recherche du détenteur: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/employes/<int:employe_id>/materiels', methods=['GET'])
+def get_materiels_employe(employe_id):
+    """Matériels actuellement détenus par un employé"""
+    try:
+        rows = db.execute_query(
+            CURRENT_ASSIGNMENT_SELECT + " WHERE mca.employe_id = %s ORDER BY mca.depuis DESC", (employe_id,)
+        )
+        if rows is None:
+            raise Exception("Échec de lecture de l'index des détenteurs")
+        return jsonify({'success': True, 'data': rows})
+    except Exception as e:
+        logging.error(f"Erreur lors de la récupération des matériels de l'employé: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/services/<path:service_nom>/materiels', methods=['GET'])
+def get_materiels_service(service_nom):
+    """Matériels actuellement attribués dans un service"""
+    try:
+        service_id = services_cache.get_id(service_nom)
+        if not service_id:
+            return jsonify({'success': False, 'error': 'Service introuvable'}), 404
+        rows = db.execute_query(
+            CURRENT_ASSIGNMENT_SELECT + " WHERE mca.service_id = %s ORDER BY mca.depuis DESC", (service_id,)
+        )
+        if rows is None:
+            raise Exception("Échec de lecture de l'index des détenteurs")
+        return jsonify({'success': True, 'data': rows})
+    except Exception as e:
+        logging.error(f"Erreur lors de la récupération des matériels du service: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/stats', methods=['GET'])
+def get_statistiques():
+    """Statistiques du tableau de bord, lues dans les tables d'agrégats.
+
+    Paramètres optionnels `mois_debut` et `mois_fin` (AAAA-MM, inclus).
+    """
+    etag = data_etag('stats', request.query_string.decode('utf-8', 'replace'))
+    unchanged = not_modified(etag)
+    if unchanged is not None:
+        return unchanged
+    try:
+        bornes = []
+        for param in ('mois_debut', 'mois_fin'):
+            value = request.args.get(param)
+            try:
+                bornes.append(month_start(f"{value}-01") if value else None)
+            except ValueError:
+                return jsonify({'success': False, 'error': f'{param} attendu au format AAAA-MM'}), 400
+
+        par_mois, par_service, par_type, par_statut = get_stats(*bornes)
+        services = {row['id']: row['nom'] for row in services_cache.get_all()}
+        types = {row['id']: row['nom'] for row in types_materiel_cache.get_all()}
+
+        def ranked(counts, id_key, name_key, names):
+            rows = [{id_key: key or None, name_key: names.get(key), **values} for key, values in counts.items()]
+            return sorted(rows, key=lambda row: -row['total'])
+
+        return with_etag(jsonify({
+            'success': True,
+            'data': {
+                'par_mois': [{'mois': mois.strftime('%Y-%m'), **values} for mois, values in sorted(par_mois.items())],
+                'par_service': ranked(par_service, 'service_id', 'service', services),
+                'par_type_materiel': ranked(par_type, 'type_materiel_id', 'type_materiel', types),
+                'materiels_par_statut': par_statut,
+            }
+        }), etag)
+    except Exception as e:
+        logging.error(f"Erreur lors de la lecture des statistiques: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@api_bp.route('/_metrics', methods=['GET'])
+def get_metrics():
+    """Métriques Prometheus du processus (réservé aux administrateurs ou au jeton du collecteur)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    authorized = session.get('role') == 'admin' or (
+        token and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    )
+    if not authorized:
+        return jsonify({'success': False, 'error': 'Accès réservé aux administrateurs'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,231 @@
+from datetime import date
+
+from config import Config
+
+# Schémas déclaratifs des requêtes d'écriture.
+#
+# Chaque champ est décrit par un objet (Text, Date, List, Object...) que
+# `compile_schema` transforme une seule fois, à l'import, en fonctions
+# imbriquées: valider une requête n'interprète plus le schéma. Le validateur
+# retourne une copie normalisée de la requête (textes sans espaces autour,
+# chaînes vides -> None, dates en `date`, champs inconnus ignorés) ou lève
+# SchemaError avec une erreur par champ, avant tout accès à la base.
+
+
+class SchemaError(ValueError):
+    """Requête refusée: `fields` = {chemin du champ: message}."""
+
+    def __init__(self, fields):
+        self.fields = fields
+        path, message = next(iter(fields.items()))
+        super().__init__(f"{path}: {message}" if path else message)
+
+
+class Text:
+    """Texte (un nombre est accepté et converti); vide ou blanc -> None."""
+
+    def __init__(self, required=True, max_length=None):
+        self.required = required
+        self.max_length = max_length
+
+    def compile(self):
+        required, max_length = self.required, self.max_length
+
+        def check(value, path, errors):
+            if isinstance(value, str):
+                value = value.strip()
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            elif value is not None:
+                errors[path] = 'Texte attendu'
+                return None
+            if not value:
+                if required:
+                    errors[path] = 'Champ requis'
+                return None
+            if max_length is not None and len(value) > max_length:
+                errors[path] = f'{max_length} caractères maximum'
+            return value
+        return check
+
+
+class Date:
+    """Date AAAA-MM-JJ (une heure éventuelle est ignorée) -> `date`.
+    `default_today`: date du jour si le champ est absent."""
+
+    def __init__(self, required=True, default_today=False):
+        self.required = required
+        self.default_today = default_today
+
+    def compile(self):
+        required, default_today = self.required, self.default_today
+
+        def check(value, path, errors):
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == '':
+                if default_today:
+                    return date.today()
+                if required:
+                    errors[path] = 'Champ requis'
+                return None
+            if not isinstance(value, str):
+                errors[path] = 'Date attendue (AAAA-MM-JJ)'
+                return None
+            try:
+                # fromisoformat (bien plus rapide que strptime) sur la forme étendue seulement
+                if len(value) < 10 or value[4] != '-' or value[7] != '-':
+                    raise ValueError(value)
+                return date.fromisoformat(value[:10])
+            except ValueError:
+                errors[path] = 'Date invalide (AAAA-MM-JJ)'
+                return None
+        return check
+
+
+class Signature:
+    """Signature PNG (data URL ou référence du magasin), taille bornée."""
+
+    def __init__(self, required=False, max_bytes=None):
+        self.required = required
+        self.max_bytes = max_bytes
+
+    def compile(self):
+        required, max_bytes = self.required, self.max_bytes or Config.SIGNATURE_MAX_BYTES
+
+        def check(value, path, errors):
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if required:
+                    errors[path] = 'Signature requise'
+                return None
+            if not isinstance(value, str):
+                errors[path] = 'Image PNG (data URL) attendue'
+                return None
+            if len(value) > max_bytes:
+                errors[path] = f'Signature trop volumineuse ({max_bytes // 1024} Ko maximum)'
+                return None
+            return value
+        return check
+
+
+class List:
+    """Liste d'éléments de même schéma, nombre borné."""
+
+    def __init__(self, item, required=True, min_items=1, max_items=None):
+        self.item = item
+        self.required = required
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def compile(self):
+        item_check = self.item.compile()
+        required, min_items, max_items = self.required, self.min_items, self.max_items
+
+        def check(value, path, errors):
+            if value is None:
+                if required:
+                    errors[path] = 'Champ requis'
+                return []
+            if not isinstance(value, list):
+                errors[path] = 'Liste attendue'
+                return []
+            if len(value) < min_items:
+                errors[path] = 'Champ requis' if not value else f'{min_items} éléments minimum'
+            elif max_items is not None and len(value) > max_items:
+                errors[path] = f'{max_items} éléments maximum'
+                return []
+            return [item_check(item, f'{path}[{i}]', errors) for i, item in enumerate(value)]
+        return check
+
+
+class Object:
+    """Objet JSON aux champs déclarés; absent et facultatif -> champs à None."""
+
+    def __init__(self, fields, required=True):
+        self.fields = fields
+        self.required = required
+
+    def compile(self):
+        checks = tuple((name, field.compile()) for name, field in self.fields.items())
+        required = self.required
+
+        def check(value, path, errors):
+            if value is None:
+                if required:
+                    errors[path] = 'Champ requis'
+                    return None
+                value = {}
+            elif not isinstance(value, dict):
+                errors[path] = 'Objet attendu'
+                return None
+            prefix = f'{path}.' if path else ''
+            return {name: field_check(value.get(name), prefix + name, errors) for name, field_check in checks}
+        return check
+
+
+def compile_schema(schema):
+    """Validateur d'un schéma Object: requête -> requête normalisée, ou SchemaError."""
+    check = schema.compile()
+
+    def validate(payload):
+        if not isinstance(payload, dict):
+            raise SchemaError({'': 'Objet JSON attendu'})
+        errors = {}
+        result = check(payload, '', errors)
+        if errors:
+            raise SchemaError(errors)
+        return result
+    return validate
+
+
+SIGNATURE_ROLES = ('redaction', 'validation', 'destinataire')
+
+SIGNATAIRE = Object({
+    'nom': Text(max_length=100),
+    'fonction': Text(max_length=100),
+    'date': Date(),
+})
+
+
+def fiche_schema(materiel_fields):
+    """Fiche d'attribution / de restitution (un matériel par élément de `materiels`)."""
+    return Object({
+        'nom': Text(max_length=100),
+        'service': Text(max_length=100),
+        'motif': Text(required=False, max_length=2000),
+        'materiels': List(Object({
+            'type': Text(max_length=100),
+            'modele': Text(max_length=100),
+            'serie': Text(max_length=100),
+            **materiel_fields,
+        }), max_items=Config.FICHE_MAX_MATERIELS),
+        **{role: SIGNATAIRE for role in SIGNATURE_ROLES},
+        'signatures': Object({role: Signature() for role in SIGNATURE_ROLES}, required=False),
+    })
+
+
+ATTRIBUTION_SCHEMA = fiche_schema({
+    'serviceAchat': Text(required=False, max_length=100),
+    'dateRemise': Date(required=False),
+})
+RESTITUTION_SCHEMA = fiche_schema({
+    'dateRestitution': Date(required=False),
+})
+INCIDENT_SCHEMA = Object({
+    'declarant_nom': Text(max_length=150),
+    'telephone': Text(max_length=50),
+    'email': Text(required=False, max_length=150),
+    'poste': Text(required=False, max_length=150),
+    'service': Text(required=False, max_length=100),
+    'numero_serie_actif': Text(required=False, max_length=150),
+    'materiel_touche': Text(required=False, max_length=150),
+    'natures': List(Text(max_length=50), required=False, min_items=0, max_items=20),
+    'autres_infos': Text(required=False, max_length=5000),
+    'date_incident': Date(required=False, default_today=True),
+    'signature_png': Signature(),
+})
+
+# Validateurs compilés (une fois, à l'import)
+validate_attribution = compile_schema(ATTRIBUTION_SCHEMA)
+validate_restitution = compile_schema(RESTITUTION_SCHEMA)
+validate_incident = compile_schema(INCIDENT_SCHEMA)
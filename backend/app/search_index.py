@@ -0,0 +1,133 @@
+import re
+import unicodedata
+
+from database.database import db
+
+# Index de recherche de l'historique: une ligne de texte normalisé par
+# opération (operation_search) et ses trigrammes (operation_search_trigrams).
+# Une recherche par sous-chaîne de 3 caractères ou plus ne lit que les
+# opérations possédant tous les trigrammes du terme, puis confirme la
+# sous-chaîne sur ce petit ensemble.
+CHAMPS = ('nom', 'serie')
+_NOT_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize_nom(text):
+    """Nom sans accents, en minuscules, mots séparés par un espace
+    (même principe que import_users.strip_accents)."""
+    if not text:
+        return ''
+    t = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(_NOT_ALNUM.sub(' ', t.casefold()).split())
+
+
+def normalize_serie(text):
+    """Numéro de série en minuscules, limité aux caractères alphanumériques."""
+    if not text:
+        return ''
+    t = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _NOT_ALNUM.sub('', t.casefold())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_operations(tx, entries):
+    """Indexer des opérations dans la transaction d'écriture.
+
+    `entries`: (operation_id, noms, series) où noms et series sont des listes
+    de valeurs brutes (employé, déclarant / numéro de série du matériel...).
+    """
+    if not entries:
+        return
+    rows, grams = [], []
+    for operation_id, noms, series in entries:
+        nom = ' | '.join(dict.fromkeys(n for n in map(normalize_nom, noms) if n))
+        serie = ' | '.join(dict.fromkeys(s for s in map(normalize_serie, series) if s))
+        rows.append((operation_id, nom[:255], serie[:255]))
+        for champ, value in (('nom', nom), ('serie', serie)):
+            for part in value.split(' | '):
+                grams.extend((champ, gram, operation_id) for gram in trigrams(part))
+
+    tx.insert_rows(
+        "INSERT INTO operation_search (operation_id, nom_normalise, serie_normalisee) VALUES", rows,
+        suffix="ON DUPLICATE KEY UPDATE nom_normalise = VALUES(nom_normalise), "
+               "serie_normalisee = VALUES(serie_normalisee)"
+    )
+    for start in range(0, len(grams), 5000):
+        tx.insert_rows(
+            "INSERT IGNORE INTO operation_search_trigrams (champ, trigramme, operation_id) VALUES",
+            grams[start:start + 5000]
+        )
+
+
+def search_join(champ, term, alias):
+    """Jointures SQL restreignant `operations o` aux opérations dont le champ
+    contient `term` (après normalisation). Retourne (sql, params), ou None si
+    le terme est vide après normalisation.
+    """
+    if champ not in CHAMPS:
+        raise ValueError(f"Champ de recherche inconnu: {champ}")
+    normalized = normalize_nom(term) if champ == 'nom' else normalize_serie(term)
+    if not normalized:
+        return None
+    column = 'nom_normalise' if champ == 'nom' else 'serie_normalisee'
+    sql, params = "", []
+
+    grams = sorted(trigrams(normalized))
+    if grams:
+        # Opérations candidates: celles qui possèdent tous les trigrammes du terme
+        sql += (
+            f" JOIN (SELECT operation_id FROM operation_search_trigrams"
+            f" WHERE champ = %s AND trigramme IN ({', '.join(['%s'] * len(grams))})"
+            f" GROUP BY operation_id HAVING COUNT(*) = %s) {alias}_t ON {alias}_t.operation_id = o.id"
+        )
+        params += [champ, *grams, len(grams)]
+
+    # Confirmation de la sous-chaîne (l'ordre des trigrammes n'est pas vérifié ci-dessus)
+    sql += f" JOIN operation_search {alias} ON {alias}.operation_id = o.id AND {alias}.{column} LIKE %s"
+    params.append(f"%{normalized}%")
+    return sql, params
+
+
+def rebuild_search_index(batch_size=1000):
+    """Réindexer toutes les opérations par lots de `batch_size` (clé primaire croissante).
+
+    Seules les tables courantes sont réindexées: les entrées des opérations
+    archivées ont été déplacées avec elles (app.archive) et ne changent plus.
+
+    Retourne le nombre d'opérations indexées.
+    """
+    last_id, total = 0, 0
+    while True:
+        rows = db.execute_query(
+            """
+            SELECT o.id, e.nom AS employe_nom, i.declarant_nom, m.numero_serie, i.numero_serie_actif
+            FROM operations o
+            LEFT JOIN employes e ON e.id = o.employe_id
+            LEFT JOIN materiels m ON m.id = o.materiel_id
+            LEFT JOIN incidents i ON i.operation_id = o.id
+            WHERE o.id > %s
+            ORDER BY o.id
+            LIMIT %s
+            """,
+            (last_id, batch_size)
+        )
+        if rows is None:
+            raise Exception("Échec de lecture des opérations à indexer")
+        if not rows:
+            return total
+        ids = [row['id'] for row in rows]
+        with db.transaction() as tx:
+            tx.execute(
+                f"DELETE FROM operation_search_trigrams WHERE operation_id IN ({', '.join(['%s'] * len(ids))})",
+                ids
+            )
+            index_operations(tx, [
+                (row['id'], [row['employe_nom'], row['declarant_nom']], [row['numero_serie'], row['numero_serie_actif']])
+                for row in rows
+            ])
+        total += len(rows)
+        last_id = ids[-1]
+        print(f"  {total} opérations indexées (id <= {last_id})")
@@ -0,0 +1,76 @@
+import io
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+try:
+    from PIL import Image  # Pillow: sans lui, les signatures sont stockées telles que reçues
+except ImportError:
+    Image = None
+
+from config import Config
+
+# Pixel (en gris, sur fond blanc) compté comme de l'encre pour le rognage
+INK_THRESHOLD = 224
+# Marge laissée autour de l'encre (pixels)
+CROP_MARGIN = 4
+# Garde-fou: une signature du formulaire fait 500×160
+MAX_PIXELS = 4096 * 1024
+
+# Pool borné: le décodage et l'encodage PNG de Pillow relâchent le GIL, les
+# autres requêtes du worker continuent d'être servies pendant la conversion.
+_signature_executor = ThreadPoolExecutor(max_workers=Config.SIGNATURE_WORKERS, thread_name_prefix='signature')
+
+
+class SignatureBusyError(RuntimeError):
+    """Normalisation non terminée dans le délai SIGNATURE_TIMEOUT (pool saturé)."""
+
+
+def normalize_png(data, levels=None):
+    """Réduire une signature PNG reçue du formulaire.
+
+    Le tracé (RGBA sur fond transparent) est posé sur fond blanc, rogné au
+    cadre de l'encre, réduit à `levels` niveaux de gris (2 = noir et blanc,
+    défaut SIGNATURE_GRAY_LEVELS) puis ré-encodé en PNG à palette de 1, 2 ou
+    4 bits. Les octets d'origine sont retournés s'ils sont déjà plus petits.
+    Lève ValueError si l'image est illisible.
+    """
+    if Image is None:
+        return data
+    levels = max(2, min(levels or Config.SIGNATURE_GRAY_LEVELS, 16))
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise ValueError("Signature invalide: image trop grande")
+            image = image.convert('RGBA')
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValueError("Signature invalide: image illisible")
+
+    background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+    gray = Image.alpha_composite(background, image).convert('L')
+    bbox = gray.point(lambda v: 255 if v < INK_THRESHOLD else 0).getbbox()
+    if bbox:
+        left, top, right, bottom = bbox
+        gray = gray.crop((
+            max(left - CROP_MARGIN, 0), max(top - CROP_MARGIN, 0),
+            min(right + CROP_MARGIN, gray.width), min(bottom + CROP_MARGIN, gray.height)
+        ))
+
+    # Indice de palette = niveau de gris le plus proche
+    step = 255 / (levels - 1)
+    indexed = Image.frombytes('P', gray.size, gray.point(lambda v: round(v / step)).tobytes())
+    indexed.putpalette([round(i * step) for i in range(levels) for _ in range(3)])
+    output = io.BytesIO()
+    indexed.save(output, format='PNG', optimize=True)
+    normalized = output.getvalue()
+    return normalized if len(normalized) < len(data) else data
+
+
+def normalize_offloaded(payloads):
+    """normalize_png de plusieurs images en parallèle dans le pool.
+    Lève SignatureBusyError au-delà de SIGNATURE_TIMEOUT."""
+    futures = [_signature_executor.submit(normalize_png, data) for data in payloads]
+    try:
+        return [future.result(timeout=Config.SIGNATURE_TIMEOUT) for future in futures]
+    except FutureTimeoutError:
+        for future in futures:
+            future.cancel()
+        raise SignatureBusyError("Traitement des signatures saturé, réessayez dans quelques instants")
@@ -0,0 +1,204 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from config import Config
+from app.metrics import metrics
+from app.signature_image import normalize_offloaded, normalize_png
+
+# Les signatures sont référencées en base par "sha256:<empreinte hexadécimale>"
+REF_PREFIX = 'sha256:'
+DATA_URL_PREFIX = 'data:image/png;base64,'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+# Longueur d'une référence: lire LEFT(colonne, REFERENCE_LENGTH) suffit à la
+# reconnaître sans transférer une ancienne data URL en entier
+REFERENCE_LENGTH = len(REF_PREFIX) + 64
+# Images reçues déjà normalisées: empreinte reçue -> empreinte stockée (les
+# signatures par défaut d'un lot, ou renvoyées à l'identique, ne sont
+# converties qu'une fois)
+NORMALIZED_CACHE_SIZE = 1024
+
+
+class SignatureStore:
+    """Magasin de signatures PNG sur disque, adressé par contenu.
+
+    Chaque image est écrite une seule fois sous <racine>/ab/cd/<sha256>.png:
+    deux signatures identiques partagent le même fichier.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.png")
+
+    def exists(self, digest):
+        return os.path.isfile(self.path_for(digest))
+
+    def put(self, data):
+        """Enregistrer des octets PNG et retourner leur empreinte SHA-256."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if os.path.isfile(path):
+            return digest
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Écriture atomique: un lecteur ne voit jamais un fichier partiel
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+
+signature_store = SignatureStore(Config.SIGNATURE_STORE_DIR)
+
+
+def is_valid_digest(digest):
+    return bool(digest) and bool(_DIGEST_RE.match(digest))
+
+
+def is_reference(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def reference_digest(value):
+    """Empreinte contenue dans une référence, ou None."""
+    if not is_reference(value):
+        return None
+    digest = value[len(REF_PREFIX):]
+    return digest if is_valid_digest(digest) else None
+
+
+def decode_data_url(value):
+    """Décoder une data URL PNG (ou du base64 brut) en octets PNG.
+
+    Lève ValueError si la valeur n'est pas une image PNG valide.
+    """
+    payload = value.split(',', 1)[1] if value.startswith('data:') else value
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Signature invalide: base64 illisible")
+    if not data.startswith(PNG_MAGIC):
+        raise ValueError("Signature invalide: image PNG attendue")
+    return data
+
+
+def store_signatures(values, offload=True):
+    """Stocker les signatures reçues d'un formulaire et retourner leurs références.
+
+    Les images sont normalisées (app.signature_image) avant d'être stockées:
+    en parallèle dans le pool, ou dans le thread appelant avec
+    `offload=False` (imports par lot, qui ne doivent pas occuper le pool des
+    formulaires). Une image déjà normalisée n'est pas reconvertie. None pour
+    une signature absente; une référence déjà stockée est retournée telle
+    quelle. Lève ValueError si une signature est invalide, SignatureBusyError
+    si le pool est saturé.
+    """
+    references, pending = [None] * len(values), {}
+    for i, value in enumerate(values):
+        if value is None or (isinstance(value, str) and value.strip() == ''):
+            continue
+        if is_reference(value):
+            references[i] = value
+            continue
+        data = decode_data_url(value)
+        received = hashlib.sha256(data).hexdigest()
+        stored = _normalized_digest(received)
+        if stored is not None:
+            references[i] = f"{REF_PREFIX}{stored}"
+            continue
+        pending.setdefault(received, (data, []))[1].append(i)
+
+    payloads = [data for data, _ in pending.values()]
+    normalized = normalize_offloaded(payloads) if offload else [normalize_png(data) for data in payloads]
+    for (received, (data, indexes)), png in zip(pending.items(), normalized):
+        metrics.signature_bytes.observe(('recue',), len(data))
+        metrics.signature_bytes.observe(('stockee',), len(png))
+        stored = signature_store.put(png)
+        _remember_normalized(received, stored)
+        for i in indexes:
+            references[i] = f"{REF_PREFIX}{stored}"
+    return references
+
+
+_normalized = OrderedDict()
+_normalized_lock = threading.Lock()
+
+
+def _normalized_digest(received):
+    with _normalized_lock:
+        stored = _normalized.get(received)
+        if stored is not None:
+            _normalized.move_to_end(received)
+    # Le fichier a pu être supprimé du magasin depuis
+    return stored if stored is not None and signature_store.exists(stored) else None
+
+
+def _remember_normalized(received, stored):
+    with _normalized_lock:
+        _normalized[received] = stored
+        _normalized.move_to_end(received)
+        while len(_normalized) > NORMALIZED_CACHE_SIZE:
+            _normalized.popitem(last=False)
+
+
+def check_signature(value):
+    """Contrôler une signature sans la stocker (lève ValueError si elle est invalide)."""
+    if value is None or (isinstance(value, str) and value.strip() == '') or is_reference(value):
+        return
+    decode_data_url(value)
+
+
+def store_signature(value):
+    """Stocker une signature reçue (voir store_signatures) et retourner sa référence."""
+    return store_signatures([value])[0]
+
+
+def signature_bytes(value):
+    """Octets PNG d'une signature (référence ou ancienne data URL), ou None."""
+    if not value:
+        return None
+    digest = reference_digest(value)
+    if digest is not None:
+        if not signature_store.exists(digest):
+            return None
+        with open(signature_store.path_for(digest), 'rb') as f:
+            return f.read()
+    try:
+        return decode_data_url(value)
+    except ValueError:
+        return None
+
+
+def signature_data_url(value):
+    """Data URL PNG d'une signature (référence ou ancienne data URL), ou None."""
+    data = signature_bytes(value)
+    if data is None:
+        return None
+    return DATA_URL_PREFIX + base64.b64encode(data).decode('ascii')
+
+
+def signature_url(value):
+    """URL publique d'une signature référencée.
+
+    Les lignes non encore migrées contiennent encore la data URL: elle est
+    retournée telle quelle, l'attribut src d'une image l'accepte aussi.
+    """
+    digest = reference_digest(value)
+    if digest is None:
+        return value
+    from flask import url_for
+    return url_for('api.get_signature', digest=digest)
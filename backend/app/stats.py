@@ -0,0 +1,167 @@
+import logging
+from collections import Counter
+from datetime import date, datetime
+
+from database.database import db
+from app.archive import source_query
+
+# Agrégats entretenus par les écritures (voir fiches.write_fiches et create_incident).
+# service_id / type_materiel_id valent 0 quand l'opération n'en a pas (incident).
+OPERATIONS_UPSERT = "INSERT INTO stats_operations (mois, type_operation, service_id, type_materiel_id, total) VALUES"
+STATUT_UPSERT = "INSERT INTO stats_materiels_statut (statut, total) VALUES"
+INCREMENT_SUFFIX = "ON DUPLICATE KEY UPDATE total = total + VALUES(total)"
+
+# Comptage des opérations par (mois, type, service, type de matériel)
+AGGREGATE_SELECT = """
+    SELECT
+        o.date_operation - INTERVAL (DAYOFMONTH(o.date_operation) - 1) DAY AS mois,
+        o.type_operation,
+        COALESCE(e.service_id, 0) AS service_id,
+        COALESCE(m.type_id, 0) AS type_materiel_id,
+        COUNT(*) AS total
+    FROM operations o
+    LEFT JOIN employes e ON e.id = o.employe_id
+    LEFT JOIN materiels m ON m.id = o.materiel_id
+"""
+AGGREGATE_GROUP_BY = " GROUP BY 1, 2, 3, 4"
+
+OPERATION_TYPES = ('attribution', 'restitution', 'incident')
+
+
+def month_start(value):
+    """Premier jour du mois d'une date (date, datetime ou texte AAAA-MM-JJ)."""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    elif not isinstance(value, date):
+        raise ValueError(f"Date d'opération invalide: {value!r}")
+    return value.replace(day=1)
+
+
+def record_operations(tx, operations):
+    """Compter des opérations écrites dans la transaction `tx`.
+
+    `operations`: itérable de (date_operation, type_operation, service_id, type_materiel_id).
+    Une seule requête, quel que soit le nombre d'opérations.
+    """
+    counts = Counter(
+        (month_start(date_operation), type_operation, service_id or 0, type_materiel_id or 0)
+        for date_operation, type_operation, service_id, type_materiel_id in operations
+    )
+    # Clés triées: deux écritures concurrentes verrouillent les lignes dans le même ordre
+    tx.insert_rows(OPERATIONS_UPSERT, [key + (n,) for key, n in sorted(counts.items())], suffix=INCREMENT_SUFFIX)
+
+
+def record_statut_changes(tx, changes):
+    """Reporter des changements de statut de matériels: (ancien ou None si créé, nouveau)."""
+    deltas = Counter()
+    for old, new in changes:
+        if old == new:
+            continue
+        if old:
+            deltas[old] -= 1
+        deltas[new] += 1
+    tx.insert_rows(STATUT_UPSERT, sorted((statut, n) for statut, n in deltas.items() if n), suffix=INCREMENT_SUFFIX)
+
+
+def recompute_statut_stats(tx):
+    """Recalculer les totaux par statut depuis `materiels` (table de taille bornée)."""
+    tx.execute("DELETE FROM stats_materiels_statut")
+    tx.execute(
+        "INSERT INTO stats_materiels_statut (statut, total) "
+        "SELECT statut, COUNT(*) FROM materiels WHERE statut IS NOT NULL GROUP BY statut"
+    )
+
+
+def recompute_stats(batch_size=50000):
+    """Recalculer tous les agrégats depuis `operations` et son archive.
+
+    L'historique est parcouru par tranches de clé primaire (une requête GROUP BY
+    par tranche, aucune ligne détaillée transférée), puis les agrégats sont
+    remplacés dans une transaction. Celle-ci verrouille la fin de la table
+    (id > dernier identifiant parcouru): les opérations écrites pendant le
+    parcours sont comptées et les nouvelles attendent le commit.
+    À lancer en période calme: une écriture encore en cours au début du parcours
+    avec un identifiant inférieur peut ne pas être comptée, et jamais pendant
+    un archivage (une opération déplacée en cours de parcours serait comptée
+    deux fois ou pas du tout).
+    Retourne le nombre d'opérations comptées.
+    """
+    totals = Counter()
+
+    def add(aggregates):
+        for row in aggregates:
+            key = (row['mois'], row['type_operation'], row['service_id'], row['type_materiel_id'])
+            totals[key] += row['total']
+
+    # Historique archivé puis tables courantes (identifiants distincts)
+    for archived in (True, False):
+        select = source_query(AGGREGATE_SELECT, archived)
+        rows = db.execute_query(source_query("SELECT COALESCE(MAX(id), 0) AS max_id FROM operations", archived))
+        if rows is None:
+            raise Exception("Échec de lecture des opérations")
+        max_id = rows[0]['max_id']
+        for start in range(0, max_id, batch_size):
+            end = min(start + batch_size, max_id)
+            aggregates = db.execute_query(select + " WHERE o.id > %s AND o.id <= %s" + AGGREGATE_GROUP_BY, (start, end))
+            if aggregates is None:
+                raise Exception(f"Échec d'agrégation des opérations (ids {start + 1}-{end})")
+            add(aggregates)
+            logging.info(f"Statistiques: opérations jusqu'à l'id {end}/{max_id} agrégées")
+
+    with db.transaction() as tx:
+        tx.fetchall("SELECT COUNT(*) AS n FROM operations WHERE id > %s FOR UPDATE", (max_id,))
+        add(tx.fetchall(AGGREGATE_SELECT + " WHERE o.id > %s" + AGGREGATE_GROUP_BY, (max_id,)))
+        tx.execute("DELETE FROM stats_operations")
+        rows = [key + (n,) for key, n in sorted(totals.items())]
+        for start in range(0, len(rows), 1000):
+            tx.insert_rows(OPERATIONS_UPSERT, rows[start:start + 1000])
+        recompute_statut_stats(tx)
+    total = sum(totals.values())
+    logging.info(f"Statistiques recalculées: {total} opérations, {len(totals)} agrégats")
+    return total
+
+
+def _pivot(rows, key):
+    """Lignes (clé, type_operation, total) -> {clé: {attribution, restitution, incident, total}}."""
+    result = {}
+    for row in rows:
+        entry = result.setdefault(row[key], dict.fromkeys(OPERATION_TYPES + ('total',), 0))
+        entry[row['type_operation']] += int(row['total'])
+        entry['total'] += int(row['total'])
+    return result
+
+
+def get_stats(mois_debut=None, mois_fin=None):
+    """Statistiques lues dans les agrégats (la taille de l'historique n'intervient pas).
+
+    `mois_debut` / `mois_fin`: dates (premier jour du mois) bornant la période, incluses.
+    Retourne les comptes par mois, par service (id), par type de matériel (id)
+    et les matériels par statut.
+    """
+    where, params = " WHERE 1=1", []
+    if mois_debut:
+        where += " AND mois >= %s"
+        params.append(mois_debut)
+    if mois_fin:
+        where += " AND mois <= %s"
+        params.append(mois_fin)
+
+    def grouped(column):
+        rows = db.execute_query(
+            f"SELECT {column}, type_operation, SUM(total) AS total FROM stats_operations"
+            f"{where} GROUP BY {column}, type_operation",
+            params
+        )
+        if rows is None:
+            raise Exception("Échec de lecture des statistiques")
+        return _pivot(rows, column)
+
+    par_mois = grouped('mois')
+    par_service = grouped('service_id')
+    par_type = grouped('type_materiel_id')
+    statuts = db.execute_query("SELECT statut, total FROM stats_materiels_statut")
+    if statuts is None:
+        raise Exception("Échec de lecture des statistiques")
+    return par_mois, par_service, par_type, {row['statut']: int(row['total']) for row in statuts}
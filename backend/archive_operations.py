@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Archivage de l'historique ancien.
+
+Déplace les opérations antérieures au seuil (avec leurs incidents, signatures
+et entrées de l'index de recherche) des tables courantes vers les tables
+d'archive (migration 6). L'historique ne lit les archives qu'avec
+`archives=1`: le coût des requêtes sur la période récente reste constant
+quand les années s'accumulent. Les statistiques et l'index des détenteurs
+ne changent pas.
+
+À planifier, par exemple le 1er de chaque mois (cron):
+    30 2 1 * * cd /chemin/backend && python archive_operations.py
+
+Usage: python archive_operations.py [--mois 24 | --avant AAAA-MM-JJ] [--batch-size 1000] [--pause 0.05] [--dry-run]
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime
+
+from config import Config
+from database.database import db
+from app.archive import archive_cutoff, archive_operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Déplacer l'historique ancien dans les tables d'archive")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--mois', type=int, default=Config.ARCHIVE_AFTER_MONTHS,
+                       help="Conserver les N derniers mois entiers (défaut: ARCHIVE_AFTER_MONTHS)")
+    group.add_argument('--avant', help="Archiver les opérations antérieures à cette date (AAAA-MM-JJ)")
+    parser.add_argument('--batch-size', type=int, default=Config.ARCHIVE_BATCH_SIZE, help="Opérations par transaction")
+    parser.add_argument('--pause', type=float, default=0.05, help="Pause entre deux lots (secondes)")
+    parser.add_argument('--dry-run', action='store_true', help="Compter les opérations à archiver sans les déplacer")
+    args = parser.parse_args()
+
+    if args.avant:
+        try:
+            cutoff = datetime.strptime(args.avant, '%Y-%m-%d').date()
+        except ValueError:
+            print("Date invalide (format attendu: AAAA-MM-JJ)")
+            sys.exit(2)
+    else:
+        cutoff = archive_cutoff(args.mois)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        if args.dry_run:
+            rows = db.execute_query("SELECT COUNT(*) AS n FROM operations WHERE date_operation < %s", (cutoff,))
+            print(f"{rows[0]['n'] if rows else '?'} opérations antérieures au {cutoff} à archiver")
+            return
+        count = archive_operations(cutoff, args.batch_size, args.pause)
+    finally:
+        db.disconnect()
+    print(f"{count} opérations antérieures au {cutoff} archivées en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Outils de mesure de charge et de performance (nécessitent une base MySQL locale)."""
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Jeu de données synthétique pour les mesures de performance.
+
+Insère des services, employés, matériels et opérations (attributions,
+restitutions, incidents) avec des signatures PNG de taille réaliste, puis
+reconstruit l'index des détenteurs et les statistiques. Toutes les lignes sont
+marquées (services « Bench ... », employés @bench.invalid, séries BENCH-...) et
+`--purge` les retire.
+Les dates sont toutes dans le passé: les numéros de fiche synthétiques ne
+peuvent pas entrer en collision avec ceux alloués par l'application.
+
+Usage (depuis backend/):
+    python -m bench.dataset --operations 100000 [--employes 2000] [--materiels 20000] [--seed 42]
+    python -m bench.dataset --purge
+"""
+
+import argparse
+import base64
+import io
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from PIL import Image, ImageDraw
+
+from database.database import db
+from app.archive import delete_archived
+from app.assignments import rebuild_current_assignments
+from app.http_cache import data_version
+from app.numero_fiche import PREFIX_MAP
+from app.reference_cache import invalidate_reference_caches
+from app.search_index import index_operations
+from app.signature_store import store_signature
+from app.stats import recompute_stats
+
+SERIE_PREFIX = 'BENCH-'
+SERVICE_PATTERN = 'Bench service %'
+EMAIL_DOMAIN = '@bench.invalid'
+
+PRENOMS = ['Amina', 'Élodie', 'Jérôme', 'Fatima', 'Karim', 'Hélène', 'Noël', 'Zoé', 'Youssef', 'Anaïs',
+           'François', 'Inès', 'Loïc', 'Maëlle', 'Said', 'Chloé', 'Rachid', 'Océane', 'Théo', 'Leïla']
+NOMS = ['Durand', 'Benali', 'Lefèvre', 'El Amrani', 'Moreau', 'Bouchard', 'Ouédraogo', 'Garnier',
+        'Haddad', 'Chevalier', 'Mercier', 'Benjelloun', 'Lemaître', 'Faure', 'Idrissi', 'Rousseau']
+MODELES = ['Latitude 5440', 'EliteBook 840', 'ThinkPad T14', 'OptiPlex 7010', 'P2422H', 'iPhone 13',
+           'Galaxy Tab S8', 'MX Master 3', 'Dock WD19']
+NATURES = ['perte_service', 'erreur_saisie', 'mauvais_fonct_logiciel', 'accident_electrique',
+           'vol_ordinateur', 'mauvais_fonct_materiel', 'degradation_performance', 'virus', 'autre']
+ACTIFS = ['ordinateur_portable', 'ordinateur_bureau', 'ecran', 'telephone', 'tablette', 'imprimante']
+
+
+def signature_png(rng, target_kb=12, width=500, height=200):
+    """Signature PNG manuscrite simulée (tracés aléatoires) d'environ `target_kb` Ko.
+
+    La taille est ajustée par l'épaisseur et le nombre de tracés, comme pour
+    une signature dessinée sur le canvas du formulaire.
+    """
+    strokes = max(3, int(target_kb * 1.5))
+    image = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+    for _ in range(strokes):
+        points = [(rng.randint(10, width - 10), rng.randint(20, height - 20)) for _ in range(rng.randint(4, 12))]
+        draw.line(points, fill=(17, 24, 39, 255), width=rng.randint(2, 4), joint='curve')
+    out = io.BytesIO()
+    image.save(out, format='PNG')
+    return out.getvalue()
+
+
+def signature_data_url(png):
+    return 'data:image/png;base64,' + base64.b64encode(png).decode('ascii')
+
+
+def random_nom(rng):
+    return f"{rng.choice(PRENOMS)} {rng.choice(NOMS)}"
+
+
+def _ids(query, params=None):
+    rows = db.execute_query(query, params)
+    if rows is None:
+        raise Exception(f"Échec de lecture: {query}")
+    return [row['id'] for row in rows]
+
+
+def seed(operations, employes, materiels, services, signatures, signature_kb, days, chunk_size, rng):
+    started = time.perf_counter()
+
+    # Référentiels
+    with db.transaction() as tx:
+        tx.insert_rows(
+            "INSERT IGNORE INTO services (nom, description) VALUES",
+            [(f"Bench service {i:03d}", 'Service synthétique (mesures)') for i in range(1, services + 1)]
+        )
+    invalidate_reference_caches()
+    service_ids = _ids("SELECT id FROM services WHERE nom LIKE %s", (SERVICE_PATTERN,))
+    type_ids = _ids("SELECT id FROM types_materiel")
+
+    refs = [store_signature(signature_data_url(signature_png(rng, signature_kb))) for _ in range(signatures)]
+
+    employe_rows = []
+    for i in range(employes):
+        employe_rows.append((random_nom(rng), rng.choice(service_ids), f"bench{i}{EMAIL_DOMAIN}"))
+    with db.transaction() as tx:
+        for start in range(0, len(employe_rows), chunk_size):
+            tx.insert_rows("INSERT INTO employes (nom, service_id, email) VALUES", employe_rows[start:start + chunk_size])
+    employe_list = db.execute_query(
+        "SELECT id, nom FROM employes WHERE email LIKE %s", (f"%{EMAIL_DOMAIN}",)
+    )
+
+    base = db.execute_query("SELECT COALESCE(MAX(id), 0) AS m FROM materiels")[0]['m']
+    materiel_rows = [
+        (rng.choice(type_ids), rng.choice(MODELES), f"{SERIE_PREFIX}{base + i:08d}", 'Bench',
+         date.today() - timedelta(days=rng.randint(days, days * 3)), 'disponible')
+        for i in range(1, materiels + 1)
+    ]
+    with db.transaction() as tx:
+        for start in range(0, len(materiel_rows), chunk_size):
+            tx.insert_rows(
+                "INSERT INTO materiels (type_id, modele, numero_serie, service_achat, date_achat, statut) VALUES",
+                materiel_rows[start:start + chunk_size]
+            )
+    materiel_list = db.execute_query(
+        "SELECT id, numero_serie FROM materiels WHERE numero_serie LIKE %s", (f"{SERIE_PREFIX}%",)
+    )
+    print(f"Référentiels: {len(service_ids)} services, {len(employe_list)} employés, {len(materiel_list)} matériels")
+
+    # Opérations: identifiants explicites à partir du maximum courant (seul écrivain)
+    next_id = db.execute_query(
+        "SELECT GREATEST((SELECT COALESCE(MAX(id), 0) FROM operations), "
+        "(SELECT COALESCE(MAX(id), 0) FROM operations_archive)) AS m"
+    )[0]['m'] + 1
+    # Numéros de fiche: à la suite des numéros déjà présents sur la période
+    sequences = {
+        (row['prefixe'], row['jour']): int(row['dernier'] or 0)
+        for row in db.execute_query(
+            "SELECT LEFT(numero_fiche, 3) AS prefixe, date_operation AS jour, "
+            "MAX(CAST(SUBSTRING_INDEX(numero_fiche, '-', -1) AS UNSIGNED)) AS dernier "
+            "FROM operations WHERE date_operation >= %s GROUP BY LEFT(numero_fiche, 3), date_operation",
+            (date.today() - timedelta(days=days),)
+        ) or []
+    }
+    done = 0
+    while done < operations:
+        count = min(chunk_size, operations - done)
+        operation_rows, incident_rows, signature_rows, search_entries = [], [], [], []
+        for _ in range(count):
+            jour = date.today() - timedelta(days=rng.randint(1, days))
+            type_operation = rng.choices(['attribution', 'restitution', 'incident'], weights=[45, 35, 20])[0]
+            prefixe = PREFIX_MAP[type_operation]
+            sequences[(prefixe, jour)] = sequences.get((prefixe, jour), 0) + 1
+            numero_fiche = f"{prefixe}-{jour:%Y%m%d}-{sequences[(prefixe, jour)]:03d}"
+            employe = rng.choice(employe_list)
+            if type_operation == 'incident':
+                materiel = rng.choice(materiel_list)
+                operation_rows.append((next_id, numero_fiche, 'incident', employe['id'], None, jour, None, None, None))
+                incident_rows.append((
+                    next_id, employe['nom'], f"06{rng.randint(10000000, 99999999)}", None, f"Poste {rng.randint(100, 999)}",
+                    materiel['numero_serie'], json.dumps([rng.choice(ACTIFS)]),
+                    json.dumps(rng.sample(NATURES, rng.randint(1, 3))), 'Incident synthétique', rng.choice(refs)
+                ))
+                search_entries.append((next_id, [employe['nom']], [materiel['numero_serie']]))
+            else:
+                materiel = rng.choice(materiel_list)
+                operation_rows.append((
+                    next_id, numero_fiche, type_operation, employe['id'], materiel['id'], jour,
+                    jour if type_operation == 'attribution' else None,
+                    jour if type_operation == 'restitution' else None,
+                    'Fiche synthétique'
+                ))
+                for role in ('redaction', 'validation', 'destinataire'):
+                    signature_rows.append((next_id, role, random_nom(rng), 'IT', jour, rng.choice(refs)))
+                search_entries.append((next_id, [employe['nom']], [materiel['numero_serie']]))
+            next_id += 1
+
+        with db.transaction() as tx:
+            tx.insert_rows(
+                "INSERT INTO operations (id, numero_fiche, type_operation, employe_id, materiel_id, date_operation, "
+                "date_remise, date_restitution, motif) VALUES",
+                operation_rows
+            )
+            tx.insert_rows(
+                "INSERT INTO incidents (operation_id, declarant_nom, telephone, email, poste, numero_serie_actif, "
+                "actifs_json, natures_json, autres_infos, signature_png) VALUES",
+                incident_rows
+            )
+            tx.insert_rows(
+                "INSERT INTO signatures (operation_id, type_signature, nom, fonction, date_signature, fichier_signature) VALUES",
+                signature_rows
+            )
+            index_operations(tx, search_entries)
+        done += count
+        elapsed = time.perf_counter() - started
+        print(f"  {done}/{operations} opérations ({done / elapsed:.0f}/s)")
+
+    rebuild_current_assignments()
+    recompute_stats()
+    print(f"Jeu de données créé en {time.perf_counter() - started:.1f}s")
+
+
+def purge(chunk_size):
+    """Supprimer toutes les lignes synthétiques (opérations d'abord, par lots)."""
+    # Employés synthétiques et ceux créés par les tests de charge dans les services Bench
+    employe_ids = _ids(
+        "SELECT e.id FROM employes e LEFT JOIN services s ON s.id = e.service_id "
+        "WHERE e.email LIKE %s OR s.nom LIKE %s",
+        (f"%{EMAIL_DOMAIN}", SERVICE_PATTERN)
+    )
+    materiel_ids = _ids("SELECT id FROM materiels WHERE numero_serie LIKE %s", (f"{SERIE_PREFIX}%",))
+    for column, ids in (('employe_id', employe_ids), ('materiel_id', materiel_ids)):
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            with db.transaction() as tx:
+                tx.execute(f"DELETE FROM operations WHERE {column} IN ({', '.join(['%s'] * len(chunk))})", chunk)
+                delete_archived(tx, column, chunk)
+    for table, ids in (('materiels', materiel_ids), ('employes', employe_ids)):
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            with db.transaction() as tx:
+                tx.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    with db.transaction() as tx:
+        tx.execute("DELETE FROM services WHERE nom LIKE %s", (SERVICE_PATTERN,))
+    invalidate_reference_caches()
+    rebuild_current_assignments()
+    recompute_stats()
+    print(f"Purge: {len(employe_ids)} employés, {len(materiel_ids)} matériels et leurs opérations supprimés")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Créer (ou purger) le jeu de données de mesure")
+    parser.add_argument('--operations', type=int, default=10000)
+    parser.add_argument('--employes', type=int, default=500)
+    parser.add_argument('--materiels', type=int, default=5000)
+    parser.add_argument('--services', type=int, default=12)
+    parser.add_argument('--signatures', type=int, default=50, help="Images de signature distinctes")
+    parser.add_argument('--signature-kb', type=int, default=12, help="Taille visée d'une signature PNG (Ko)")
+    parser.add_argument('--days', type=int, default=730, help="Étalement des opérations dans le passé (jours)")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42, help="Graine aléatoire (jeu de données reproductible)")
+    parser.add_argument('--purge', action='store_true', help="Supprimer le jeu de données synthétique")
+    args = parser.parse_args()
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    try:
+        if args.purge:
+            purge(args.chunk_size)
+        else:
+            seed(args.operations, args.employes, args.materiels, args.services, args.signatures,
+                 args.signature_kb, args.days, args.chunk_size, random.Random(args.seed))
+        data_version.bump()  # invalider les ETag de l'historique et des détails
+    finally:
+        db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Mesure de performance de l'API HTTP.
+
+Rejoue des scénarios (création d'attributions, restitutions et incidents,
+historique, détails) avec `--concurrency` clients simultanés, au choix via le
+client de test Flask (coût applicatif seul) et/ou via un vrai serveur WSGI
+(gunicorn, `--workers` processus). Pour chaque scénario: latences p50/p95/p99,
+débit, erreurs, allers-retours DB par requête (compteur `Questions` du serveur
+MySQL: utiliser une base locale dédiée) et pic de mémoire (RSS: processus de
+mesure en mode test-client, worker gunicorn le plus gourmand en mode wsgi).
+
+Les résultats peuvent être enregistrés comme référence (`--save-baseline`)
+puis comparés (`--baseline`): le code de sortie est 1 si un scénario régresse
+au-delà de `--tolerance`.
+
+La référence dépend de la machine et de la base: elle n'est pas versionnée.
+La produire sur la machine de mesure, depuis le commit de référence:
+    python -m bench.dataset --operations 100000 --seed 42
+    python -m bench.http_load --mode both --save-baseline bench/baseline.json
+puis comparer chaque changement avec les mêmes options et `--baseline bench/baseline.json`.
+
+Prérequis: dépendances de requirements.txt (dont gunicorn pour le mode wsgi
+et Pillow pour les signatures du jeu de données), jeu de données synthétique
+(python -m bench.dataset).
+
+Usage (depuis backend/):
+    python -m bench.http_load [--mode both] [--requests 200] [--concurrency 8] [--workers 4]
+                              [--scenarios historique,operation_details] [--save-baseline bench/baseline.json]
+                              [--baseline bench/baseline.json] [--tolerance 0.15]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import mysql.connector
+
+from config import Config
+from bench.dataset import SERIE_PREFIX, SERVICE_PATTERN, random_nom, signature_png, signature_data_url
+from bench.password_cost import percentile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- Transports -------------------------------------------------------------
+
+class TestClientTransport:
+    """Requêtes via le client de test Flask, dans ce processus."""
+
+    name = 'test-client'
+
+    def __init__(self):
+        from app import create_app
+        self.app = create_app()
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        data = response.get_data()
+        return response.status_code, data
+
+    def peak_rss_kb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def close(self):
+        pass
+
+
+class GunicornTransport:
+    """Requêtes HTTP (keep-alive, une connexion par thread client) vers gunicorn."""
+
+    name = 'wsgi'
+
+    def __init__(self, workers, threads):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+             '--bind', f"127.0.0.1:{self.port}", '--log-level', 'warning', 'app:create_app()'],
+            cwd=BACKEND_DIR
+        )
+        self._local = threading.local()
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                if self.request('GET', '/api/services')[0] == 200:
+                    return
+            except OSError:
+                self._local.conn = None
+            time.sleep(0.2)
+        self.close()
+        raise RuntimeError("Le serveur gunicorn n'a pas démarré")
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+            conn.close()
+            raise
+
+    def _worker_pids(self):
+        try:
+            with open(f"/proc/{self.process.pid}/task/{self.process.pid}/children") as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    def peak_rss_kb(self):
+        """Pic de mémoire (VmHWM) du processus worker le plus gourmand."""
+        peak = 0
+        for pid in self._worker_pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            peak = max(peak, int(line.split()[1]))
+            except OSError:
+                continue
+        return peak
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# --- Scénarios --------------------------------------------------------------
+
+class Scenarios:
+    """Requêtes de chaque scénario, construites à partir du jeu de données."""
+
+    def __init__(self, cursor, rng, signature_kb):
+        self.rng = rng
+        self.run_id = uuid.uuid4().hex[:8]
+        self._counter = 0
+        self._lock = threading.Lock()
+        self.signature = signature_data_url(signature_png(rng, signature_kb))
+
+        cursor.execute("SELECT nom FROM services WHERE nom LIKE %s", (SERVICE_PATTERN,))
+        self.services = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT nom FROM types_materiel")
+        self.types = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT m.numero_serie, e.nom, s.nom, tm.nom FROM materiel_current_assignment mca "
+            "JOIN materiels m ON m.id = mca.materiel_id JOIN types_materiel tm ON tm.id = m.type_id "
+            "JOIN employes e ON e.id = mca.employe_id "
+            "JOIN services s ON s.id = e.service_id WHERE m.numero_serie LIKE %s LIMIT 2000",
+            (f"{SERIE_PREFIX}%",)
+        )
+        self.attribues = cursor.fetchall()
+        cursor.execute(
+            "SELECT id FROM operations WHERE type_operation <> 'incident' ORDER BY id DESC LIMIT 2000"
+        )
+        self.operation_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT id FROM operations WHERE type_operation = 'incident' ORDER BY id DESC LIMIT 2000")
+        self.incident_ids = [row[0] for row in cursor.fetchall()]
+        if not (self.services and self.attribues and self.operation_ids and self.incident_ids):
+            raise RuntimeError("Jeu de données absent: lancer d'abord python -m bench.dataset")
+        self.next_cursor = None
+
+    def _next(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _signataires(self):
+        today = date.today().isoformat()
+        return {role: {'nom': random_nom(self.rng), 'fonction': 'IT', 'date': today}
+                for role in ('redaction', 'validation', 'destinataire')}
+
+    def attribution(self):
+        n = self._next()
+        today = date.today().isoformat()
+        body = {
+            'nom': random_nom(self.rng),
+            'service': self.rng.choice(self.services),
+            'materiels': [
+                {'type': self.rng.choice(self.types), 'modele': 'Bench', 'serie': f"{SERIE_PREFIX}L-{self.run_id}-{n}-{i}",
+                 'serviceAchat': 'Bench', 'dateRemise': today}
+                for i in range(self.rng.randint(1, 3))
+            ],
+            'signatures': {role: self.signature for role in ('redaction', 'validation', 'destinataire')},
+            **self._signataires(),
+        }
+        return 'POST', '/api/attribution', body
+
+    def restitution(self):
+        serie, nom, service, type_materiel = self.rng.choice(self.attribues)
+        body = {
+            'nom': nom,
+            'service': service,
+            'materiels': [{'type': type_materiel, 'modele': 'Bench', 'serie': serie,
+                           'dateRestitution': date.today().isoformat()}],
+            'signatures': {role: self.signature for role in ('redaction', 'validation', 'destinataire')},
+            **self._signataires(),
+        }
+        return 'POST', '/api/restitution', body
+
+    def incident(self):
+        body = {
+            'declarant_nom': random_nom(self.rng),
+            'telephone': '0600000000',
+            'service': self.rng.choice(self.services),
+            'date_incident': date.today().isoformat(),
+            'numero_serie_actif': self.rng.choice(self.attribues)[0],
+            'materiel_touche': 'ordinateur_portable',
+            'natures': ['mauvais_fonct_materiel'],
+            'autres_infos': 'Incident de mesure',
+            'signature_png': self.signature,
+        }
+        return 'POST', '/api/incidents', body
+
+    def historique(self):
+        return 'GET', '/api/historique?limit=100', None
+
+    def historique_page_suivante(self):
+        return 'GET', f"/api/historique?limit=100&cursor={self.next_cursor}", None
+
+    def historique_recherche(self):
+        nom = random_nom(self.rng).split()[-1]
+        return 'GET', f"/api/historique?limit=100&employe={nom[:5]}", None
+
+    def operation_details(self):
+        return 'GET', f"/api/operation/{self.rng.choice(self.operation_ids)}", None
+
+    def incident_details(self):
+        return 'GET', f"/api/incident/{self.rng.choice(self.incident_ids)}", None
+
+    def prepare(self, transport):
+        """Récupérer un curseur de deuxième page pour le scénario de pagination."""
+        status, data = transport.request('GET', '/api/historique?limit=100')
+        self.next_cursor = json.loads(data).get('next_cursor') if status == 200 else None
+
+
+SCENARIOS = ['historique', 'historique_page_suivante', 'historique_recherche', 'operation_details',
+             'incident_details', 'attribution', 'restitution', 'incident']
+
+
+# --- Mesure -----------------------------------------------------------------
+
+def server_questions(cursor):
+    cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+    return int(cursor.fetchall()[0][1])
+
+
+def run_scenario(transport, build, requests_count, concurrency, cursor):
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(_):
+        method, path, body = build()
+        started = time.perf_counter()
+        try:
+            status, _data = transport.request(method, path, body)
+        except Exception as e:
+            status = str(e)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not isinstance(status, int) or status >= 400:
+                errors.append(status)
+
+    questions_before = server_questions(cursor)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_count)))
+    duration = time.perf_counter() - started
+    # La lecture du compteur compte elle-même pour une question
+    questions = server_questions(cursor) - questions_before - 1
+
+    return {
+        'requests': requests_count,
+        'errors': len(errors),
+        'error_samples': [str(e) for e in errors[:3]],
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'throughput_rps': round(requests_count / duration, 1),
+        'db_round_trips': round(questions / requests_count, 2),
+        'peak_rss_mb': round(transport.peak_rss_kb() / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lister les régressions par rapport à la référence (p95, débit, allers-retours DB)."""
+    regressions = []
+    for mode, scenarios in results.items():
+        for name, current in scenarios.items():
+            reference = baseline.get(mode, {}).get(name)
+            if not reference:
+                continue
+            checks = [
+                ('p95_ms', current['p95_ms'] > reference['p95_ms'] * (1 + tolerance)),
+                ('throughput_rps', current['throughput_rps'] < reference['throughput_rps'] * (1 - tolerance)),
+                ('db_round_trips', current['db_round_trips'] > reference['db_round_trips'] + 0.5),
+            ]
+            for metric, regressed in checks:
+                if regressed:
+                    regressions.append((mode, name, metric, reference[metric], current[metric]))
+    return regressions
+
+
+def print_results(mode, scenarios, baseline):
+    print(f"\n=== {mode} ===")
+    print(f"{'scénario':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>8} {'DB/req':>7} {'RSS Mo':>7} {'err':>4}")
+    for name, r in scenarios.items():
+        line = (f"{name:<26} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+                f"{r['throughput_rps']:>8.1f} {r['db_round_trips']:>7.2f} {r['peak_rss_mb']:>7.1f} {r['errors']:>4}")
+        reference = (baseline or {}).get(mode, {}).get(name)
+        if reference:
+            delta = (r['p95_ms'] - reference['p95_ms']) / reference['p95_ms'] * 100 if reference['p95_ms'] else 0
+            line += f"   p95 {delta:+.0f}% vs référence"
+        print(line)
+        for sample in r['error_samples']:
+            print(f"    erreur: {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesurer les performances de l'API HTTP")
+    parser.add_argument('--mode', choices=['test-client', 'wsgi', 'both'], default='both')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Liste séparée par des virgules")
+    parser.add_argument('--requests', type=int, default=200, help="Requêtes par scénario")
+    parser.add_argument('--concurrency', type=int, default=8, help="Clients simultanés")
+    parser.add_argument('--workers', type=int, default=4, help="Processus gunicorn (mode wsgi)")
+    parser.add_argument('--threads', type=int, default=4, help="Threads par processus gunicorn (mode wsgi)")
+    parser.add_argument('--signature-kb', type=int, default=12, help="Taille des signatures envoyées (Ko)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', help="Fichier de référence à comparer")
+    parser.add_argument('--save-baseline', help="Enregistrer les résultats comme référence")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Dégradation tolérée (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Scénarios inconnus: {', '.join(unknown)}")
+
+    connection = mysql.connector.connect(
+        host=Config.DB_HOST, user=Config.DB_USER, password=Config.DB_PASSWORD,
+        database=Config.DB_NAME, port=Config.DB_PORT, autocommit=True
+    )
+    cursor = connection.cursor()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    modes = ['test-client', 'wsgi'] if args.mode == 'both' else [args.mode]
+    results = {}
+    try:
+        scenarios = Scenarios(cursor, random.Random(args.seed), args.signature_kb)
+        for mode in modes:
+            transport = (
+                TestClientTransport() if mode == 'test-client' else GunicornTransport(args.workers, args.threads)
+            )
+            try:
+                scenarios.prepare(transport)
+                results[mode] = {}
+                for name in names:
+                    if name == 'historique_page_suivante' and not scenarios.next_cursor:
+                        continue
+                    # Échauffement (connexions du pool, caches de référence)
+                    for _ in range(min(args.concurrency, args.requests)):
+                        transport.request(*getattr(scenarios, name)())
+                    results[mode][name] = run_scenario(
+                        transport, getattr(scenarios, name), args.requests, args.concurrency, cursor
+                    )
+            finally:
+                transport.close()
+            print_results(mode, results[mode], baseline)
+    finally:
+        cursor.close()
+        connection.close()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nRéférence enregistrée dans {args.save_baseline}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        for mode, name, metric, before, after in regressions:
+            print(f"RÉGRESSION {mode}/{name}: {metric} {before} -> {after}")
+        if regressions:
+            sys.exit(1)
+        print("\nAucune régression par rapport à la référence")
+
+
+if __name__ == '__main__':
+    main()
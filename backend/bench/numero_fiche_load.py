@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test de charge de l'allocation des numéros de fiche.
+
+Lance N clients parallèles qui soumettent chacun une attribution via
+/api/attribution, puis vérifie en base que chaque soumission a reçu un
+numéro de fiche distinct. Sort en erreur (code 1) au moindre doublon.
+
+Usage (depuis backend/): python -m bench.numero_fiche_load [--clients 50] [--service Informatique]
+"""
+
+import argparse
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import date
+
+from app import create_app
+from database.database import db
+
+
+def build_payload(service, run_id, index):
+    today = date.today().isoformat()
+    signataire = {'nom': 'Test charge', 'fonction': 'IT', 'date': today}
+    return {
+        'nom': f"Charge {run_id} {index:03d}",
+        'service': service,
+        'materiels': [{
+            'type': 'accessoires',
+            'modele': 'Souris test',
+            'serie': f"LOAD-{run_id}-{index:03d}",
+            'dateRemise': today,
+        }],
+        'redaction': signataire,
+        'validation': signataire,
+        'destinataire': signataire,
+        'signatures': {'redaction': None, 'validation': None, 'destinataire': None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérifier l'unicité des numéros de fiche sous concurrence")
+    parser.add_argument('--clients', type=int, default=50, help="Nombre de soumissions parallèles")
+    parser.add_argument('--service', default='Informatique', help="Service existant utilisé pour les fiches")
+    args = parser.parse_args()
+
+    app = create_app()
+    run_id = uuid.uuid4().hex[:8]
+    barrier = threading.Barrier(args.clients)
+    results = [None] * args.clients
+
+    def client(index):
+        test_client = app.test_client()
+        payload = build_payload(args.service, run_id, index)
+        barrier.wait()
+        response = test_client.post('/api/attribution', json=payload)
+        results[index] = (response.status_code, response.get_json() or {})
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    failures = [r for r in results if r[0] != 200 or not r[1].get('success')]
+    numeros = [r[1]['numero_fiche'] for r in results if r[0] == 200 and r[1].get('success')]
+    duplicates = {n: c for n, c in Counter(numeros).items() if c > 1}
+
+    # Contrôle en base: une fiche par soumission de ce run
+    rows = db.execute_query(
+        "SELECT o.numero_fiche, COUNT(DISTINCT o.employe_id) AS employes "
+        "FROM operations o JOIN materiels m ON m.id = o.materiel_id "
+        "WHERE m.numero_serie LIKE %s GROUP BY o.numero_fiche",
+        (f"LOAD-{run_id}-%",)
+    ) or []
+    db.disconnect()
+    shared = [r['numero_fiche'] for r in rows if r['employes'] > 1]
+
+    print(f"{args.clients} soumissions en {elapsed:.2f}s ({args.clients / elapsed:.1f}/s)")
+    print(f"Succès: {len(numeros)}, échecs: {len(failures)}, numéros distincts: {len(set(numeros))}")
+    for status, body in failures[:5]:
+        print(f"  échec HTTP {status}: {body.get('error')}")
+    if duplicates or shared:
+        print(f"DOUBLONS détectés: {duplicates or shared}")
+        sys.exit(1)
+    if failures:
+        sys.exit(1)
+    print("Aucun doublon de numéro de fiche")
+
+
+if __name__ == '__main__':
+    main()
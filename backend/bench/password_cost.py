@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Mesure du coût du hachage des mots de passe face au budget de latence de connexion.
+
+Pour chaque méthode candidate, mesure la vérification d'un mot de passe seul
+puis sous `--concurrency` connexions simultanées passant par le pool KDF
+(comme la route /login). Sort en erreur si la méthode configurée
+(PASSWORD_HASH_METHOD) dépasse PASSWORD_LOGIN_BUDGET_MS au p95.
+
+Usage (depuis backend/): python -m bench.password_cost [--samples 20] [--concurrency 2] [--method scrypt:16384:8:1 ...]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from app.passwords import hash_password, verify_password, verify_password_bounded
+
+DEFAULT_CANDIDATES = ['scrypt:16384:8:1', 'scrypt:32768:8:1', 'scrypt:65536:8:1', 'pbkdf2:sha256:600000']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(method, samples, concurrency):
+    stored = hash_password('mot-de-passe-de-test', method=method)
+
+    single = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        verify_password('mot-de-passe-de-test', stored)
+        single.append((time.perf_counter() - started) * 1000)
+
+    def login():
+        started = time.perf_counter()
+        verify_password_bounded('mot-de-passe-de-test', stored)
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        loaded = list(clients.map(lambda _: login(), range(samples * concurrency)))
+    return single, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût du KDF des mots de passe vs budget de connexion")
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=2, help="Connexions simultanées simulées")
+    parser.add_argument('--method', action='append', help="Méthode werkzeug à mesurer (répétable)")
+    args = parser.parse_args()
+
+    methods = args.method or DEFAULT_CANDIDATES
+    if Config.PASSWORD_HASH_METHOD not in methods:
+        methods.append(Config.PASSWORD_HASH_METHOD)
+    budget = Config.PASSWORD_LOGIN_BUDGET_MS
+
+    print(f"Budget de connexion: {budget:.0f} ms (p95), pool KDF: {Config.PASSWORD_KDF_WORKERS} threads, "
+          f"{args.concurrency} connexions simultanées")
+    print(f"{'méthode':<24}{'seul p50':>10}{'seul p95':>10}{'charge p50':>12}{'charge p95':>12}")
+    configured_p95 = None
+    for method in methods:
+        single, loaded = measure(method, args.samples, args.concurrency)
+        loaded_p95 = percentile(loaded, 95)
+        marker = ' *' if method == Config.PASSWORD_HASH_METHOD else ''
+        print(f"{method:<24}{statistics.median(single):>9.1f} {percentile(single, 95):>9.1f} "
+              f"{statistics.median(loaded):>11.1f} {loaded_p95:>11.1f}{marker}")
+        if method == Config.PASSWORD_HASH_METHOD:
+            configured_p95 = loaded_p95
+
+    if configured_p95 > budget:
+        print(f"La méthode configurée dépasse le budget ({configured_p95:.1f} ms > {budget:.0f} ms)")
+        sys.exit(1)
+    print(f"La méthode configurée tient dans le budget ({configured_p95:.1f} ms <= {budget:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
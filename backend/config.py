@@ -13,11 +13,91 @@ class Config:
         DB_PASSWORD = ''
     DB_NAME = os.getenv('DB_NAME', 'materiel_it_db')
     DB_PORT = int(os.getenv('DB_PORT', 3306))
+
+    # Pool de connexions (une connexion empruntée par requête)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))  # secondes d'attente max
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # durée de vie max d'une connexion (s)
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 30))  # ping si inactive depuis (s)
+
+    # Instrumentation des requêtes SQL
+    DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))  # journaliser au-delà (ms)
+    DB_N_PLUS_ONE_THRESHOLD = int(os.getenv('DB_N_PLUS_ONE_THRESHOLD', 10))  # même SELECT répété par requête HTTP
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # jeton Bearer du collecteur Prometheus (sinon session admin)
     
     # Configuration Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
     DEBUG = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
     
+    # Hachage des mots de passe (format werkzeug: 'scrypt:N:r:p' ou 'pbkdf2:sha256:iterations')
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:16384:8:1')
+    PASSWORD_KDF_WORKERS = int(os.getenv('PASSWORD_KDF_WORKERS', 2))  # calculs simultanés par processus
+    PASSWORD_KDF_TIMEOUT = float(os.getenv('PASSWORD_KDF_TIMEOUT', 10))  # secondes
+    PASSWORD_LOGIN_BUDGET_MS = float(os.getenv('PASSWORD_LOGIN_BUDGET_MS', 250))
+
+    # Historique: pagination par curseur (keyset)
+    HISTORIQUE_PAGE_SIZE = int(os.getenv('HISTORIQUE_PAGE_SIZE', 100))
+    HISTORIQUE_MAX_PAGE_SIZE = int(os.getenv('HISTORIQUE_MAX_PAGE_SIZE', 500))
+    HISTORIQUE_STREAM_BATCH = int(os.getenv('HISTORIQUE_STREAM_BATCH', 1000))
+    # Archivage (archive_operations.py): opérations de plus de N mois déplacées dans les archives
+    ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', 24))
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 1000))
+
+    # Cache mémoire des tables de référence (services, types de matériel)
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))  # secondes
+
+    # Stockage sur disque (signatures, PDF, exports, tâches)
+    STORAGE_DIR = os.getenv('STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage'))
+
+    # Magasin de signatures PNG adressé par contenu (SHA-256)
+    SIGNATURE_STORE_DIR = os.getenv('SIGNATURE_STORE_DIR', os.path.join(STORAGE_DIR, 'signatures'))
+    # Normalisation à l'enregistrement (rognage, niveaux de gris, PNG à palette)
+    SIGNATURE_GRAY_LEVELS = int(os.getenv('SIGNATURE_GRAY_LEVELS', 4))  # 2 = noir et blanc (1 bit)
+    SIGNATURE_WORKERS = int(os.getenv('SIGNATURE_WORKERS', 2))  # conversions simultanées par processus
+    SIGNATURE_TIMEOUT = float(os.getenv('SIGNATURE_TIMEOUT', 10))  # secondes
+    SIGNATURE_MAX_BYTES = int(os.getenv('SIGNATURE_MAX_BYTES', 512 * 1024))  # data URL reçue
+
+    # Clés d'idempotence des formulaires (en-tête Idempotency-Key)
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 86400))  # conservation d'une réponse (s)
+    IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 30))  # attente d'un doublon en cours (s)
+    IDEMPOTENCY_SWEEP_INTERVAL = int(os.getenv('IDEMPOTENCY_SWEEP_INTERVAL', 300))  # nettoyage des clés expirées (s)
+
+    # Validation des fiches (app.schemas)
+    FICHE_MAX_MATERIELS = int(os.getenv('FICHE_MAX_MATERIELS', 50))  # matériels par fiche
+
+    # Fiches PDF rendues côté serveur, exports ZIP et état des tâches d'arrière-plan
+    PDF_CACHE_DIR = os.path.join(STORAGE_DIR, 'pdf')
+    EXPORTS_DIR = os.path.join(STORAGE_DIR, 'exports')
+    JOBS_DIR = os.path.join(STORAGE_DIR, 'jobs')
+    PDF_EXPORT_WORKERS = int(os.getenv('PDF_EXPORT_WORKERS', 4))
+    EXPORT_RETENTION = int(os.getenv('EXPORT_RETENTION', 86400))  # exports ZIP et tâches terminées (s)
+
+    # Serveur WSGI de production (serve.py / gunicorn)
+    SERVER_BIND = os.getenv('SERVER_BIND', '0.0.0.0:5000')
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', (os.cpu_count() or 1) * 2 + 1))  # processus
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 4))  # threads par processus (<= DB_POOL_SIZE)
+    SERVER_TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 60))  # worker bloqué au-delà: redémarré (s)
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))  # fin des requêtes en cours (s)
+    SERVER_KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))  # connexions HTTP persistantes (s)
+    SERVER_MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 5000))  # recyclage des workers (0 = jamais)
+    SERVER_MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 500))
+    SERVER_PIDFILE = os.getenv('SERVER_PIDFILE', os.path.join(STORAGE_DIR, 'gunicorn.pid'))
+    SERVER_ACCESS_LOG = os.getenv('SERVER_ACCESS_LOG', '-')  # '-' = sortie standard, '' = désactivé
+
+    # Cache HTTP et compression des réponses
+    DATA_VERSION_FILE = os.path.join(STORAGE_DIR, 'data_version')  # version des données (ETag), partagée entre workers
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # octets: en dessous, réponse non compressée
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))  # gzip 1-9
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))  # brotli 0-11 (si installé)
+    COMPRESS_STREAM_FLUSH = int(os.getenv('COMPRESS_STREAM_FLUSH', 16384))  # flux: vidage tous les N octets lus
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 3600))  # fichiers statiques versionnés (?v=)
+
+    # Import par lots de fiches (/api/attributions/batch)
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 20000))  # fiches par lot
+    BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', 200))  # fiches par transaction
+    BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 1))  # lots écrits simultanément par processus
+
     # Configuration uploads
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
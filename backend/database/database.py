@@ -2,103 +2,507 @@ import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
 import os
+import re
+import time
+import threading
 import logging
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+
+from config import Config
 
 # Charger .env
 load_dotenv()
 
+
+class PoolTimeoutError(Error):
+    """Levée quand aucune connexion ne se libère avant DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """Pool de connexions MySQL thread-safe.
+
+    Chaque connexion n'est prêtée qu'à un seul thread à la fois. Les connexions
+    inactives sont réutilisées (LIFO), vérifiées par un ping si elles sont restées
+    inactives plus de `ping_interval` secondes et recyclées au-delà de `recycle`
+    secondes d'existence.
+    """
+
+    def __init__(self, size=10, timeout=10.0, recycle=1800, pre_ping=True, ping_interval=30.0, **connect_kwargs):
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self.recycle = int(recycle)
+        self.pre_ping = pre_ping
+        self.ping_interval = float(ping_interval)
+        self.connect_kwargs = connect_kwargs
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(connection, created_at, released_at)]
+        self._created_at = {}    # id(connection) -> created_at
+        self._total = 0          # connexions ouvertes (prêtées + inactives)
+        self._metrics = {
+            'checkouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total_ms': 0.0,
+        }
+
+    def _incr(self, name, value=1):
+        with self._cond:
+            self._metrics[name] += value
+
+    def _new_connection(self):
+        connection = mysql.connector.connect(**self.connect_kwargs)
+        connection.autocommit = True
+        self._incr('connections_created')
+        return connection
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _is_usable(self, connection, created_at, released_at):
+        now = time.monotonic()
+        if self.recycle > 0 and now - created_at > self.recycle:
+            self._incr('connections_recycled')
+            return False
+        if self.pre_ping and now - released_at >= self.ping_interval:
+            try:
+                connection.ping(reconnect=False)
+            except Exception:
+                self._incr('ping_failures')
+                return False
+        return True
+
+    def acquire(self):
+        """Emprunter une connexion, en attendant au plus `timeout` secondes."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        candidate = None
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._incr('timeouts')
+                    raise PoolTimeoutError(
+                        msg=f"Aucune connexion MySQL disponible après {self.timeout:.1f}s (pool de {self.size})"
+                    )
+                if not waited:
+                    waited = True
+                    self._incr('waits')
+                self._cond.wait(remaining)
+            if self._idle:
+                candidate = self._idle.pop()
+            else:
+                self._total += 1
+            self._incr('checkouts')
+
+        if waited:
+            self._incr('wait_time_total_ms', (time.monotonic() - started) * 1000)
+
+        # Vérifications et ouverture hors verrou: un ping ou un handshake
+        # ne doit pas bloquer les autres threads
+        if candidate is not None:
+            connection, created_at, released_at = candidate
+            if self._is_usable(connection, created_at, released_at):
+                return connection
+            self._close_quietly(connection)
+            self._created_at.pop(id(connection), None)
+        try:
+            connection = self._new_connection()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def release(self, connection, discard=False):
+        """Rendre une connexion au pool (ou la fermer si `discard`)."""
+        if connection is None:
+            return
+        created_at = self._created_at.get(id(connection), time.monotonic())
+        if not discard:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard:
+                self._total -= 1
+                self._created_at.pop(id(connection), None)
+            else:
+                self._idle.append((connection, created_at, time.monotonic()))
+            self._cond.notify()
+        if discard:
+            self._close_quietly(connection)
+
+    def close_all(self):
+        """Fermer toutes les connexions inactives."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for connection, _, _ in idle:
+            self._created_at.pop(id(connection), None)
+            self._close_quietly(connection)
+
+    def stats(self):
+        """Métriques du pool (taille, occupation, attentes, recyclages...)."""
+        with self._cond:
+            idle = len(self._idle)
+            total = self._total
+        return {
+            'size': self.size,
+            'open': total,
+            'idle': idle,
+            'in_use': total - idle,
+            **self._metrics,
+        }
+
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST_RE = re.compile(r'\(\s*(?:\?|NULL|TRUE|FALSE)(?:\s*,\s*(?:\?|NULL|TRUE|FALSE))*\s*\)', re.I)
+_ROWS_RE = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(query):
+    """Forme normalisée d'une requête: valeurs remplacées par ?, listes IN et
+    lignes VALUES réduites à (...). Deux appels du même code ont la même empreinte."""
+    text = _COMMENT_RE.sub(' ', query)
+    text = _STRING_RE.sub('?', text)
+    text = text.replace('%s', '?')
+    text = _NUMBER_RE.sub('?', text)
+    text = ' '.join(text.split())
+    text = _LIST_RE.sub('(...)', text)
+    return _ROWS_RE.sub('(...)', text)
+
+
+class QueryLog:
+    """Requêtes SQL exécutées pour une requête HTTP (voir `Database.begin_query_log`)."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.count = 0
+        self.duration_ms = 0.0
+        self.by_fingerprint = Counter()
+
+    def add(self, query_fingerprint, duration_ms):
+        self.count += 1
+        self.duration_ms += duration_ms
+        self.by_fingerprint[query_fingerprint] += 1
+
+
+class Transaction:
+    """Curseur d'une transaction explicite (voir `Database.transaction`).
+
+    Contrairement à `Database.execute_query`, les erreurs sont propagées afin que
+    la transaction entière soit annulée.
+    """
+
+    def __init__(self, cursor, record=None):
+        self.cursor = cursor
+        self._record = record
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def execute(self, query, params=None):
+        """Exécuter une requête et retourner le nombre de lignes affectées."""
+        started = time.perf_counter()
+        self.cursor.execute(query, params or ())
+        if self._record:
+            self._record(query, started, self.cursor.rowcount)
+        return self.cursor.rowcount
+
+    def fetchall(self, query, params=None):
+        """Exécuter un SELECT et retourner toutes les lignes."""
+        started = time.perf_counter()
+        self.cursor.execute(query, params or ())
+        rows = self.cursor.fetchall()
+        if self._record:
+            self._record(query, started, len(rows))
+        return rows
+
+    def insert_rows(self, query, rows, template=None, suffix=''):
+        """INSERT multi-lignes en un seul aller-retour.
+
+        `query` se termine par VALUES; `template` (par défaut "(%s, %s, ...)")
+        est répété pour chaque ligne de `rows`. `suffix` est ajouté après les
+        valeurs (ex: ON DUPLICATE KEY UPDATE ...).
+        """
+        if not rows:
+            return 0
+        template = template or '(' + ', '.join(['%s'] * len(rows[0])) + ')'
+        sql = f"{query} {', '.join([template] * len(rows))} {suffix}"
+        return self.execute(sql, [value for row in rows for value in row])
+
+
 class Database:
+    """Accès MySQL par thread.
+
+    Chaque thread (donc chaque requête Flask) emprunte sa propre connexion au pool
+    lors de la première requête SQL et la rend dans `disconnect()`, appelé en fin
+    de requête par `teardown_appcontext`. Le curseur et `lastrowid` ne sont donc
+    jamais partagés entre requêtes concurrentes.
+    """
+
     def __init__(self):
-        self.connection = None
-        self.cursor = None
-        
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Observateurs appelés après chaque requête SQL:
+        # fn(empreinte, durée_ms, lignes, endpoint)
+        self.query_listeners = []
+
+    @property
+    def connection(self):
+        return getattr(self._local, 'connection', None)
+
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    @property
+    def pool(self):
+        """Pool du processus courant (recréé après un fork)."""
+        pool = self._pool
+        if pool is None or pool.pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool.pid != os.getpid():
+                    self._pool = ConnectionPool(
+                        size=Config.DB_POOL_SIZE,
+                        timeout=Config.DB_POOL_TIMEOUT,
+                        recycle=Config.DB_POOL_RECYCLE,
+                        pre_ping=Config.DB_POOL_PRE_PING,
+                        ping_interval=Config.DB_POOL_PING_INTERVAL,
+                        host=Config.DB_HOST,
+                        user=Config.DB_USER,
+                        password=Config.DB_PASSWORD,
+                        database=Config.DB_NAME,
+                        port=Config.DB_PORT,
+                        charset='utf8mb4'
+                    )
+                pool = self._pool
+        return pool
+
+    def begin_query_log(self, endpoint):
+        """Commencer à comptabiliser les requêtes SQL du thread courant."""
+        self._local.query_log = QueryLog(endpoint)
+        return self._local.query_log
+
+    def end_query_log(self):
+        """Arrêter la comptabilisation et retourner le QueryLog (ou None)."""
+        log = getattr(self._local, 'query_log', None)
+        self._local.query_log = None
+        return log
+
+    @property
+    def query_log(self):
+        return getattr(self._local, 'query_log', None)
+
+    def _record(self, query, started, rows):
+        """Enregistrer une requête exécutée: journal de la requête HTTP,
+        requêtes lentes et observateurs (métriques)."""
+        duration_ms = (time.perf_counter() - started) * 1000
+        query_fingerprint = fingerprint(query)
+        log = self.query_log
+        endpoint = log.endpoint if log else None
+        if log is not None:
+            log.add(query_fingerprint, duration_ms)
+        if duration_ms >= Config.DB_SLOW_QUERY_MS:
+            logging.warning(
+                f"Requête lente ({duration_ms:.0f} ms, {rows} lignes, {endpoint or 'hors requête'}): {query_fingerprint}"
+            )
+        for listener in self.query_listeners:
+            try:
+                listener(query_fingerprint, duration_ms, rows, endpoint)
+            except Exception as e:
+                logging.error(f"Erreur d'instrumentation SQL: {e}")
+
+    def _after_fork(self):
+        """Dans le processus enfant: oublier les connexions héritées du parent.
+
+        Elles ne sont pas fermées (le socket est partagé avec le parent, un
+        COM_QUIT couperait sa connexion); le pool est recréé à la première requête.
+        """
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def pool_stats(self):
+        """Métriques du pool de connexions du processus courant."""
+        return self.pool.stats()
+
     def connect(self):
-        """Établir la connexion à la base de données MySQL"""
+        """Emprunter une connexion au pool pour le thread courant"""
+        if self.connection is not None:
+            return True
         try:
-            # Normaliser le mot de passe si valeur d'exemple
-            raw_password = os.getenv("DB_PASSWORD", "")
-            if raw_password in ("votre_mot_de_passe_mysql", "your_mysql_password", "votre-mot-de-passe", "changeme"):
-                raw_password = ""
-
-            self.connection = mysql.connector.connect(
-                host=os.getenv("DB_HOST"),
-                user=os.getenv("DB_USER"),
-                password=raw_password,
-                database=os.getenv("DB_NAME"),
-                port=int(os.getenv("DB_PORT", 3306)),
-                charset='utf8mb4'
-            )
-            
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor(dictionary=True)
-                logging.info("Connexion à MySQL réussie")
-                return True
-                
+            connection = self.pool.acquire()
+            self._local.connection = connection
+            self._local.cursor = connection.cursor(dictionary=True)
+            return True
         except Error as e:
             logging.error(f"Erreur de connexion à MySQL: {e}")
+            self._local.connection = None
+            self._local.cursor = None
             return False
-    
-    def disconnect(self):
-        """Fermer la connexion à la base de données"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logging.info("Connexion MySQL fermée")
-        self.connection = None
-        self.cursor = None
-    
+
+    def disconnect(self, discard=False):
+        """Rendre la connexion du thread courant au pool"""
+        connection, cursor = self.connection, self.cursor
+        self._local.connection = None
+        self._local.cursor = None
+        if cursor:
+            try:
+                cursor.close()
+            except Exception:
+                discard = True
+        if connection is not None:
+            try:
+                broken = not connection.is_connected()
+            except Exception:
+                broken = True
+            self.pool.release(connection, discard=discard or broken)
+
     def execute_query(self, query, params=None):
         """Exécuter une requête SQL"""
         try:
-            if not self.connection or not self.connection.is_connected():
+            if not self.connection:
                 self.connect()
             if not self.cursor:
                 logging.error("Curseur MySQL indisponible (connexion échouée)")
                 return None
-            
+
+            started = time.perf_counter()
             self.cursor.execute(query, params or ())
-            
+
             if query.strip().upper().startswith('SELECT'):
-                return self.cursor.fetchall()
+                rows = self.cursor.fetchall()
+                self._record(query, started, len(rows))
+                return rows
             else:
                 self.connection.commit()
+                self._record(query, started, self.cursor.rowcount)
                 return self.cursor.rowcount
-                
+
         except Exception as e:
             logging.error(f"Erreur d'exécution de requête: {e}")
-            try:
-                if self.connection and self.connection.is_connected():
-                    self.connection.rollback()
-            except Exception:
-                pass
+            self._recover()
             return None
-    
+
     def execute_many(self, query, params_list):
         """Exécuter plusieurs requêtes SQL"""
         try:
-            if not self.connection or not self.connection.is_connected():
+            if not self.connection:
                 self.connect()
             if not self.cursor:
                 logging.error("Curseur MySQL indisponible (connexion échouée)")
                 return None
-            
+
+            started = time.perf_counter()
             self.cursor.executemany(query, params_list)
             self.connection.commit()
+            self._record(query, started, self.cursor.rowcount)
             return self.cursor.rowcount
-            
+
         except Exception as e:
             logging.error(f"Erreur d'exécution multiple: {e}")
+            self._recover()
+            return None
+
+    @contextmanager
+    def transaction(self):
+        """Unité de travail: les requêtes du bloc sont validées ensemble ou annulées.
+
+        Utilise la connexion du thread courant::
+
+            with db.transaction() as tx:
+                tx.execute(...)
+        """
+        if not self.connection and not self.connect():
+            raise Error(msg="Connexion MySQL indisponible")
+        connection = self.connection
+        connection.start_transaction()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            yield Transaction(cursor, record=self._record)
+            connection.commit()
+        except Exception:
+            try:
+                connection.rollback()
+            except Exception:
+                self.disconnect(discard=True)
+            raise
+        finally:
             try:
-                if self.connection and self.connection.is_connected():
-                    self.connection.rollback()
+                cursor.close()
             except Exception:
                 pass
-            return None
-    
+
+    def iter_query(self, query, params=None, batch_size=1000):
+        """Itérer sur un SELECT volumineux sans le charger en mémoire.
+
+        Utilise une connexion dédiée empruntée au pool et un curseur non bufferisé
+        lu par lots de `batch_size` lignes. La connexion est rendue à la fin de
+        l'itération; si l'itération est interrompue (client déconnecté), elle est
+        fermée car des lignes non lues y restent en attente.
+        """
+        connection = self.pool.acquire()
+        cursor = None
+        exhausted = False
+        try:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            started = time.perf_counter()
+            cursor.execute(query, params or ())
+            rows = cursor.fetchmany(batch_size)
+            # Durée mesurée jusqu'au premier lot: la suite dépend du rythme du client
+            self._record(query, started, len(rows))
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany(batch_size)
+            exhausted = True
+        finally:
+            if cursor is not None and exhausted:
+                try:
+                    cursor.close()
+                except Exception:
+                    exhausted = False
+            self.pool.release(connection, discard=not exhausted)
+
+    def _recover(self):
+        """Annuler la transaction en cours, ou rendre une connexion cassée."""
+        try:
+            if self.connection and self.connection.is_connected():
+                self.connection.rollback()
+                return
+        except Exception:
+            pass
+        self.disconnect(discard=True)
+
     def get_last_insert_id(self):
         """Obtenir l'ID de la dernière insertion"""
         return self.cursor.lastrowid if self.cursor else None
 
 # Instance globale de la base de données
 db = Database()
+
+# Workers gunicorn (preload) et pools de processus: un pool de connexions par processus
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=db._after_fork)
@@ -0,0 +1,327 @@
+import os
+
+from mysql.connector import Error
+
+# Migrations versionnées du schéma.
+#
+# Chaque migration est (version, description, étapes). Une étape est une
+# fonction recevant le curseur; elle doit être idempotente car MySQL valide
+# implicitement chaque DDL: si une migration échoue à mi-parcours, elle est
+# rejouée entièrement au lancement suivant. La version n'est enregistrée dans
+# `schema_version` qu'une fois toutes ses étapes passées.
+#
+# Ne jamais modifier une migration publiée: en ajouter une nouvelle.
+
+# Colonnes propres aux incidents, déplacées de `operations` vers `incidents` (migration 5)
+INCIDENT_COLUMNS = [
+    'declarant_nom', 'telephone', 'email', 'poste', 'numero_serie_actif',
+    'actifs_json', 'natures_json', 'autres_infos', 'signature_png',
+]
+
+# Tables de l'historique doublées d'une table d'archive (migration 6, voir app.archive)
+ARCHIVED_TABLES = ['operations', 'incidents', 'signatures', 'operation_search', 'operation_search_trigrams']
+
+BASE_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables.sql')
+MIGRATION_LOCK = 'materiel_app_schema_migrations'
+
+
+def split_sql(text):
+    """Découper un script SQL en instructions.
+
+    Les commentaires `--` sont retirés et les `;` situés dans une chaîne
+    (y compris avec des apostrophes échappées: 'l\\'entreprise') ne coupent pas.
+    """
+    statements, current = [], []
+    i, quote = 0, None
+    while i < len(text):
+        c = text[i]
+        if quote:
+            current.append(c)
+            if c == '\\' and i + 1 < len(text):
+                current.append(text[i + 1])
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in ("'", '"', '`'):
+            quote = c
+            current.append(c)
+        elif c == '-' and text.startswith('--', i):
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end
+            continue
+        elif c == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(c)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def index_exists(cursor, table, name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, name)
+    )
+    return bool(cursor.fetchall())
+
+
+def run_sql_file(path):
+    """Étape: exécuter un fichier SQL dont toutes les instructions sont idempotentes."""
+    def step(cursor):
+        with open(path, 'r', encoding='utf-8') as f:
+            for statement in split_sql(f.read()):
+                cursor.execute(statement)
+    step.description = f"exécution de {os.path.basename(path)}"
+    return step
+
+
+def create_index(table, name, columns):
+    """Étape: créer un index en ligne (les écritures continuent pendant la construction)."""
+    def step(cursor):
+        if index_exists(cursor, table, name):
+            return
+        cursor.execute(
+            f"ALTER TABLE {table} ADD INDEX {name} ({', '.join(columns)}), ALGORITHM=INPLACE, LOCK=NONE"
+        )
+    step.description = f"index {name} sur {table}({', '.join(columns)})"
+    return step
+
+
+def drop_index(table, name):
+    """Étape: supprimer un index s'il existe (opération en ligne)."""
+    def step(cursor):
+        if not index_exists(cursor, table, name):
+            return
+        cursor.execute(f"ALTER TABLE {table} DROP INDEX {name}, ALGORITHM=INPLACE, LOCK=NONE")
+    step.description = f"suppression de l'index {name} sur {table}"
+    return step
+
+
+def column_type(cursor, table, column):
+    """Type SQL complet d'une colonne (ex: 'varchar(80)'), ou None si elle n'existe pas."""
+    cursor.execute(
+        "SELECT COLUMN_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    rows = cursor.fetchall()
+    return rows[0][0] if rows else None
+
+
+def move_columns(source, target, key, columns, where='1=1', batch_size=5000):
+    """Étape: copier des colonnes de `source` vers la table 1:1 `target`
+    (clé `key` = source.id) par tranches d'identifiants, avec un COMMIT entre
+    deux tranches pour ne verrouiller que quelques milliers de lignes à la fois.
+    Ignorée si les colonnes ont déjà été supprimées de `source`."""
+    def step(cursor):
+        if column_type(cursor, source, columns[0]) is None:
+            return
+        # Conserver le type d'origine (ex: signatures pas encore migrées en LONGTEXT)
+        for column in columns:
+            source_type, target_type = column_type(cursor, source, column), column_type(cursor, target, column)
+            if target_type is not None and source_type != target_type:
+                cursor.execute(f"ALTER TABLE {target} MODIFY {column} {source_type} NULL")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source}")
+        max_id = cursor.fetchall()[0][0]
+        column_list = ', '.join(columns)
+        for start in range(0, max_id, batch_size):
+            cursor.execute(
+                f"INSERT IGNORE INTO {target} ({key}, {column_list}) "
+                f"SELECT id, {column_list} FROM {source} WHERE id > %s AND id <= %s AND {where}",
+                (start, min(start + batch_size, max_id))
+            )
+            cursor.execute("COMMIT")
+    step.description = f"copie de {source}({', '.join(columns)}) vers {target} par tranches de {batch_size}"
+    return step
+
+
+def drop_columns(table, columns):
+    """Étape: supprimer des colonnes existantes (reconstruction en ligne de la table)."""
+    def step(cursor):
+        existing = [column for column in columns if column_type(cursor, table, column) is not None]
+        if not existing:
+            return
+        drops = ', '.join(f"DROP COLUMN {column}" for column in existing)
+        cursor.execute(f"ALTER TABLE {table} {drops}, ALGORITHM=INPLACE, LOCK=NONE")
+    step.description = f"suppression des colonnes {', '.join(columns)} de {table}"
+    return step
+
+
+def execute(description, *statements):
+    """Étape: exécuter des instructions SQL (idempotentes)."""
+    def step(cursor):
+        for statement in statements:
+            cursor.execute(statement)
+    step.description = description
+    return step
+
+
+MIGRATIONS = [
+    (1, "Schéma de base (tables et données de référence)", [
+        run_sql_file(BASE_SCHEMA_FILE),
+    ]),
+    (2, "Index simples historiques", [
+        # idx_operations_date, créé par les anciennes installations, est remplacé en 3
+        create_index('operations', 'idx_operations_type', ['type_operation']),
+        create_index('materiels', 'idx_materiels_statut', ['statut']),
+        create_index('employes', 'idx_employes_service', ['service_id']),
+    ]),
+    (3, "Index composites des requêtes fréquentes", [
+        # Tri de l'historique et pagination par curseur (date_operation, id)
+        create_index('operations', 'idx_operations_date_id', ['date_operation', 'id']),
+        drop_index('operations', 'idx_operations_date'),  # préfixe du précédent
+        # Lignes d'une fiche (PDF, détails)
+        create_index('operations', 'idx_operations_numero_fiche', ['numero_fiche']),
+        # Historique d'un matériel
+        create_index('operations', 'idx_operations_materiel_date', ['materiel_id', 'date_operation']),
+        # Signatures d'une opération par rôle
+        create_index('signatures', 'idx_signatures_operation_type', ['operation_id', 'type_signature']),
+        # Recherche d'un employé par nom dans un service
+        create_index('employes', 'idx_employes_nom_service', ['nom', 'service_id']),
+        # Doublon de la contrainte UNIQUE sur numero_serie
+        drop_index('materiels', 'idx_materiels_serie'),
+    ]),
+    (4, "Tables d'agrégats des statistiques (python rebuild_stats.py pour l'historique existant)", [
+        execute(
+            "table stats_operations",
+            """
+            CREATE TABLE IF NOT EXISTS stats_operations (
+                mois DATE NOT NULL,
+                type_operation ENUM('attribution', 'restitution', 'incident') NOT NULL,
+                service_id INT NOT NULL DEFAULT 0,
+                type_materiel_id INT NOT NULL DEFAULT 0,
+                total INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (mois, type_operation, service_id, type_materiel_id)
+            )
+            """,
+        ),
+        execute(
+            "table stats_materiels_statut (remplie depuis materiels)",
+            """
+            CREATE TABLE IF NOT EXISTS stats_materiels_statut (
+                statut ENUM('disponible', 'attribue', 'en_maintenance', 'retire') NOT NULL PRIMARY KEY,
+                total INT NOT NULL DEFAULT 0
+            )
+            """,
+            """
+            INSERT INTO stats_materiels_statut (statut, total)
+            SELECT statut, COUNT(*) FROM materiels WHERE statut IS NOT NULL GROUP BY statut
+            ON DUPLICATE KEY UPDATE total = VALUES(total)
+            """,
+        ),
+    ]),
+    # À déployer avec le code qui lit `incidents`: les anciens workers écrivent
+    # encore dans les colonnes supprimées de `operations`
+    (5, "Colonnes des incidents déplacées dans la table 1:1 incidents", [
+        execute(
+            "table incidents",
+            """
+            CREATE TABLE IF NOT EXISTS incidents (
+                operation_id INT PRIMARY KEY,
+                declarant_nom VARCHAR(150),
+                telephone VARCHAR(50),
+                email VARCHAR(150),
+                poste VARCHAR(150),
+                numero_serie_actif VARCHAR(150),
+                actifs_json LONGTEXT,
+                natures_json LONGTEXT,
+                autres_infos TEXT,
+                signature_png VARCHAR(80), -- Référence sha256:<empreinte> dans le magasin de signatures
+                FOREIGN KEY (operation_id) REFERENCES operations(id) ON DELETE CASCADE
+            )
+            """,
+        ),
+        move_columns('operations', 'incidents', 'operation_id', INCIDENT_COLUMNS, where="type_operation = 'incident'"),
+        drop_columns('operations', INCIDENT_COLUMNS),
+    ]),
+    # Tables d'archive (python archive_operations.py): même structure, sans clés
+    # étrangères (LIKE ne les copie pas), alimentées par INSERT ... SELECT *
+    (6, "Tables d'archive de l'historique", [
+        execute(
+            f"table {table}_archive",
+            f"CREATE TABLE IF NOT EXISTS {table}_archive LIKE {table}"
+        )
+        for table in ARCHIVED_TABLES
+    ]),
+    (7, "Clés d'idempotence des formulaires", [
+        execute(
+            "table idempotency_keys",
+            """
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                cle VARCHAR(100) NOT NULL,
+                endpoint VARCHAR(64) NOT NULL,
+                empreinte CHAR(64) NOT NULL, -- SHA-256 du corps de la requête
+                statut ENUM('en_cours', 'termine') NOT NULL,
+                status_code SMALLINT,
+                reponse MEDIUMTEXT,
+                traite_depuis TIMESTAMP NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (cle, endpoint),
+                INDEX idx_idempotency_expires (expires_at)
+            )
+            """,
+        ),
+    ]),
+]
+
+
+def ensure_version_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(cursor):
+    ensure_version_table(cursor)
+    done = applied_versions(cursor)
+    return [migration for migration in MIGRATIONS if migration[0] not in done]
+
+
+def run_migrations(connection, target=None, log=print, lock_timeout=60):
+    """Appliquer les migrations en attente (jusqu'à `target` inclus).
+
+    Un verrou nommé MySQL empêche deux lanceurs concurrents (ex. plusieurs
+    déploiements) d'appliquer la même migration. Retourne les versions appliquées.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, lock_timeout))
+    if cursor.fetchall()[0][0] != 1:
+        raise Error(msg="Verrou des migrations indisponible (une autre migration est en cours)")
+    try:
+        applied = []
+        for version, description, steps in pending_migrations(cursor):
+            if target is not None and version > target:
+                break
+            log(f"Migration {version}: {description}")
+            for step in steps:
+                log(f"  - {step.description}")
+                step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)", (version, description)
+            )
+            connection.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchall()
+        cursor.close()
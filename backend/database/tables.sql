@@ -1,3 +1,6 @@
+-- Schéma de base (migration 1). Toutes les instructions doivent rester idempotentes:
+-- les évolutions suivantes sont des migrations dans database/migrations.py.
+
 -- Table des services
 CREATE TABLE IF NOT EXISTS services (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -52,7 +55,7 @@ CREATE TABLE IF NOT EXISTS operations (
     date_remise DATE,
     date_restitution DATE,
     motif TEXT,
-    -- Champs spécifiques aux incidents
+    -- Champs spécifiques aux incidents (déplacés dans la table incidents par la migration 5)
     declarant_nom VARCHAR(150),
     telephone VARCHAR(50),
     email VARCHAR(150),
@@ -61,7 +64,7 @@ CREATE TABLE IF NOT EXISTS operations (
     actifs_json LONGTEXT,
     natures_json LONGTEXT,
     autres_infos TEXT,
-    signature_png LONGTEXT,
+    signature_png VARCHAR(80), -- Référence sha256:<empreinte> dans le magasin de signatures
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (employe_id) REFERENCES employes(id) ON DELETE SET NULL,
     FOREIGN KEY (materiel_id) REFERENCES materiels(id) ON DELETE SET NULL
@@ -75,11 +78,52 @@ CREATE TABLE IF NOT EXISTS signatures (
     nom VARCHAR(100) NOT NULL,
     fonction VARCHAR(100) NOT NULL,
     date_signature DATE NOT NULL,
-    fichier_signature LONGTEXT, -- Base64 de l'image
+    fichier_signature VARCHAR(80), -- Référence sha256:<empreinte> dans le magasin de signatures
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (operation_id) REFERENCES operations(id) ON DELETE CASCADE
 );
 
+-- Détenteur actuel de chaque matériel attribué (maintenu par les écritures)
+CREATE TABLE IF NOT EXISTS materiel_current_assignment (
+    materiel_id INT PRIMARY KEY,
+    employe_id INT,
+    service_id INT,
+    depuis DATE NOT NULL,
+    numero_fiche VARCHAR(50),
+    operation_id INT NOT NULL,
+    INDEX idx_mca_employe (employe_id),
+    INDEX idx_mca_service (service_id),
+    FOREIGN KEY (materiel_id) REFERENCES materiels(id) ON DELETE CASCADE,
+    FOREIGN KEY (employe_id) REFERENCES employes(id) ON DELETE SET NULL,
+    FOREIGN KEY (service_id) REFERENCES services(id) ON DELETE SET NULL
+);
+
+-- Index de recherche de l'historique: texte normalisé (sans accents, minuscules)
+-- et trigrammes par opération (maintenus par les écritures, voir rebuild_search_index.py)
+CREATE TABLE IF NOT EXISTS operation_search (
+    operation_id INT PRIMARY KEY,
+    nom_normalise VARCHAR(255) NOT NULL DEFAULT '',
+    serie_normalisee VARCHAR(255) NOT NULL DEFAULT '',
+    FOREIGN KEY (operation_id) REFERENCES operations(id) ON DELETE CASCADE
+) CHARACTER SET ascii COLLATE ascii_bin;
+
+CREATE TABLE IF NOT EXISTS operation_search_trigrams (
+    champ ENUM('nom', 'serie') NOT NULL,
+    trigramme CHAR(3) NOT NULL,
+    operation_id INT NOT NULL,
+    PRIMARY KEY (champ, trigramme, operation_id),
+    INDEX idx_search_trigrams_operation (operation_id),
+    FOREIGN KEY (operation_id) REFERENCES operations(id) ON DELETE CASCADE
+) CHARACTER SET ascii COLLATE ascii_bin;
+
+-- Compteurs de numéros de fiche par préfixe et par jour
+CREATE TABLE IF NOT EXISTS numero_fiche_sequences (
+    prefixe CHAR(3) NOT NULL,
+    jour DATE NOT NULL,
+    dernier_numero INT NOT NULL,
+    PRIMARY KEY (prefixe, jour)
+);
+
 -- Table des utilisateurs système
 CREATE TABLE IF NOT EXISTS utilisateurs (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -115,9 +159,13 @@ INSERT IGNORE INTO types_materiel (nom, description) VALUES
 ('tablette', 'Tablette tactile'),
 ('accessoires', 'Accessoires informatiques');
 
--- Index pour optimiser les performances
-CREATE INDEX idx_operations_date ON operations(date_operation);
-CREATE INDEX idx_operations_type ON operations(type_operation);
-CREATE INDEX idx_materiels_serie ON materiels(numero_serie);
-CREATE INDEX idx_materiels_statut ON materiels(statut);
-CREATE INDEX idx_employes_service ON employes(service_id);
\ No newline at end of file
+-- Reprise des compteurs à partir des numéros déjà attribués
+INSERT IGNORE INTO numero_fiche_sequences (prefixe, jour, dernier_numero)
+SELECT LEFT(numero_fiche, 3),
+       STR_TO_DATE(SUBSTRING(numero_fiche, 5, 8), '%Y%m%d'),
+       MAX(CAST(SUBSTRING_INDEX(numero_fiche, '-', -1) AS UNSIGNED))
+FROM operations
+WHERE numero_fiche REGEXP '^[A-Z]{3}-[0-9]{8}-[0-9]{3,6}$'
+GROUP BY LEFT(numero_fiche, 3), SUBSTRING(numero_fiche, 5, 8);
+
+-- Les index sont créés par les migrations versionnées (database/migrations.py)
@@ -1,8 +1,14 @@
 import sys
 import csv
+import time
+import argparse
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
 from database.database import db
+from app.fiches import collation_key, employe_key
+from app.passwords import hash_password, hash_passwords_parallel
 
 
 def strip_accents(text: str) -> str:
@@ -100,6 +106,21 @@ def find_or_create_employe(nom_affichage: str, service_id: int | None) -> int |
     return db.get_last_insert_id()
 
 
+def iter_people(f):
+    """Lire le CSV (service;nom;prenom) et produire les lignes utiles, sans l'en-tête."""
+    reader = csv.reader(f, delimiter=';')
+    for row in reader:
+        if not row or len(row) < 3:
+            continue
+        service_raw, nom, prenom = (row[0] or '').strip(), (row[1] or '').strip(), (row[2] or '').strip()
+        # Skip header
+        if normalize_key(service_raw) in ('departement',) and normalize_key(nom) in ('nom',) and normalize_key(prenom) in ('prenom',):
+            continue
+        if not nom and not prenom:
+            continue
+        yield service_raw, nom, prenom
+
+
 def import_users(csv_path: Path, default_password: str = '123456') -> int:
     if not csv_path.exists():
         print(f"Fichier introuvable: {csv_path}")
@@ -111,17 +132,7 @@ def import_users(csv_path: Path, default_password: str = '123456') -> int:
 
     inserted = 0
     with csv_path.open('r', encoding='utf-8-sig', newline='') as f:
-        reader = csv.reader(f, delimiter=';')
-        for idx, row in enumerate(reader, start=1):
-            if not row or len(row) < 3:
-                continue
-            service_raw, nom, prenom = (row[0] or '').strip(), (row[1] or '').strip(), (row[2] or '').strip()
-            # Skip header
-            if normalize_key(service_raw) in ('departement',) and normalize_key(nom) in ('nom',) and normalize_key(prenom) in ('prenom',):
-                continue
-            if not nom and not prenom:
-                continue
-
+        for service_raw, nom, prenom in iter_people(f):
             username = build_username(prenom, nom)
             username = ensure_unique_username(username)
             email = build_email(username)
@@ -130,13 +141,13 @@ def import_users(csv_path: Path, default_password: str = '123456') -> int:
             service_name = canonicalize_service(service_raw)
             service_id = find_or_create_service(service_name) if service_name else None
 
-            # Insérer l'utilisateur (mot de passe en clair pour correspondre au login actuel)
+            # Insérer l'utilisateur (mot de passe haché)
             q = (
                 "INSERT INTO utilisateurs (nom_utilisateur, email, mot_de_passe_hash, role, actif) "
                 "VALUES (%s, %s, %s, 'user', TRUE) "
                 "ON DUPLICATE KEY UPDATE email=VALUES(email), actif=VALUES(actif)"
             )
-            rc = db.execute_query(q, (username, email, default_password))
+            rc = db.execute_query(q, (username, email, hash_password(default_password)))
             if rc is not None:
                 inserted += 1
 
@@ -151,17 +162,150 @@ def import_users(csv_path: Path, default_password: str = '123456') -> int:
     return inserted
 
 
+def _unique_username(base_username: str, taken: set) -> str:
+    """Même règle que ensure_unique_username, contre un ensemble préchargé."""
+    if not base_username:
+        base_username = 'user'
+    candidate = base_username
+    suffix = 1
+    while collation_key(candidate) in taken:
+        suffix += 1
+        candidate = f"{base_username}-{suffix}"
+    taken.add(collation_key(candidate))
+    return candidate
+
+
+def import_users_bulk(csv_path: Path, default_password: str = '123456',
+                      chunk_size: int = 1000, dry_run: bool = False, hash_workers: int | None = None) -> int:
+    """Import ensembliste: une requête de préchargement par table, puis des
+    INSERT multi-lignes par lot de `chunk_size` lignes, un lot par transaction.
+
+    Les collisions de noms d'utilisateur, les services canoniques et les
+    employés déjà présents sont résolus en mémoire, comparés comme par la
+    collation MySQL (casse et accents ignorés). En `dry_run`, rien n'est
+    écrit: seul le bilan de ce qui changerait est affiché.
+    """
+    if not csv_path.exists():
+        print(f"Fichier introuvable: {csv_path}")
+        return 0
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        return 0
+
+    started = time.perf_counter()
+    taken_usernames = {collation_key(row['nom_utilisateur'])
+                       for row in db.execute_query("SELECT nom_utilisateur FROM utilisateurs") or []}
+    service_ids = {collation_key(row['nom']): row['id']
+                   for row in db.execute_query("SELECT id, nom FROM services") or []}
+    known_employes = {employe_key(row['nom'], row['service_id'])
+                      for row in db.execute_query("SELECT nom, service_id FROM employes") or []}
+    print(f"Préchargé: {len(taken_usernames)} utilisateurs, {len(service_ids)} services, "
+          f"{len(known_employes)} employés ({time.perf_counter() - started:.2f}s)")
+
+    processed = inserted = 0
+    new_services = set()
+    new_employes = 0
+    hash_pool = None if dry_run else ProcessPoolExecutor(max_workers=hash_workers)
+    with csv_path.open('r', encoding='utf-8-sig', newline='') as f:
+        people = iter_people(f)
+        while True:
+            chunk = list(islice(people, chunk_size))
+            if not chunk:
+                break
+
+            # Services canoniques manquants
+            resolved = [(canonicalize_service(service_raw), nom, prenom) for service_raw, nom, prenom in chunk]
+            # Une seule graphie par service, la première rencontrée (la collation
+            # ignore casse et accents)
+            missing = {}
+            for name, _, _ in resolved:
+                if name and collation_key(name) not in service_ids:
+                    missing.setdefault(collation_key(name), name)
+            missing = sorted(missing.values())
+            new_services.update(missing)
+
+            users = []
+            for service_name, nom, prenom in resolved:
+                username = _unique_username(build_username(prenom, nom), taken_usernames)
+                users.append((username, build_email(username), service_name,
+                              ' '.join(part for part in [prenom, nom] if part)))
+
+            if dry_run:
+                for _, _, service_name, nom_affichage in users:
+                    service_key = service_ids.get(collation_key(service_name), collation_key(service_name)) if service_name else None
+                    key = employe_key(nom_affichage, service_key)
+                    if nom_affichage and key not in known_employes:
+                        known_employes.add(key)
+                        new_employes += 1
+                for name in missing:
+                    service_ids[collation_key(name)] = collation_key(name)
+                inserted += len(users)
+            else:
+                # Un sel par utilisateur: le KDF est parallélisé sur tous les cœurs
+                hashes = hash_passwords_parallel([default_password] * len(users), executor=hash_pool)
+                with db.transaction() as tx:
+                    if missing:
+                        tx.insert_rows("INSERT IGNORE INTO services (nom) VALUES", [(name,) for name in missing])
+                        rows = tx.fetchall(
+                            f"SELECT id, nom FROM services WHERE nom IN ({', '.join(['%s'] * len(missing))})", missing
+                        )
+                        service_ids.update({collation_key(row['nom']): row['id'] for row in rows})
+
+                    tx.insert_rows(
+                        "INSERT INTO utilisateurs (nom_utilisateur, email, mot_de_passe_hash, role, actif) VALUES",
+                        [(user[0], user[1], password_hash) for user, password_hash in zip(users, hashes)],
+                        template="(%s, %s, %s, 'user', TRUE)",
+                        suffix="ON DUPLICATE KEY UPDATE email=VALUES(email), actif=VALUES(actif)"
+                    )
+
+                    employes = []
+                    for _, _, service_name, nom_affichage in users:
+                        service_id = service_ids.get(collation_key(service_name)) if service_name else None
+                        key = employe_key(nom_affichage, service_id)
+                        if nom_affichage and key not in known_employes:
+                            known_employes.add(key)
+                            employes.append((nom_affichage, service_id))
+                    if employes:
+                        tx.insert_rows("INSERT INTO employes (nom, service_id) VALUES", employes)
+                    new_employes += len(employes)
+                inserted += len(users)
+
+            processed += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"  {processed} lignes traitées - {processed / elapsed:.0f} lignes/s")
+
+    if hash_pool is not None:
+        hash_pool.shutdown()
+    db.disconnect()
+    elapsed = time.perf_counter() - started
+    prefix = "[simulation] " if dry_run else ""
+    print(f"{prefix}{inserted} utilisateurs, {len(new_services)} services, {new_employes} employés "
+          f"{'seraient créés' if dry_run else 'créés'} en {elapsed:.2f}s "
+          f"({processed / elapsed if elapsed else 0:.0f} lignes/s)")
+    for name in list(new_services)[:20]:
+        print(f"  nouveau service: {name}")
+    return inserted
+
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python backend/import_users.py <CHEMIN_CSV> [motdepasse_par_defaut]")
-        sys.exit(1)
-    csv_path = Path(sys.argv[1])
-    default_password = sys.argv[2] if len(sys.argv) > 2 else '123456'
-    count = import_users(csv_path, default_password)
+    parser = argparse.ArgumentParser(description="Importer les utilisateurs depuis un CSV (service;nom;prenom)")
+    parser.add_argument('csv_path', type=Path, help="Chemin du fichier CSV")
+    parser.add_argument('default_password', nargs='?', default='123456', help="Mot de passe par défaut")
+    parser.add_argument('--bulk', action='store_true', help="Import ensembliste par lots (gros fichiers)")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Lignes par lot/transaction en mode --bulk")
+    parser.add_argument('--hash-workers', type=int, default=None,
+                        help="Processus de hachage des mots de passe en mode --bulk (défaut: nombre de cœurs)")
+    parser.add_argument('--dry-run', action='store_true', help="Afficher ce qui changerait sans rien écrire (implique --bulk)")
+    args = parser.parse_args()
+
+    if args.bulk or args.dry_run:
+        count = import_users_bulk(args.csv_path, args.default_password, args.chunk_size, args.dry_run,
+                                  args.hash_workers)
+    else:
+        count = import_users(args.csv_path, args.default_password)
     print(f"Utilisateurs traités: {count}")
 
 
 if __name__ == '__main__':
     main()
-
-
@@ -7,9 +7,11 @@ import mysql.connector
 from mysql.connector import Error
 import os
 from config import Config
+from database.migrations import run_migrations
 
 def create_database():
     """Créer la base de données et les tables"""
+    connection = None
     try:
         # Connexion à MySQL sans spécifier de base de données
         connection = mysql.connector.connect(
@@ -30,23 +32,10 @@ def create_database():
             # Utiliser la base de données
             cursor.execute(f"USE {Config.DB_NAME}")
             
-            # Lire et exécuter le script SQL pour les tables
-            print("Création des tables...")
-            with open('database/tables.sql', 'r', encoding='utf-8') as file:
-                sql_commands = file.read()
-                
-            # Diviser les commandes SQL
-            commands = sql_commands.split(';')
-            
-            for command in commands:
-                command = command.strip()
-                if command and not command.startswith('--'):
-                    try:
-                        cursor.execute(command)
-                        print(f"Commande exécutée: {command[:50]}...")
-                    except Error as e:
-                        if "already exists" not in str(e).lower():
-                            print(f"Erreur lors de l'exécution: {e}")
+            # Créer / mettre à jour les tables via les migrations versionnées
+            print("Application des migrations...")
+            applied = run_migrations(connection)
+            print(f"{len(applied)} migration(s) appliquée(s)" if applied else "Schéma déjà à jour")
             
             connection.commit()
             print("Base de données initialisée avec succès!")
@@ -54,7 +43,7 @@ def create_database():
     except Error as e:
         print(f"Erreur lors de l'initialisation de la base de données: {e}")
     finally:
-        if connection.is_connected():
+        if connection is not None and connection.is_connected():
             cursor.close()
             connection.close()
             print("Connexion MySQL fermée")
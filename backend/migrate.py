@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Application des migrations versionnées du schéma (database/migrations.py).
+
+Usage:
+    python migrate.py                 # appliquer les migrations en attente
+    python migrate.py --status        # lister les migrations appliquées / en attente
+    python migrate.py --target 2      # s'arrêter à la version 2
+    python migrate.py --check-plans   # échouer si une requête fréquente parcourt toute une table
+"""
+
+import argparse
+import sys
+
+import mysql.connector
+from mysql.connector import Error
+
+from config import Config
+from database.migrations import MIGRATIONS, ensure_version_table, applied_versions, run_migrations
+
+
+def connect():
+    return mysql.connector.connect(
+        host=Config.DB_HOST,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME,
+        port=Config.DB_PORT
+    )
+
+
+def print_status(connection):
+    cursor = connection.cursor()
+    ensure_version_table(cursor)
+    done = applied_versions(cursor)
+    cursor.close()
+    for version, description, _ in MIGRATIONS:
+        print(f"  [{'x' if version in done else ' '}] {version}: {description}")
+
+
+def check_plans(connection):
+    from app.query_plans import check_query_plans
+    cursor = connection.cursor()
+    try:
+        full_scans = check_query_plans(cursor)
+    finally:
+        cursor.close()
+    for name, table in full_scans:
+        print(f"  Parcours complet de '{table}' dans la requête « {name} »")
+    if full_scans:
+        return False
+    print("Plans d'exécution: aucun parcours complet sur les requêtes fréquentes")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrations du schéma de la base de données")
+    parser.add_argument('--status', action='store_true', help="Afficher l'état des migrations sans rien appliquer")
+    parser.add_argument('--target', type=int, help="Dernière version à appliquer")
+    parser.add_argument('--check-plans', action='store_true',
+                        help="Vérifier par EXPLAIN les plans des requêtes fréquentes (après migration)")
+    args = parser.parse_args()
+
+    try:
+        connection = connect()
+    except Error as e:
+        print(f"Connexion DB échouée: {e}")
+        sys.exit(1)
+
+    try:
+        if args.status:
+            print_status(connection)
+            return
+        applied = run_migrations(connection, target=args.target)
+        print(f"{len(applied)} migration(s) appliquée(s)" if applied else "Schéma à jour")
+        if args.check_plans and not check_plans(connection):
+            sys.exit(1)
+    except Error as e:
+        print(f"Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Migration des signatures base64 (LONGTEXT) vers le magasin de signatures.
+
+Les lignes sont traitées par fenêtres d'identifiants: chaque lot est une
+transaction courte (UPDATE par clé primaire), suivie d'une pause, pour ne
+jamais verrouiller `incidents` ou `signatures` longtemps. Les images sont
+normalisées au passage (app.signature_image).
+
+Usage: python migrate_signatures.py [--batch-size 200] [--pause 0.05] [--dry-run] [--alter-columns]
+"""
+
+import argparse
+import sys
+import time
+
+from database.database import db
+from app.http_cache import data_version
+from app.signature_store import store_signature
+
+# (table, colonne, clé primaire) contenant des signatures
+SIGNATURE_COLUMNS = [
+    ('signatures', 'fichier_signature', 'id'),
+    ('incidents', 'signature_png', 'operation_id'),
+    ('signatures_archive', 'fichier_signature', 'id'),
+    ('incidents_archive', 'signature_png', 'operation_id'),
+]
+
+
+def migrate_column(table, column, key, batch_size, pause, dry_run):
+    """Migrer une colonne; retourne (lignes migrées, octets base64 libérés, erreurs)."""
+    bounds = db.execute_query(f"SELECT MIN({key}) AS min_id, MAX({key}) AS max_id FROM {table}")
+    if not bounds or bounds[0]['max_id'] is None:
+        return 0, 0, 0
+    start, max_id = bounds[0]['min_id'] - 1, bounds[0]['max_id']
+
+    migrated = freed = errors = 0
+    while start < max_id:
+        end = start + batch_size
+        rows = db.execute_query(
+            f"SELECT {key} AS id, {column} AS valeur FROM {table} "
+            f"WHERE {key} > %s AND {key} <= %s AND {column} LIKE 'data:%%'",
+            (start, end)
+        )
+        if rows is None:
+            raise RuntimeError(f"Lecture impossible de {table}.{column} (ids {start + 1}-{end})")
+
+        updates = []
+        for row in rows:
+            try:
+                reference = store_signature(row['valeur'])
+            except ValueError as e:
+                errors += 1
+                print(f"  {table}#{row['id']}: ignorée ({e})")
+                continue
+            updates.append((reference, row['id']))
+            freed += len(row['valeur'])
+
+        if updates and not dry_run:
+            rc = db.execute_many(f"UPDATE {table} SET {column} = %s WHERE {key} = %s", updates)
+            if rc is None:
+                raise RuntimeError(f"Échec de mise à jour de {table} (ids {start + 1}-{end})")
+        migrated += len(updates)
+        start = end
+        print(f"  {table}.{column}: {migrated} lignes migrées (id <= {min(end, max_id)}/{max_id})")
+        if updates and pause:
+            time.sleep(pause)
+    return migrated, freed, errors
+
+
+def alter_columns():
+    """Réduire les colonnes à la taille d'une référence une fois la migration terminée."""
+    for table, column, _ in SIGNATURE_COLUMNS:
+        remaining = db.execute_query(f"SELECT COUNT(*) AS n FROM {table} WHERE {column} LIKE 'data:%%'")
+        if remaining is None or remaining[0]['n']:
+            print(f"{table}.{column}: des lignes ne sont pas migrées, colonne conservée")
+            continue
+        print(f"{table}.{column}: conversion en VARCHAR(80)...")
+        if db.execute_query(f"ALTER TABLE {table} MODIFY {column} VARCHAR(80) NULL") is None:
+            print(f"{table}.{column}: échec de la conversion")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Déplacer les signatures base64 vers le magasin de signatures")
+    parser.add_argument('--batch-size', type=int, default=200, help="Taille de la fenêtre d'identifiants par lot")
+    parser.add_argument('--pause', type=float, default=0.05, help="Pause entre deux lots (secondes)")
+    parser.add_argument('--dry-run', action='store_true', help="Écrire les fichiers sans modifier la base")
+    parser.add_argument('--alter-columns', action='store_true',
+                        help="Convertir ensuite les colonnes LONGTEXT en VARCHAR(80)")
+    args = parser.parse_args()
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    try:
+        for table, column, key in SIGNATURE_COLUMNS:
+            print(f"Migration de {table}.{column}...")
+            migrated, freed, errors = migrate_column(table, column, key, args.batch_size, args.pause, args.dry_run)
+            print(f"{table}.{column}: {migrated} signatures migrées, "
+                  f"{freed / 1024 / 1024:.1f} Mo de base64 libérés, {errors} erreurs")
+        if args.alter_columns and not args.dry_run:
+            alter_columns()
+        if not args.dry_run:
+            data_version.bump()  # les détails renvoient désormais des URL de signature
+    finally:
+        db.disconnect()
+
+
+if __name__ == '__main__':
+    main()
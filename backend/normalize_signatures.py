@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Normalisation des signatures déjà stockées (rognage, niveaux de gris, PNG à palette).
+
+Les nouvelles signatures sont normalisées à l'enregistrement; ce script
+traite celles du magasin référencées avant ce changement. Chaque image
+distincte est convertie une seule fois (processus parallèles), stockée sous
+sa nouvelle empreinte, puis les lignes qui la référencent sont mises à jour
+par fenêtres d'identifiants. Les tailles avant/après sont affichées.
+Les lignes encore en base64 relèvent de migrate_signatures.py (qui
+normalise aussi).
+
+Usage: python normalize_signatures.py [--batch-size 500] [--workers 4] [--pause 0.05] [--dry-run] [--purge-originals]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database.database import db
+from app.http_cache import data_version
+from app.signature_image import normalize_png
+from app.signature_store import REF_PREFIX, REFERENCE_LENGTH, reference_digest, signature_store
+from migrate_signatures import SIGNATURE_COLUMNS
+
+
+def _read(digest):
+    with open(signature_store.path_for(digest), 'rb') as f:
+        return f.read()
+
+
+def normalize_column(table, column, key, replacements, sizes, executor, batch_size, pause, dry_run):
+    """Normaliser les signatures d'une colonne; retourne (lignes mises à jour, erreurs).
+
+    `replacements`: ancienne empreinte -> nouvelle (partagé entre les colonnes).
+    `sizes`: [octets avant, octets après] des images distinctes converties.
+    """
+    bounds = db.execute_query(f"SELECT MIN({key}) AS min_id, MAX({key}) AS max_id FROM {table}")
+    if not bounds or bounds[0]['max_id'] is None:
+        return 0, 0
+    start, max_id = bounds[0]['min_id'] - 1, bounds[0]['max_id']
+
+    updated = errors = 0
+    while start < max_id:
+        end = start + batch_size
+        rows = db.execute_query(
+            f"SELECT {key} AS id, {column} AS valeur FROM {table} "
+            f"WHERE {key} > %s AND {key} <= %s AND {column} LIKE 'sha256:%%'",
+            (start, end)
+        )
+        if rows is None:
+            raise RuntimeError(f"Lecture impossible de {table}.{column} (ids {start + 1}-{end})")
+
+        # Images pas encore vues dans ce passage
+        digests = sorted({reference_digest(row['valeur']) for row in rows} - set(replacements) - {None})
+        originals = []
+        for digest in digests:
+            if not signature_store.exists(digest):
+                errors += 1
+                print(f"  {table}: fichier absent pour {digest}")
+                replacements[digest] = digest
+                continue
+            originals.append((digest, _read(digest)))
+        results = executor.map(_normalize_or_error, [data for _, data in originals], chunksize=8)
+        for (digest, data), result in zip(originals, results):
+            if isinstance(result, str):
+                errors += 1
+                print(f"  {table}: {digest} ignorée ({result})")
+                replacements[digest] = digest
+                continue
+            sizes[0] += len(data)
+            sizes[1] += len(result)
+            replacements[digest] = digest if dry_run or result == data else signature_store.put(result)
+
+        updates = [
+            (f"{REF_PREFIX}{replacements[digest]}", row['id'])
+            for row in rows
+            for digest in [reference_digest(row['valeur'])]
+            if digest is not None and replacements[digest] != digest
+        ]
+        if updates:
+            rc = db.execute_many(f"UPDATE {table} SET {column} = %s WHERE {key} = %s", updates)
+            if rc is None:
+                raise RuntimeError(f"Échec de mise à jour de {table} (ids {start + 1}-{end})")
+        updated += len(updates)
+        start = end
+        print(f"  {table}.{column}: {updated} lignes mises à jour (id <= {min(end, max_id)}/{max_id})")
+        if updates and pause:
+            time.sleep(pause)
+    return updated, errors
+
+
+def _normalize_or_error(data):
+    try:
+        return normalize_png(data)
+    except ValueError as e:
+        return str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normaliser les signatures déjà stockées")
+    parser.add_argument('--batch-size', type=int, default=500, help="Taille de la fenêtre d'identifiants par lot")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Processus de conversion")
+    parser.add_argument('--pause', type=float, default=0.05, help="Pause entre deux lots (secondes)")
+    parser.add_argument('--dry-run', action='store_true', help="Mesurer le gain sans rien écrire")
+    parser.add_argument('--purge-originals', action='store_true',
+                        help="Supprimer ensuite du magasin les images remplacées")
+    args = parser.parse_args()
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    replacements, sizes, total_updated, total_errors = {}, [0, 0], 0, 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for table, column, key in SIGNATURE_COLUMNS:
+                print(f"Normalisation de {table}.{column}...")
+                updated, errors = normalize_column(
+                    table, column, key, replacements, sizes, executor, args.batch_size, args.pause, args.dry_run
+                )
+                total_updated += updated
+                total_errors += errors
+        if total_updated:
+            data_version.bump()  # les détails et PDF référencent les nouvelles images
+    finally:
+        db.disconnect()
+
+    before, after = sizes
+    print(f"{len(replacements)} images distinctes: {before / 1024:.1f} Ko -> {after / 1024:.1f} Ko "
+          f"({100 * (1 - after / before) if before else 0:.0f} % gagnés), "
+          f"{total_updated} lignes mises à jour, {total_errors} erreurs, {time.perf_counter() - started:.1f}s")
+
+    if args.purge_originals and not args.dry_run:
+        purge_originals([old for old, new in replacements.items() if new != old])
+
+
+def referenced_digests():
+    """Empreintes encore référencées par une colonne de signatures (une lecture par table)."""
+    digests = set()
+    for table, column, _ in SIGNATURE_COLUMNS:
+        rows = db.execute_query(
+            f"SELECT DISTINCT LEFT({column}, %s) AS valeur FROM {table} WHERE {column} LIKE 'sha256:%%'",
+            (REFERENCE_LENGTH,)
+        )
+        if rows is None:
+            raise RuntimeError(f"Lecture impossible de {table}.{column}")
+        digests.update(reference_digest(row['valeur']) for row in rows)
+    return digests
+
+
+def purge_originals(replaced):
+    """Supprimer du magasin les images remplacées qu'aucune ligne ne référence
+    plus: une écriture ou un archivage postérieur au passage d'une fenêtre
+    peut encore pointer vers une image d'origine."""
+    if not db.connect():
+        print("Connexion DB échouée, images d'origine conservées")
+        return
+    try:
+        referenced = referenced_digests()
+    finally:
+        db.disconnect()
+    removed = kept = 0
+    for digest in replaced:
+        if digest in referenced:
+            kept += 1
+        elif signature_store.exists(digest):
+            os.remove(signature_store.path_for(digest))
+            removed += 1
+    print(f"{removed} images d'origine supprimées du magasin, {kept} conservées (encore référencées)")
+
+
+if __name__ == '__main__':
+    main()
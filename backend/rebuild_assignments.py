@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Reconstruction de l'index des détenteurs actuels (materiel_current_assignment).
+
+Rejoue les attributions et restitutions de `operations` dans l'ordre
+chronologique, puis remplace l'index et le statut des matériels en une
+transaction. À lancer après une migration ou si l'index est suspecté divergent.
+
+Usage: python rebuild_assignments.py [--batch-size 1000]
+"""
+
+import argparse
+import sys
+import time
+
+from database.database import db
+from app.assignments import rebuild_current_assignments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruire l'index des détenteurs actuels")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Lignes lues / insérées par lot")
+    args = parser.parse_args()
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        count = rebuild_current_assignments(args.batch_size)
+    finally:
+        db.disconnect()
+    print(f"{count} matériels attribués indexés en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
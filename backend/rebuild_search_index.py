@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Reconstruction de l'index de recherche de l'historique
+(operation_search / operation_search_trigrams).
+
+Réindexe toutes les opérations par lots, dans l'ordre des identifiants.
+À lancer une fois après la création des tables (opérations existantes), puis
+si l'index est suspecté divergent. Les écritures courantes l'entretiennent.
+
+Usage: python rebuild_search_index.py [--batch-size 1000]
+"""
+
+import argparse
+import sys
+import time
+
+from database.database import db
+from app.http_cache import data_version
+from app.search_index import rebuild_search_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruire l'index de recherche de l'historique")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Opérations indexées par transaction")
+    args = parser.parse_args()
+
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        count = rebuild_search_index(args.batch_size)
+        data_version.bump()  # les recherches de l'historique changent de résultat
+    finally:
+        db.disconnect()
+    print(f"{count} opérations indexées en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
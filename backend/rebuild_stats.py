@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Recalcul complet des tables d'agrégats des statistiques
+(stats_operations, stats_materiels_statut).
+
+Les écritures de l'application entretiennent les agrégats au fil de l'eau;
+ce script les reconstruit depuis `operations` (par tranches d'identifiants):
+après la migration 4 sur un historique existant, après un import direct en
+base, ou si les agrégats sont suspectés divergents.
+
+Usage: python rebuild_stats.py [--batch-size 50000]
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from database.database import db
+from app.http_cache import data_version
+from app.stats import recompute_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalculer les statistiques depuis l'historique")
+    parser.add_argument('--batch-size', type=int, default=50000, help="Opérations agrégées par requête")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not db.connect():
+        print("Connexion DB échouée")
+        sys.exit(1)
+    started = time.perf_counter()
+    try:
+        count = recompute_stats(args.batch_size)
+        data_version.bump()  # /api/stats est servi avec l'ETag de la version des données
+    finally:
+        db.disconnect()
+    print(f"Statistiques recalculées ({count} opérations) en {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+# Serveur de développement (un seul processus, débogueur). En production: python serve.py
 from app import create_app
 from database.database import db
 import logging
@@ -10,16 +11,12 @@ logging.basicConfig(
 
 app = create_app()
 
-@app.teardown_appcontext
-def close_database(error):
-    """Fermer la connexion à la base de données à la fin de chaque requête"""
-    db.disconnect()
-
 if __name__ == '__main__':
     # Initialiser la base de données au démarrage
     try:
         if db.connect():
             logging.info("Base de données initialisée avec succès")
+            db.disconnect()
         else:
             logging.error("Échec de l'initialisation de la base de données")
     except Exception as e:
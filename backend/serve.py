@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Serveur de production (Linux): gunicorn, plusieurs processus workers et
+plusieurs threads par worker, configuré par `Config` (variables SERVER_*).
+
+L'application est chargée une fois dans le processus maître (preload) puis
+les workers sont créés par fork: chaque worker ouvre son propre pool de
+connexions MySQL à sa première requête (voir database.database).
+
+Usage (depuis backend/):
+    python serve.py                       # démarrer (options par défaut de Config)
+    python serve.py --workers 8 --threads 8 --bind 0.0.0.0:8000
+    python serve.py --reload              # rechargement gracieux du serveur en cours (SIGHUP)
+    python serve.py --stop                # arrêt gracieux (SIGTERM)
+
+--reload remplace les workers un par un sans perdre de requête (configuration,
+fuites mémoire). Avec le preload, le nouveau code d'un déploiement n'est chargé
+qu'au redémarrage du maître (--stop puis démarrage, ou SIGUSR2 côté gunicorn).
+
+`run.py` reste le serveur de développement (rechargement automatique, débogueur).
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from config import Config
+
+
+class MaterielApplication(BaseApplication):
+    """Application gunicorn configurée par code (sans fichier gunicorn.conf.py)."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app
+        return create_app()
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} démarré (pool MySQL créé à la première requête)")
+
+
+def worker_abort(worker):
+    worker.log.warning(f"Worker {worker.pid} interrompu après dépassement du délai de requête")
+
+
+def gunicorn_options(args):
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'timeout': args.timeout,
+        'graceful_timeout': Config.SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': Config.SERVER_KEEPALIVE,
+        'max_requests': Config.SERVER_MAX_REQUESTS,
+        'max_requests_jitter': Config.SERVER_MAX_REQUESTS_JITTER,
+        'preload_app': True,
+        'pidfile': Config.SERVER_PIDFILE,
+        'loglevel': 'info',
+        'errorlog': '-',
+        'post_fork': post_fork,
+        'worker_abort': worker_abort,
+        'proc_name': 'materiel_app',
+    }
+    if Config.SERVER_ACCESS_LOG:
+        options['accesslog'] = Config.SERVER_ACCESS_LOG
+    return options
+
+
+def signal_running(sig):
+    """Envoyer un signal au maître gunicorn en cours d'exécution (fichier PID)."""
+    try:
+        with open(Config.SERVER_PIDFILE, 'r') as f:
+            pid = int(f.read().strip())
+        os.kill(pid, sig)
+    except (OSError, ValueError) as e:
+        print(f"Aucun serveur en cours ({Config.SERVER_PIDFILE}): {e}")
+        sys.exit(1)
+    print(f"Signal {sig.name} envoyé au serveur (PID {pid})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur WSGI de production (gunicorn)")
+    parser.add_argument('--bind', default=Config.SERVER_BIND, help="Adresse d'écoute (hôte:port ou unix:/chemin)")
+    parser.add_argument('--workers', type=int, default=Config.SERVER_WORKERS, help="Processus workers")
+    parser.add_argument('--threads', type=int, default=Config.SERVER_THREADS, help="Threads par worker")
+    parser.add_argument('--timeout', type=int, default=Config.SERVER_TIMEOUT, help="Délai max d'une requête (s)")
+    parser.add_argument('--reload', action='store_true', help="Recharger le serveur en cours sans coupure")
+    parser.add_argument('--stop', action='store_true', help="Arrêter le serveur en cours (gracieusement)")
+    args = parser.parse_args()
+
+    if args.reload:
+        signal_running(signal.SIGHUP)
+        return
+    if args.stop:
+        signal_running(signal.SIGTERM)
+        return
+
+    if args.threads > Config.DB_POOL_SIZE:
+        logging.warning(
+            f"SERVER_THREADS ({args.threads}) > DB_POOL_SIZE ({Config.DB_POOL_SIZE}): "
+            "des requêtes attendront une connexion MySQL"
+        )
+    os.makedirs(os.path.dirname(Config.SERVER_PIDFILE) or '.', exist_ok=True)
+    MaterielApplication(gunicorn_options(args)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""Historique avec archives: la requête fusionnée doit rester une lecture."""
+
+import app.routes as routes
+from database.database import Database
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = -1
+        self.executed = []
+
+    def execute(self, query, params):
+        assert query.count('%s') == len(params)
+        self.executed.append((query, params))
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_historique_with_archives_returns_rows(monkeypatch):
+    monkeypatch.setattr(routes, 'historique_sources', lambda debut, fin, archives: [False, True])
+    rows = [{'id': 2, 'date_operation': '2024-01-02'}, {'id': 1, 'date_operation': '2020-01-01'}]
+    database = Database()
+    database._local.connection = FakeConnection()
+    database._local.cursor = FakeCursor(rows)
+
+    query, params = routes._historique_query({'archives': '1'}, " WHERE 1=1", [], limit=51)
+    result = database.execute_query(query, params)
+
+    assert result == rows
+    assert database._local.connection.commits == 0
+    executed, _ = database._local.cursor.executed[0]
+    assert 'operations_archive' in executed
+    assert executed.rstrip().endswith('LIMIT %s')
@@ -0,0 +1,57 @@
+"""Statistiques par statut: un matériel créé par la fiche compte une fois, sans ancien statut."""
+
+import pytest
+
+import app.fiches as fiches
+from app.schemas import SIGNATURE_ROLES
+
+
+class FakeTransaction:
+    """Table materiels en mémoire; la colonne statut vaut 'disponible' par défaut."""
+
+    def __init__(self):
+        self.materiels = {}
+
+    def fetchall(self, query, params):
+        if 'FROM employes' in query:
+            return [{'id': 1, 'nom': 'Durand', 'service_id': 1}]
+        if 'FROM materiels' in query:
+            return [dict(self.materiels[fiches.serie_key(serie)]) for serie in params
+                    if fiches.serie_key(serie) in self.materiels]
+        if 'FROM operations' in query:
+            return [{'id': 10, 'materiel_id': 5, 'numero_fiche': params[0], 'employe_id': 1}]
+        raise AssertionError(query)
+
+    def insert_rows(self, query, rows, template=None, suffix=''):
+        if query == fiches.MATERIEL_CREATE_QUERY:
+            for row in rows:
+                statut = None if template and 'NULL' in template else 'disponible'
+                self.materiels.setdefault(fiches.serie_key(row[2]), {'id': 5, 'numero_serie': row[2], 'statut': statut})
+        elif query == fiches.MATERIEL_UPSERT_QUERY:
+            for row in rows:
+                self.materiels[fiches.serie_key(row[2])]['statut'] = row[5]
+        return len(rows)
+
+
+def _fiche():
+    return {
+        'nom': 'Durand',
+        'service_id': 1,
+        'motif': None,
+        'signataires': {role: ('Nom', 'Fonction', None) for role in SIGNATURE_ROLES},
+        'signature_refs': {role: None for role in SIGNATURE_ROLES},
+        'materiels': [{'type_id': 1, 'modele': 'X1', 'serie': 'SN-NOUVEAU', 'service_achat': '',
+                       'date_achat': None, 'date': None}],
+    }
+
+
+@pytest.mark.parametrize('type_operation, statut', [('attribution', 'attribue'), ('restitution', 'disponible')])
+def test_new_serial_counted_once(monkeypatch, type_operation, statut):
+    changes = []
+    monkeypatch.setattr(fiches, 'record_statut_changes', lambda tx, deltas: changes.extend(deltas))
+    for name in ('record_operations', 'apply_attributions', 'apply_restitutions', 'index_operations'):
+        monkeypatch.setattr(fiches, name, lambda *args: None)
+
+    fiches.write_fiches(FakeTransaction(), type_operation, [_fiche()], ['ATT-20240101-0001'])
+
+    assert changes == [(None, statut)]
@@ -0,0 +1,15 @@
+// Clé d'idempotence des formulaires (en-tête Idempotency-Key): un renvoi de
+// la même saisie (double clic, nouvelle tentative après une erreur réseau)
+// réutilise la clé, le serveur rejoue alors sa première réponse au lieu
+// d'enregistrer une seconde fiche. Une saisie différente reçoit une nouvelle clé.
+let idempotencyKey = null;
+let idempotencyBody = null;
+
+function idempotencyKeyFor(body) {
+    if (body !== idempotencyBody) {
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        idempotencyKey = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        idempotencyBody = body;
+    }
+    return idempotencyKey;
+}